@@ -60,9 +60,9 @@ class MCPWeatherTool(BaseTool):
             latitude = float(lat_str.strip())
             longitude = float(lon_str.strip())
             
-            # Call MCP server
-            result = self.mcp_client.get_weather(latitude=latitude, longitude=longitude)
-            return result
+            # Call MCP server; structured fields keep the agent's context small
+            result = self.mcp_client.get_weather(latitude=latitude, longitude=longitude, structured=True)
+            return json.dumps(result, separators=(",", ":"))
         except Exception as e:
             return f"Error getting weather: {str(e)}"
 
@@ -151,23 +151,6 @@ def create_langchain_agent(mcp_client: FastMCPClient):
         max_iterations=5
     )
 
-def extract_temperature(weather_text: str) -> Optional[int]:
-    """Extract temperature value from MCP weather response."""
-    try:
-        lines = weather_text.split('\n')
-        for line in lines:
-            if "Temperature:" in line:
-                temp_part = line.split("Temperature:")[1].strip()
-                temp_value = int(temp_part.split('°')[0].strip())
-                return temp_value
-        return None
-    except Exception:
-        return None
-
-def is_snowing(weather_text: str) -> bool:
-    """Check if weather text indicates snow."""
-    return "snow" in weather_text.lower()
-
 def analyze_us_states_subset(mcp_client: FastMCPClient):
     """Analyze a subset of US states for weather conditions."""
     console.print(Panel.fit(
@@ -187,30 +170,40 @@ def analyze_us_states_subset(mcp_client: FastMCPClient):
     ) as progress:
         task = progress.add_task("[cyan]Analyzing states...", total=len(US_STATES_SUBSET))
         
-        for state, (lat, lon) in US_STATES_SUBSET.items():
+        # One batch call; the server fetches all states concurrently
+        try:
+            batch = mcp_client.get_weather_batch(locations=[
+                {"name": state, "latitude": lat, "longitude": lon}
+                for state, (lat, lon) in US_STATES_SUBSET.items()
+            ], structured=True)
+            batch_results = batch.get("results", {})
+        except Exception as e:
+            console.print(f"[bold red]Error fetching weather batch: {str(e)}[/bold red]")
+            batch_results = {}
+        
+        for state in US_STATES_SUBSET:
             progress.update(task, description=f"[cyan]Checking {state}...")
             
-            try:
-                # Get weather from MCP
-                weather_text = mcp_client.get_weather(latitude=lat, longitude=lon)
-                weather_data[state] = weather_text
-                
-                # Check for snow
-                if is_snowing(weather_text):
-                    snowy_states.append(state)
-                    console.print(f"[bold white on blue]{state}: SNOW DETECTED![/bold white on blue]")
-                else:
-                    console.print(f"{state}: No snow detected")
-                
-                # Extract temperature
-                temp = extract_temperature(weather_text)
-                if temp is not None:
-                    temperatures.append(temp)
-                    
-                progress.advance(task)
-            except Exception as e:
-                console.print(f"[bold red]Error processing {state}: {str(e)}[/bold red]")
+            result = batch_results.get(state, {"status": "error", "error": "No result returned"})
+            if result.get("status") != "success":
+                console.print(f"[bold red]Error processing {state}: {result.get('error')}[/bold red]")
                 progress.advance(task)
+                continue
+            
+            weather_data[state] = result
+            
+            # Check for snow
+            if result["snow"]:
+                snowy_states.append(state)
+                console.print(f"[bold white on blue]{state}: SNOW DETECTED![/bold white on blue]")
+            else:
+                console.print(f"{state}: No snow detected")
+            
+            # Collect temperature
+            if result.get("temperature") is not None:
+                temperatures.append(result["temperature"])
+                
+            progress.advance(task)
     
     # Calculate temperature sum
     temp_sum = sum(temperatures) if temperatures else 0
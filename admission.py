@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import tracing
+
+
+class Overloaded(Exception):
+    """Raised when a call is shed instead of queued; the message is returned to the MCP client."""
+
+
+@dataclass
+class CostClass:
+    name: str
+    # Calls of this class running at once
+    slots: int
+    # Longest a call may wait for a slot before it is rejected
+    max_wait: float
+    # Calls allowed to wait; beyond this new calls are rejected immediately
+    max_queue: int
+
+
+def cost_class(name: str, slots: int, max_wait: float, max_queue: int) -> CostClass:
+    """CostClass with DFW_<NAME>_SLOTS / _MAX_WAIT / _MAX_QUEUE environment overrides."""
+    prefix = f"DFW_{name.upper()}"
+    return CostClass(
+        name=name,
+        slots=int(os.environ.get(f"{prefix}_SLOTS", str(slots))),
+        max_wait=float(os.environ.get(f"{prefix}_MAX_WAIT", str(max_wait))),
+        max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", str(max_queue))),
+    )
+
+
+# --- Configurations ---
+COST_CLASSES = {
+    "light": cost_class("light", slots=64, max_wait=2, max_queue=256),
+    "standard": cost_class("standard", slots=16, max_wait=10, max_queue=128),
+    "heavy": cost_class("heavy", slots=4, max_wait=20, max_queue=32),
+}
+
+
+@dataclass
+class _ClassState:
+    spec: CostClass
+    running: int = 0
+    per_client: Dict[str, int] = field(default_factory=dict)
+    # [seq, client, future]; scanned on release, bounded by max_queue
+    waiters: List[list] = field(default_factory=list)
+    # Moving average of call duration, used to predict queue wait
+    service_time: float = 0.0
+    admitted: int = 0
+    shed: int = 0
+    timed_out: int = 0
+
+
+class AdmissionController:
+    """
+    Bulkheads and fair queues in front of tool dispatch.
+
+    Each cost class has its own slots and queue, so light calls never wait
+    behind heavy ones. A waiting call is granted a slot by fairness: the client
+    with the fewest running calls in the class goes first, ties by arrival.
+    Calls are shed up front when the queue is full or when the predicted wait
+    (queue depth x average duration / slots) already exceeds max_wait, and
+    rejected if they do not get a slot within max_wait.
+    """
+
+    def __init__(self, classes: Dict[str, CostClass] = COST_CLASSES):
+        self.states = {name: _ClassState(spec) for name, spec in classes.items()}
+        self.sequence = itertools.count()
+
+    def _grant(self, state: _ClassState, client: str) -> None:
+        state.running += 1
+        state.per_client[client] = state.per_client.get(client, 0) + 1
+        state.admitted += 1
+
+    def _release(self, state: _ClassState, client: str, elapsed: Optional[float]) -> None:
+        state.running -= 1
+        remaining = state.per_client[client] - 1
+        if remaining:
+            state.per_client[client] = remaining
+        else:
+            del state.per_client[client]
+        if elapsed is not None:
+            state.service_time = elapsed if not state.service_time else 0.8 * state.service_time + 0.2 * elapsed
+        self._dispatch(state)
+
+    def _dispatch(self, state: _ClassState) -> None:
+        while state.waiters and state.running < state.spec.slots:
+            waiter = min(state.waiters, key=lambda w: (state.per_client.get(w[1], 0), w[0]))
+            state.waiters.remove(waiter)
+            _, client, future = waiter
+            if future.done():
+                continue
+            self._grant(state, client)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def admit(self, cost: str, client: str, label: str = ""):
+        state = self.states[cost]
+        spec = state.spec
+        if state.running < spec.slots and not state.waiters:
+            self._grant(state, client)
+        else:
+            if len(state.waiters) >= spec.max_queue:
+                state.shed += 1
+                raise Overloaded(f"Server busy: {len(state.waiters)} {cost} calls already queued; retry shortly")
+            predicted = state.service_time * (len(state.waiters) + 1) / spec.slots
+            if predicted > spec.max_wait:
+                state.shed += 1
+                raise Overloaded(f"Server busy: estimated wait {predicted:.1f}s for {cost} calls exceeds "
+                                 f"{spec.max_wait:.0f}s; retry shortly")
+            future = asyncio.get_running_loop().create_future()
+            waiter = [next(self.sequence), client, future]
+            state.waiters.append(waiter)
+            try:
+                with tracing.span("admission.wait", **{"dfw.cost_class": cost, "dfw.queue_depth": len(state.waiters)}):
+                    await asyncio.wait_for(future, spec.max_wait)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+                if future.done() and not future.cancelled():
+                    # Granted just as the wait ended: hand the slot on
+                    self._release(state, client, None)
+                if isinstance(e, asyncio.TimeoutError):
+                    state.timed_out += 1
+                    raise Overloaded(f"Server busy: {label or cost} call waited {spec.max_wait:.0f}s for a slot; "
+                                     f"retry shortly") from None
+                raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(state, client, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {"running": s.running, "queued": len(s.waiters), "slots": s.spec.slots, "admitted": s.admitted,
+                   "shed": s.shed, "timed_out": s.timed_out, "avg_seconds": round(s.service_time, 4)}
+            for name, s in self.states.items()
+        }
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+
+# --- Configurations ---
+# Cortex COMPLETE model that drives the server-side agent (same model as the Streamlit clients)
+ASK_MODEL = os.environ.get("DFW_ASK_MODEL", "llama3.1-70b-elevance")
+# Tool calls an `ask` may make before it must answer
+ASK_MAX_STEPS = int(os.environ.get("DFW_ASK_MAX_STEPS", "6"))
+# Tool output is cut to this many characters before it goes back into the prompt
+ASK_OBSERVATION_CHARS = int(os.environ.get("DFW_ASK_OBSERVATION_CHARS", "4000"))
+
+SYSTEM_PROMPT = """You are the DataFlyWheel assistant for HEDIS measures, value sets, weather and analytics.
+Answer the user's question, calling tools when you need data. Reply with exactly one JSON object and nothing else:
+  {{"tool": "<tool name>", "arguments": {{...}}}}   to call a tool; you will get its output back
+  {{"answer": "<final answer>"}}                     when you can answer
+Call one tool at a time and never invent tool output.
+
+Tools:
+{tools}"""
+
+Message = Dict[str, str]
+
+
+@dataclass
+class ToolSpec:
+    name: str
+    description: str
+    parameters: Dict[str, Any] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        summary = " ".join(self.description.split())[:300]
+        params = ", ".join(f"{name}: {schema.get('type', 'any')}" for name, schema in self.parameters.items())
+        return f"- {self.name}({params}): {summary}"
+
+
+def parse_action(text: str) -> Optional[Dict[str, Any]]:
+    """First JSON object in a model reply (models often wrap it in prose or code fences)."""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(value, dict):
+            return value
+        start = text.find("{", start + 1)
+    return None
+
+
+def observation(result: Any) -> str:
+    text = result if isinstance(result, str) else json.dumps(result, default=str, separators=(",", ":"))
+    if len(text) > ASK_OBSERVATION_CHARS:
+        return text[:ASK_OBSERVATION_CHARS] + f"... [{len(text) - ASK_OBSERVATION_CHARS} more characters]"
+    return text
+
+
+def completion_text(response: "requests.Response") -> str:
+    """
+    Text of a Cortex COMPLETE REST response.
+
+    The endpoint streams server-sent events ("data: {json}" lines carrying
+    choices[0].delta.content); a plain JSON body with choices[0].message is
+    accepted as well.
+    """
+    if "text/event-stream" not in response.headers.get("Content-Type", ""):
+        choice = response.json()["choices"][0]
+        return (choice.get("message") or choice.get("delta") or {}).get("content", "")
+    parts = []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        for choice in json.loads(data).get("choices", []):
+            parts.append((choice.get("delta") or {}).get("content") or "")
+    return "".join(parts)
+
+
+async def run_agent(question: str, tools: List[ToolSpec], complete: Callable[[List[Message]], Awaitable[str]],
+                    call_tool: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+                    on_step: Callable[[Dict[str, Any]], Awaitable[None]], max_steps: int = ASK_MAX_STEPS) -> Dict:
+    """
+    Reason-act loop: the model picks a tool, the tool runs in-process, its output
+    goes back to the model, until the model answers or max_steps tool calls were made.
+
+    Tool errors are fed back to the model as observations so it can recover;
+    deadline and cancellation errors end the loop.
+    """
+    allowed = {tool.name: tool for tool in tools}
+    messages: List[Message] = [
+        {"role": "system", "content": SYSTEM_PROMPT.format(tools="\n".join(t.describe() for t in tools))},
+        {"role": "user", "content": question},
+    ]
+    steps: List[Dict[str, Any]] = []
+    for number in range(1, max_steps + 1):
+        reply = await complete(messages)
+        action = parse_action(reply)
+        if action is None or "tool" not in action:
+            answer = action.get("answer") if action else None
+            return {"status": "success", "answer": answer if answer is not None else reply.strip(), "steps": steps}
+
+        name, arguments = action["tool"], action.get("arguments") or {}
+        if not isinstance(name, str) or name not in allowed:
+            result = f"Error: unknown tool {name!r}; available tools: {', '.join(allowed)}"
+        elif not isinstance(arguments, dict):
+            result = "Error: arguments must be a JSON object"
+        else:
+            try:
+                result = observation(await call_tool(name, arguments))
+            except (asyncio.CancelledError, TimeoutError):
+                raise
+            except Exception as e:
+                result = f"Error: {e}"
+        step = {"step": number, "tool": name, "arguments": arguments, "observation": result}
+        steps.append(step)
+        await on_step(step)
+        messages.append({"role": "assistant", "content": reply})
+        messages.append({"role": "user", "content": f"Observation: {result}"})
+
+    messages.append({"role": "user", "content": 'Tool limit reached. Reply now with {"answer": "..."} '
+                                                 "based on the observations so far."})
+    reply = await complete(messages)
+    action = parse_action(reply) or {}
+    return {"status": "success", "answer": action.get("answer") or reply.strip(), "steps": steps,
+            "step_limit_reached": True}
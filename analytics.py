@@ -0,0 +1,327 @@
+import math
+import statistics
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# --- Statistical accumulators shared by the analyze tool ---
+
+OPERATIONS = ["sum", "mean", "median", "min", "max"]
+VALID_OPERATIONS = OPERATIONS + ["average"]
+
+
+def normalize_operation(operation: str) -> Optional[str]:
+    """Lower-case an operation name and map 'average' to 'mean'; None if unsupported."""
+    operation = operation.lower()
+    if operation == "average":
+        operation = "mean"
+    return operation if operation in OPERATIONS else None
+
+
+def extract_numbers(raw) -> List[float]:
+    """Numeric values of a JSON list; numeric strings are accepted, anything else is skipped."""
+    return [float(n) for n in raw if isinstance(n, (int, float)) or
+            (isinstance(n, str) and n.replace('.', '', 1).isdigit())]
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Parse a CSV field as a finite float; None for blanks and non-numeric text."""
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _total(numbers) -> float:
+    """Exact sum; -inf + inf and sums past the float range fall back to IEEE addition (nan / +-inf)."""
+    try:
+        return math.fsum(numbers)
+    except (ValueError, OverflowError):
+        return sum(numbers)
+
+
+class ColumnStats:
+    """
+    Running sum/mean/min/max for one column, updated chunk by chunk.
+
+    Only the median needs every value; it is buffered in a compact float64
+    array when keep_values is set, so the other operations run in O(1) memory.
+    """
+
+    __slots__ = ("count", "total", "minimum", "maximum", "values")
+
+    def __init__(self, keep_values: bool = False):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.values = array("d") if keep_values else None
+
+    def update(self, numbers: Iterable[float]) -> None:
+        if not isinstance(numbers, (list, array, memoryview)):
+            numbers = array("d", numbers)
+        if not len(numbers):
+            return
+        total = _total(numbers)
+        if total != total:
+            # NaN marks a missing value (packed payloads); drop them only when present
+            numbers = array("d", (v for v in numbers if v == v))
+            if not numbers:
+                return
+            total = _total(numbers)
+        self.count += len(numbers)
+        self.total += total
+        self.minimum = min(self.minimum, min(numbers))
+        self.maximum = max(self.maximum, max(numbers))
+        if self.values is not None:
+            self.values.extend(numbers)
+
+    def merge(self, other: "ColumnStats") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        if self.values is not None and other.values is not None:
+            self.values.extend(other.values)
+
+    def result(self, operation: str) -> Optional[float]:
+        if not self.count:
+            return None
+        if operation == "sum":
+            return self.total
+        if operation == "mean":
+            return self.total / self.count
+        if operation == "median":
+            return statistics.median(self.values)
+        if operation == "min":
+            return self.minimum
+        if operation == "max":
+            return self.maximum
+        raise ValueError(f"Unsupported operation: {operation}")
+
+
+def compute(numbers: List[float], operation: str) -> Optional[float]:
+    """One-shot helper for an in-memory list of numbers."""
+    stats = ColumnStats(keep_values=operation == "median")
+    stats.update(numbers)
+    return stats.result(operation)
+
+
+def aggregate_chunks(chunks: Iterable[Dict[str, Iterable[float]]], operation: str) -> Dict[str, float]:
+    """Fold a stream of {column: numbers} chunks into one result per column."""
+    columns: Dict[str, ColumnStats] = {}
+    for chunk in chunks:
+        for key, numbers in chunk.items():
+            stats = columns.get(key)
+            if stats is None:
+                stats = columns[key] = ColumnStats(keep_values=operation == "median")
+            stats.update(numbers)
+    return {key: stats.result(operation) for key, stats in columns.items() if stats.count}
+
+
+# --- Group-by, fixed windows, resampling and rolling windows ---
+
+class AnalysisError(ValueError):
+    """Raised for invalid analysis parameters; reported to the caller as-is."""
+
+
+RESAMPLE_RULES = ["hour", "day", "week", "month"]
+
+
+def to_number(value) -> float:
+    """Row-aligned variant of extract_numbers: non-numeric cells become NaN instead of being dropped."""
+    if isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        parsed = parse_number(value)
+        if parsed is not None:
+            return parsed
+    return math.nan
+
+
+def time_bucket(value, rule: str) -> Optional[str]:
+    """Truncate an ISO-8601 string or epoch-seconds value to the start of its hour/day/week/month."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        moment = datetime.fromtimestamp(value, tz=timezone.utc)
+    else:
+        epoch = parse_number(value) if isinstance(value, str) else None
+        if epoch is not None:
+            moment = datetime.fromtimestamp(epoch, tz=timezone.utc)
+        else:
+            moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if rule == "hour":
+        return moment.strftime("%Y-%m-%dT%H:00")
+    if rule == "day":
+        return moment.strftime("%Y-%m-%d")
+    if rule == "week":
+        return (moment.date() - timedelta(days=moment.weekday())).isoformat()
+    if rule == "month":
+        return moment.strftime("%Y-%m")
+    raise AnalysisError(f"Invalid resample rule. Choose from: {', '.join(RESAMPLE_RULES)}")
+
+
+def align_columns(data: Dict[str, list], keys: List[str]) -> Dict[str, Any]:
+    """Turn an inline {column: values} dict into one row-aligned chunk; key columns keep raw values."""
+    rows = max((len(values) for values in data.values() if isinstance(values, list)), default=0)
+    chunk: Dict[str, Any] = {}
+    for name, values in data.items():
+        if not isinstance(values, list):
+            continue
+        padded = values + [None] * (rows - len(values))
+        chunk[name] = padded if name in keys else array("d", map(to_number, padded))
+    return chunk
+
+
+def grouped_aggregate(chunks: Iterable[Dict[str, Any]], operation: str, group_by: Optional[List[str]] = None,
+                      time_column: Optional[str] = None, resample: Optional[str] = None,
+                      window: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Hash-aggregate row-aligned chunks in a single pass.
+
+    Each chunk is bucketed once into {group key: row indices}; every group's rows are
+    then reduced per column with the batch ColumnStats.update, so the per-row Python
+    work is limited to computing the key. Returns one flat record per group, in order
+    of first appearance.
+    """
+    group_by = list(group_by or [])
+    if resample and not time_column:
+        raise AnalysisError("resample requires a time_column")
+    if resample and resample not in RESAMPLE_RULES:
+        raise AnalysisError(f"Invalid resample rule. Choose from: {', '.join(RESAMPLE_RULES)}")
+    if window is not None and window < 1:
+        raise AnalysisError("window must be a positive number of rows")
+
+    key_names = group_by + ([time_column] if resample else []) + (["window"] if window else [])
+    raw_keys = set(group_by) | ({time_column} if time_column else set())
+    groups: Dict[tuple, Dict[str, ColumnStats]] = {}
+    offset = 0
+
+    for chunk in chunks:
+        numeric = {name: values for name, values in chunk.items() if name not in raw_keys}
+        rows = max((len(values) for values in chunk.values()), default=0)
+        if not rows:
+            continue
+        missing = [name for name in group_by + ([time_column] if resample else []) if name not in chunk]
+        if missing:
+            raise AnalysisError(f"Unknown column(s): {', '.join(missing)}. "
+                                f"Available: {', '.join(chunk) or 'none'}")
+        parts = [chunk.get(name) or [None] * rows for name in group_by]
+        if resample:
+            parts.append([time_bucket(v, resample) for v in chunk.get(time_column) or [None] * rows])
+        if window:
+            parts.append([(offset + i) // window for i in range(rows)])
+
+        index: Dict[tuple, List[int]] = {}
+        for i, key in enumerate(zip(*parts) if parts else [()] * rows):
+            bucket = index.get(key)
+            if bucket is None:
+                bucket = index[key] = []
+            bucket.append(i)
+
+        for key, positions in index.items():
+            columns = groups.get(key)
+            if columns is None:
+                columns = groups[key] = {}
+            for name, values in numeric.items():
+                picked = [v for v in map(values.__getitem__, positions) if v == v]
+                if not picked:
+                    continue
+                stats = columns.get(name)
+                if stats is None:
+                    stats = columns[name] = ColumnStats(keep_values=operation == "median")
+                stats.update(picked)
+        offset += rows
+
+    records = []
+    for key, columns in groups.items():
+        values = {name: stats.result(operation) for name, stats in columns.items() if stats.count}
+        if values:
+            record = dict(zip(key_names, key))
+            record.update(values)
+            records.append(record)
+    return records
+
+
+class RollingWindow:
+    """
+    Trailing window of the last `size` rows; push() returns the window's statistic once it is full.
+
+    NaN marks a missing value (as in packed payloads): it takes up its row in the
+    window but is left out of the statistic, which is None while the window
+    holds no values at all.
+    """
+
+    def __init__(self, size: int, operation: str):
+        if size < 1:
+            raise AnalysisError("rolling must be a positive number of rows")
+        self.size = size
+        self.operation = operation
+        self.items: deque = deque()
+        self.count = 0
+        self.total = 0.0
+        self.ordered: List[float] = []
+        self.low: deque = deque()
+        self.high: deque = deque()
+        self.seen = 0
+
+    def push(self, value: float) -> Optional[float]:
+        self.items.append(value)
+        if not math.isnan(value):
+            self.count += 1
+            self.total += value
+            if self.operation == "median":
+                insort(self.ordered, value)
+            while self.low and self.low[-1][1] > value:
+                self.low.pop()
+            self.low.append((self.seen, value))
+            while self.high and self.high[-1][1] < value:
+                self.high.pop()
+            self.high.append((self.seen, value))
+        self.seen += 1
+
+        if len(self.items) > self.size:
+            dropped = self.items.popleft()
+            if not math.isnan(dropped):
+                self.count -= 1
+                self.total -= dropped
+                if self.operation == "median":
+                    del self.ordered[bisect_left(self.ordered, dropped)]
+        start = self.seen - self.size
+        while self.low and self.low[0][0] < start:
+            self.low.popleft()
+        while self.high and self.high[0][0] < start:
+            self.high.popleft()
+
+        if len(self.items) < self.size or not self.count:
+            return None
+        if self.operation == "sum":
+            return self.total
+        if self.operation == "mean":
+            return self.total / self.count
+        if self.operation == "median":
+            return statistics.median(self.ordered)
+        if self.operation == "min":
+            return self.low[0][1]
+        return self.high[0][1]
+
+
+def rolling_aggregate(chunks: Iterable[Dict[str, Iterable[float]]], operation: str, size: int) -> Dict[str, List[Optional[float]]]:
+    """Rolling statistic per column over a stream of chunks; the first size-1 positions are None."""
+    windows: Dict[str, RollingWindow] = {}
+    results: Dict[str, List[Optional[float]]] = {}
+    for chunk in chunks:
+        for name, numbers in chunk.items():
+            window = windows.get(name)
+            if window is None:
+                window = windows[name] = RollingWindow(size, operation)
+                results[name] = []
+            results[name].extend(map(window.push, numbers))
+    return results
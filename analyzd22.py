@@ -1,8 +1,13 @@
 import streamlit as st
 import asyncio
+import base64
+import hashlib
 import nest_asyncio
 import json
-from typing import Dict, Any, List, Union
+import sys
+import requests
+from array import array
+from typing import Dict, Any, List, Optional, Union
 
 from mcp.client.sse import sse_client
 from mcp import ClientSession
@@ -10,6 +15,37 @@ from mcp import ClientSession
 # Enable nested async for Streamlit
 nest_asyncio.apply()
 
+PACK_THRESHOLD = 10000
+
+
+def value_count(data) -> int:
+    """Number of values in a list input or across a dict of columns."""
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        return sum(len(values) for values in data.values() if isinstance(values, list))
+    return 0
+
+
+def encode_packed(data: Union[List[float], Dict[str, List[float]]]) -> dict:
+    """Packed float64 payload (the analyze tool's 'packed' argument) for a list or equal-length columns."""
+    if isinstance(data, dict):
+        if len({len(values) for values in data.values()}) > 1:
+            raise ValueError("All columns of a packed payload must have the same length")
+        values = array("d")
+        for column in data.values():
+            values.extend(array("d", column))
+        shape = [len(data), len(next(iter(data.values()), []))]
+    else:
+        values = array("d", data)
+        shape = [len(values)]
+    if sys.byteorder != "little":
+        values.byteswap()
+    payload = {"dtype": "float64", "shape": shape, "data": base64.b64encode(values.tobytes()).decode("ascii")}
+    if isinstance(data, dict):
+        payload["columns"] = list(data)
+    return payload
+
 # Page configuration
 st.set_page_config(page_title="MCP JSON Analyzer", page_icon="📊")
 st.title("📊 MCP JSON Analyzer")
@@ -20,10 +56,11 @@ operation = st.sidebar.selectbox("📈 Select Operation", ["sum", "mean", "media
 show_server_info = st.sidebar.checkbox("🧰 Show Available MCP Tools")
 
 # File uploader
-uploaded_file = st.file_uploader("📤 Upload a JSON file to analyze", type=["json"])
+uploaded_file = st.file_uploader("📤 Upload a file to analyze", type=["json", "csv", "ndjson", "jsonl", "parquet"])
 json_data = None
+source_ref = None
 
-if uploaded_file is not None:
+if uploaded_file is not None and uploaded_file.name.lower().endswith(".json"):
     try:
         json_data = json.load(uploaded_file)
         st.subheader("📄 Uploaded JSON")
@@ -31,13 +68,40 @@ if uploaded_file is not None:
     except Exception as e:
         st.error(f"❌ Invalid JSON file: {e}")
         json_data = None
+elif uploaded_file is not None:
+    # Large tabular files are streamed to the server once and analyzed by reference
+    # Keyed by content, so a changed file with the same name is uploaded again
+    upload_key = f"{uploaded_file.name}:{hashlib.sha256(uploaded_file.getbuffer()).hexdigest()}"
+    if st.session_state.get("uploaded_key") != upload_key:
+        try:
+            base_url = server_url.rsplit("/sse", 1)[0]
+            resp = requests.post(f"{base_url}/uploads", params={"filename": uploaded_file.name}, data=uploaded_file)
+            resp.raise_for_status()
+            st.session_state["uploaded_source"] = resp.json().get("source")
+            st.session_state["uploaded_key"] = upload_key
+        except Exception as e:
+            st.error(f"❌ Upload failed: {e}")
+    source_ref = st.session_state.get("uploaded_source")
+    if source_ref:
+        st.info(f"📄 Uploaded as {source_ref}")
 
 # Function to call analyze tool
-async def analyze_with_mcp(json_input: Union[List, Dict], operation: str) -> Dict[str, Any]:
+async def analyze_with_mcp(json_input: Optional[Union[List, Dict]], operation: str, source: Optional[str] = None) -> Dict[str, Any]:
+    arguments = {"operation": operation}
+    if source:
+        arguments["source"] = source
+    elif value_count(json_input) >= PACK_THRESHOLD:
+        # Large all-numeric inputs travel as a packed float64 buffer instead of a JSON array
+        try:
+            arguments["packed"] = encode_packed(json_input)
+        except (TypeError, ValueError):
+            arguments["data"] = json_input
+    else:
+        arguments["data"] = json_input
     async with sse_client(url=server_url) as sse_conn:
         async with ClientSession(*sse_conn) as session:
             await session.initialize()
-            return await session.call_tool("analyze", {"data": json_input, "operation": operation})
+            return await session.call_tool("analyze", arguments)
 
 # Function to list tools
 async def show_mcp_tools():
@@ -58,11 +122,11 @@ if show_server_info:
         st.sidebar.error(f"⚠️ Could not fetch tools: {e}")
 
 # Run analysis when button is clicked
-if st.button("▶️ Run Analysis") and json_data:
+if st.button("▶️ Run Analysis") and (json_data or source_ref):
     with st.spinner("Analyzing..."):
         try:
             loop = asyncio.get_event_loop()
-            result = loop.run_until_complete(analyze_with_mcp(json_data, operation))  # ✅ FIXED
+            result = loop.run_until_complete(analyze_with_mcp(json_data, operation, source_ref))  # ✅ FIXED
 
             st.subheader("📦 Raw Server Response")
             st.write(result)
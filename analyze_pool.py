@@ -0,0 +1,205 @@
+import asyncio
+import math
+import multiprocessing
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from analytics import ColumnStats, extract_numbers
+
+
+# --- Configurations ---
+# Inputs with fewer values than this stay on the inline fast path
+PARALLEL_MIN_VALUES = int(os.environ.get("DFW_PARALLEL_MIN_VALUES", "1000000"))
+PARALLEL_WORKERS = int(os.environ.get("DFW_PARALLEL_WORKERS", str(os.cpu_count() or 2)))
+# Wide inputs (at least this many columns) are sharded one column per shard, so they
+# need no cross-shard median selection and pay off from a lower value count
+PARALLEL_MIN_COLUMNS = int(os.environ.get("DFW_PARALLEL_MIN_COLUMNS", "32"))
+PARALLEL_MIN_WIDE_VALUES = int(os.environ.get("DFW_PARALLEL_MIN_WIDE_VALUES", "250000"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all analyze calls, created on first use."""
+    global _pool
+    if _pool is None:
+        # spawn: forking a threaded event-loop process is unsafe. Each worker re-imports the
+        # launching script as __mp_main__, so the server modules only construct objects at
+        # import (databases, prompt file and threads are opened on first use) and start
+        # serving under `if __name__ == "__main__"`.
+        _pool = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def input_size(data) -> int:
+    if isinstance(data, (list, array, memoryview)):
+        return len(data)
+    if isinstance(data, dict):
+        return sum(len(values) for values in data.values() if isinstance(values, (list, array, memoryview)))
+    return 0
+
+
+def column_count(data) -> int:
+    if isinstance(data, dict):
+        return sum(1 for values in data.values() if isinstance(values, (list, array, memoryview)))
+    return 1 if isinstance(data, (list, array, memoryview)) else 0
+
+
+def should_parallelize(data) -> bool:
+    """Long inputs by total value count; wide inputs by column count and a lower value count."""
+    if PARALLEL_WORKERS <= 1:
+        return False
+    size = input_size(data)
+    if size >= PARALLEL_MIN_VALUES:
+        return True
+    return column_count(data) >= PARALLEL_MIN_COLUMNS and size >= PARALLEL_MIN_WIDE_VALUES
+
+
+# --- Worker side ---
+
+def _shard_stats(shm_name: str, start: int, stop: int, sort: bool) -> ColumnStats:
+    """Partial aggregate over values [start, stop) of a shared float64 block; sorts the range in place if asked."""
+    shm = SharedMemory(name=shm_name)
+    view = shm.buf.cast("d")
+    shard = view[start:stop]
+    try:
+        stats = ColumnStats()
+        stats.update(shard)
+        if sort:
+            # NaN (missing) values are dropped; the sorted values fill the front of the range
+            ordered = sorted(shard) if stats.count == len(shard) else sorted(v for v in shard if v == v)
+            shard[:len(ordered)] = array("d", ordered)
+        return stats
+    finally:
+        shard.release()
+        view.release()
+        shm.close()
+
+
+# --- Parent side ---
+
+def _kth(shards: Sequence[Sequence[float]], k: int) -> float:
+    """k-th smallest (0-based) value across independently sorted shards, without merging them."""
+    for shard in shards:
+        lo, hi = 0, len(shard)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = shard[mid]
+            below = sum(bisect_left(s, value) for s in shards)
+            through = sum(bisect_right(s, value) for s in shards)
+            if through <= k:
+                lo = mid + 1
+            elif below > k:
+                hi = mid
+            else:
+                return value
+    raise IndexError(k)
+
+
+def _median(shards: Sequence[Sequence[float]], count: int) -> float:
+    middle = count // 2
+    if count % 2:
+        return _kth(shards, middle)
+    return (_kth(shards, middle - 1) + _kth(shards, middle)) / 2
+
+
+def _plan(lengths: Dict[str, int]) -> List[Tuple[str, int, int]]:
+    """
+    Split the packed columns into (column, start, stop) shards.
+
+    Wide inputs get one shard per column; long columns are cut into row ranges
+    so every worker gets a comparable share of the values.
+    """
+    if len(lengths) >= PARALLEL_MIN_COLUMNS:
+        shards = []
+        offset = 0
+        for name, length in lengths.items():
+            shards.append((name, offset, offset + length))
+            offset += length
+        return shards
+    total = sum(lengths.values())
+    target = max(1, math.ceil(total / (PARALLEL_WORKERS * 2)))
+    shards = []
+    offset = 0
+    for name, length in lengths.items():
+        pieces = max(1, math.ceil(length / target))
+        step = math.ceil(length / pieces)
+        for start in range(0, length, step):
+            shards.append((name, offset + start, offset + min(length, start + step)))
+        offset += length
+    return shards
+
+
+async def aggregate_parallel(columns: Dict[str, Sequence[float]], operation: str) -> Dict[str, float]:
+    """Pack the columns into one shared-memory block, reduce shards in the process pool and merge the partials."""
+    columns = {name: values for name, values in columns.items() if values}
+    total = sum(len(values) for values in columns.values())
+    if not total:
+        return {}
+
+    shm = SharedMemory(create=True, size=total * 8)
+    view = shm.buf.cast("d")
+    try:
+        offset = 0
+        for name, values in columns.items():
+            view[offset:offset + len(values)] = values
+            offset += len(values)
+
+        sort = operation == "median"
+        shards = _plan({name: len(values) for name, values in columns.items()})
+        loop = asyncio.get_running_loop()
+        partials = await asyncio.gather(*[
+            loop.run_in_executor(get_pool(), _shard_stats, shm.name, start, stop, sort)
+            for _, start, stop in shards
+        ])
+
+        merged: Dict[str, ColumnStats] = {}
+        ranges: Dict[str, List[Tuple[int, int]]] = {}
+        for (name, start, stop), partial in zip(shards, partials):
+            if name not in merged:
+                merged[name] = ColumnStats()
+            merged[name].merge(partial)
+            ranges.setdefault(name, []).append((start, start + partial.count))
+
+        if not sort:
+            return {name: stats.result(operation) for name, stats in merged.items() if stats.count}
+
+        result = {}
+        for name, stats in merged.items():
+            if not stats.count:
+                continue
+            sorted_shards = [view[start:stop] for start, stop in ranges[name]]
+            try:
+                result[name] = _median(sorted_shards, stats.count)
+            finally:
+                for shard in sorted_shards:
+                    shard.release()
+        return result
+    finally:
+        view.release()
+        shm.close()
+        shm.unlink()
+
+
+def _to_columns(data: Union[list, dict]) -> Dict[str, array]:
+    if isinstance(data, list):
+        return {"value": array("d", extract_numbers(data))}
+    return {key: array("d", extract_numbers(values)) for key, values in data.items() if isinstance(values, list)}
+
+
+async def analyze_parallel(data: Union[list, dict], operation: str):
+    """
+    Parallel counterpart of the inline list/dict analysis.
+
+    Returns a single value for list input and {column: value} for dict input,
+    or None/{} when no numeric values are present.
+    """
+    columns = await asyncio.to_thread(_to_columns, data)
+    result = await aggregate_parallel(columns, operation)
+    if isinstance(data, list):
+        return result.get("value")
+    return result
@@ -1,19 +1,39 @@
+import asyncio
+import hmac
+import os
 import uvicorn
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from mcp.server.sse import SseServerTransport
 from starlette.routing import Mount
 import logging
 from loguru import logger
 
 # Import your MCP server implementation
-from server_implementation import mcp, analyze
+from server_implementation import mcp, analyze, email_outbox
+from data_sources import UPLOAD_MAX_BYTES, SourceError, commit_upload, create_upload
+from metrics import REGISTRY
+import tracing
+from result_cache import new_hasher
+
+# --- Configurations ---
+# Bearer token for the /admin endpoints; when unset they only answer loopback clients
+ADMIN_TOKEN = os.environ.get("DFW_ADMIN_TOKEN", "")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Drain mail left queued by a previous run without waiting for a new send
+    email_outbox.start()
+    yield
+    email_outbox.stop()
+
 # Create FastAPI app
-app = FastAPI(title="DataFlyWheel MCP Analyzer")
+app = FastAPI(title="DataFlyWheel MCP Analyzer", lifespan=lifespan)
 
 # Add CORS middleware to allow cross-origin requests
 app.add_middleware(
@@ -24,6 +44,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upload bytes are buffered to this size and written to the spool file off the event loop
+UPLOAD_WRITE_BYTES = 1024 * 1024
+
 # Set up SSE transport for MCP
 sse = SseServerTransport("/messages")
 app.router.routes.append(Mount("/messages", app=sse.handle_post_message))
@@ -72,12 +95,109 @@ async def analyze_endpoint(request: Request):
     This provides compatibility with clients that can't use the MCP protocol
     """
     data = await request.json()
-    if "data" in data and "operation" in data:
-        result = await analyze(data["data"], data["operation"])
+    if "operation" in data and ("data" in data or "source" in data):
+        result = await analyze(
+            data.get("data"),
+            operation=data["operation"],
+            source=data.get("source"),
+            file_format=data.get("file_format"),
+            columns=data.get("columns"),
+        )
         return result
     else:
         return {"status": "error", "error": "Missing data or operation parameter"}
 
+@app.post("/uploads", tags=["Analysis"])
+async def upload_endpoint(request: Request, filename: str):
+    """
+    Streams a CSV, NDJSON or Parquet file to the server's upload spool
+    The returned upload:// reference can be passed to analyze as 'source',
+    so large files never travel through MCP tool arguments. References are
+    content hashes, so re-uploading the same file yields the same reference.
+    Bodies over DFW_UPLOAD_MAX_BYTES are rejected with 413.
+    """
+    too_large = {"status": "error", "error": f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit"}
+    try:
+        declared = int(request.headers.get("Content-Length") or 0)
+    except ValueError:
+        declared = -1
+    if declared < 0:
+        return JSONResponse({"status": "error", "error": "Invalid Content-Length header"}, status_code=400)
+    if declared > UPLOAD_MAX_BYTES:
+        return JSONResponse(too_large, status_code=413)
+    try:
+        path = create_upload(filename)
+    except SourceError as e:
+        return {"status": "error", "error": str(e)}
+
+    size = 0
+    hasher = new_hasher()
+    try:
+        with open(path, "wb") as fh:
+            buffer = bytearray()
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    break
+                hasher.update(chunk)
+                buffer += chunk
+                if len(buffer) >= UPLOAD_WRITE_BYTES:
+                    await asyncio.to_thread(fh.write, bytes(buffer))
+                    buffer.clear()
+            else:
+                await asyncio.to_thread(fh.write, bytes(buffer))
+        if size > UPLOAD_MAX_BYTES:
+            os.remove(path)
+            return JSONResponse(too_large, status_code=413)
+        source = await asyncio.to_thread(commit_upload, path, hasher.hexdigest())
+    except BaseException:
+        # Failed or disconnected uploads leave no partial spool file behind
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    logger.info(f"Stored upload {source} ({size} bytes)")
+    return {"status": "success", "source": source, "bytes": size}
+
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics_endpoint():
+    """
+    Prometheus scrape endpoint
+    Per-tool and per-resource call counts, errors, latency and payload size
+    histograms and in-flight gauges, plus pool utilization, circuit breaker
+    state and cache hit ratios.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(request: Request) -> None:
+    """Traces carry request URLs and backend error text, so /admin is not public."""
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {ADMIN_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Admin token required")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Set DFW_ADMIN_TOKEN to use /admin from other hosts")
+
+@app.get("/admin/traces/slowest", tags=["Monitoring"], dependencies=[Depends(require_admin)])
+async def slowest_traces(limit: int = 20, name: str = None):
+    """
+    Slowest recent tool and resource traces
+    Each entry has the trace_id, root span name (e.g. "tool DFWAnalyst"),
+    duration, error and span count; filter by root span name with `name`.
+    """
+    return {"status": "success", "traces": tracing.store.top(limit, name)}
+
+@app.get("/admin/traces/{trace_id}", tags=["Monitoring"], dependencies=[Depends(require_admin)])
+async def get_trace(trace_id: str):
+    """
+    One trace with all its spans, in OTLP/JSON (ExportTraceServiceRequest)
+    Calls that continued the same client trace are merged into one request.
+    """
+    traces = tracing.store.get(trace_id)
+    if not traces:
+        return {"status": "error", "error": f"Trace {trace_id} is not retained"}
+    return tracing.to_otlp(traces)
+
 # Include your other routes if needed
 # from router import route
 # app.include_router(route)
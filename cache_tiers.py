@@ -0,0 +1,330 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+import deadlines
+from result_cache import ResultCache, new_hasher
+
+
+# --- Configurations ---
+# Local disk tier shared by every worker process on the host
+TOOL_CACHE_PATH = os.environ.get("DFW_TOOL_CACHE_PATH", "tool_cache.db")
+# Optional shared tier: any Redis-protocol server (redis://host:port/db); disabled when unset
+TOOL_CACHE_REDIS_URL = os.environ.get("DFW_TOOL_CACHE_REDIS_URL", "")
+# After a Redis error the tier is skipped for this long instead of adding latency to every call
+REDIS_RETRY_SECONDS = float(os.environ.get("DFW_TOOL_CACHE_REDIS_RETRY_SECONDS", "30"))
+
+# (value, fresh_until, stale_until) in epoch seconds
+Entry = Tuple[Any, float, float]
+
+
+class MemoryTier:
+    """Per-process LRU with a byte budget (ResultCache), holding live Python values."""
+
+    def __init__(self, max_bytes: int):
+        self.cache = ResultCache(max_bytes)
+
+    def get(self, key: str) -> Optional[Entry]:
+        return self.cache.get(key)
+
+    def set(self, key: str, entry: Entry) -> None:
+        self.cache.put(key, entry)
+
+
+class DiskTier:
+    """
+    SQLite store (WAL) shared by all processes on the host, namespaced per cached function.
+
+    Entries past their stale horizon are ignored and pruned; when a namespace grows
+    past max_bytes the least recently written entries are dropped.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, path: str, namespace: str, max_bytes: int):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened (and the table created) on first use, not when @cached decorates a tool at import
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS tool_cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                    " fresh_until REAL NOT NULL, stale_until REAL NOT NULL, size INTEGER NOT NULL, written_at REAL NOT NULL,"
+                    " PRIMARY KEY (namespace, key))"
+                )
+            self.local.db = db
+        return db
+
+    def get(self, key: str) -> Optional[Entry]:
+        row = self._db().execute(
+            "SELECT value, fresh_until, stale_until FROM tool_cache WHERE namespace = ? AND key = ? AND stale_until > ?",
+            (self.namespace, key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key: str, entry: Entry) -> None:
+        value, fresh_until, stale_until = entry
+        encoded = json.dumps(value, separators=(",", ":"))
+        if len(encoded) > self.max_bytes:
+            return
+        now = time.time()
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (self.namespace, key, encoded, fresh_until, stale_until, len(encoded), now))
+        self.writes += 1
+        if self.writes % self.PRUNE_EVERY == 0:
+            self.prune(now)
+
+    def prune(self, now: float) -> None:
+        with self._db() as db:
+            db.execute("DELETE FROM tool_cache WHERE namespace = ? AND stale_until <= ?", (self.namespace, now))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM tool_cache WHERE namespace = ?",
+                               (self.namespace,)).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            for key, size in db.execute("SELECT key, size FROM tool_cache WHERE namespace = ? ORDER BY written_at",
+                                        (self.namespace,)).fetchall():
+                db.execute("DELETE FROM tool_cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                excess -= size
+                if excess <= 0:
+                    break
+
+
+class RedisTier:
+    """
+    Shared tier on any Redis-protocol server (Redis, Valkey, KeyDB, a local stand-in).
+
+    Entries are stored as JSON with a PX expiry at the stale horizon. The redis
+    package is imported lazily; if it is missing or the server errors, the tier
+    reports misses and is retried after REDIS_RETRY_SECONDS.
+    """
+
+    def __init__(self, url: str, namespace: str):
+        self.url = url
+        self.prefix = f"dfw:cache:{namespace}:"
+        self.client = None
+        self.down_until = 0.0
+
+    def _client(self):
+        if time.monotonic() < self.down_until:
+            return None
+        if self.client is None:
+            try:
+                import redis
+            except ImportError:
+                logger.warning("DFW_TOOL_CACHE_REDIS_URL is set but the redis package is not installed; "
+                               "install it with: pip install redis")
+                self.down_until = float("inf")
+                return None
+            self.client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self.client
+
+    def _failed(self, e: Exception) -> None:
+        logger.warning(f"Redis cache tier unavailable: {e}")
+        self.down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def get(self, key: str) -> Optional[Entry]:
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self.prefix + key)
+        except Exception as e:
+            self._failed(e)
+            return None
+        if raw is None:
+            return None
+        value, fresh_until, stale_until = json.loads(raw)
+        return value, fresh_until, stale_until
+
+    def set(self, key: str, entry: Entry) -> None:
+        client = self._client()
+        if client is None:
+            return
+        ttl_ms = int((entry[2] - time.time()) * 1000)
+        if ttl_ms <= 0:
+            return
+        try:
+            client.set(self.prefix + key, json.dumps(entry, separators=(",", ":")), px=ttl_ms)
+        except Exception as e:
+            self._failed(e)
+
+
+class TieredCache:
+    """
+    Read-through chain of cache tiers, fastest first: memory -> disk -> Redis.
+
+    A hit in a lower tier is copied into the tiers above it; writes go to every
+    tier. Values that are not JSON-serializable stay in the memory tier only.
+    """
+
+    def __init__(self, name: str, max_bytes: int, path: str = TOOL_CACHE_PATH, redis_url: str = TOOL_CACHE_REDIS_URL):
+        self.name = name
+        self.tiers: List[Any] = [MemoryTier(max_bytes)]
+        if path:
+            self.tiers.append(DiskTier(path, name, max_bytes))
+        if redis_url:
+            self.tiers.append(RedisTier(redis_url, name))
+        self.hits = [0] * len(self.tiers)
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, key: str, start: int = 0) -> Optional[Entry]:
+        for level in range(start, len(self.tiers)):
+            tier = self.tiers[level]
+            try:
+                entry = tier.get(key)
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning(f"Cache tier {type(tier).__name__} read failed: {e}")
+                continue
+            if entry is not None:
+                self.hits[level] += 1
+                for upper in self.tiers[:level]:
+                    upper.set(key, entry)
+                return entry
+        self.misses += 1
+        return None
+
+    def set(self, key: str, entry: Entry) -> None:
+        self.tiers[0].set(key, entry)
+        for tier in self.tiers[1:]:
+            try:
+                tier.set(key, entry)
+            except (TypeError, ValueError):
+                # Not JSON-serializable: memory only
+                return
+            except sqlite3.Error as e:
+                logger.warning(f"Cache tier {type(tier).__name__} write failed: {e}")
+
+    def stats(self) -> dict:
+        return {"name": self.name, "tiers": [type(t).__name__ for t in self.tiers], "hits": self.hits,
+                "misses": self.misses, "stale_served": self.stale}
+
+
+# Every cache created by @cached, by name
+CACHES: Dict[str, TieredCache] = {}
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+def is_error_result(result: Any) -> bool:
+    """
+    Tools report most failures by returning them: {"status": "error", ...},
+    {"error": ...} without a status, or text starting with "Error" (often after
+    a leading space, e.g. " Error: division by zero").
+    """
+    if isinstance(result, dict):
+        status = result.get("status")
+        return status == "error" or (status is None and "error" in result)
+    if isinstance(result, str):
+        return result.lstrip().startswith("Error")
+    return False
+
+
+def cacheable_result(result: Any) -> bool:
+    """Default cache_if: do not cache error results."""
+    return not is_error_result(result)
+
+
+def cached(ttl: float, stale_while_revalidate: float = 0, max_bytes: int = 16 * 1024 * 1024,
+           name: Optional[str] = None, cache_if: Callable[[Any], bool] = cacheable_result,
+           ignore: Tuple[type, ...] = ()):
+    """
+    Cache an async tool's results in a TieredCache.
+
+    ttl: seconds a result is served as fresh.
+    stale_while_revalidate: further seconds a stale result is served immediately
+        while one background call refreshes it.
+    max_bytes: budget of the memory tier and of this tool's disk namespace.
+    ignore: argument types left out of the key (e.g. the MCP Context).
+
+    Place it below @mcp.tool so FastMCP still sees the original signature.
+    """
+
+    def decorator(fn):
+        cache = CACHES[name or fn.__name__] = TieredCache(name or fn.__name__, max_bytes)
+        signature = inspect.signature(fn)
+        refreshing: Dict[str, asyncio.Task] = {}
+
+        def make_key(args, kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if not isinstance(v, ignore)}
+            hasher = new_hasher()
+            hasher.update(json.dumps(params, sort_keys=True, separators=(",", ":"), default=_jsonable).encode())
+            return hasher.hexdigest()
+
+        async def compute_and_store(key: str, args, kwargs):
+            result = await fn(*args, **kwargs)
+            if cache_if(result):
+                now = time.time()
+                entry = (result, now + ttl, now + ttl + stale_while_revalidate)
+                await asyncio.to_thread(cache.set, key, entry)
+            return result
+
+        async def background_refresh(key: str, args, kwargs) -> None:
+            # Detached from the tool call that served the stale value, with a deadline of its own
+            with deadlines.call_scope(deadlines.TOOL_TIMEOUT_SECONDS, f"refresh of {cache.name}"):
+                await compute_and_store(key, args, kwargs)
+
+        def refresh(key: str, args, kwargs) -> None:
+            if key in refreshing:
+                return
+            task = asyncio.ensure_future(background_refresh(key, args, kwargs))
+            refreshing[key] = task
+
+            def done(t: asyncio.Task) -> None:
+                refreshing.pop(key, None)
+                if not t.cancelled() and t.exception() is not None:
+                    logger.warning(f"Background refresh of {cache.name} failed: {t.exception()}")
+
+            task.add_done_callback(done)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            # Memory tier inline; disk and Redis lookups off the event loop
+            entry = cache.get(key, 0) if len(cache.tiers) == 1 else cache.tiers[0].get(key)
+            if entry is None and len(cache.tiers) > 1:
+                entry = await asyncio.to_thread(cache.get, key, 1)
+            elif entry is not None and len(cache.tiers) > 1:
+                cache.hits[0] += 1
+            now = time.time()
+            if entry is not None:
+                value, fresh_until, stale_until = entry
+                if now < fresh_until:
+                    return value
+                if now < stale_until:
+                    cache.stale += 1
+                    refresh(key, args, kwargs)
+                    return value
+            return await compute_and_store(key, args, kwargs)
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -3,10 +3,17 @@ from pydantic import BaseModel
 from atlassian import Confluence
 import requests
 
+from resilience import Backend
+
 # === Hardcoded Configuration ===
 BASE_URL = "https://confluence.elevancehealth.com"
 PAT = 
 
+REQUEST_TIMEOUT = 30
+
+# === Circuit breaker (and hedged reads) for the Confluence backend ===
+confluence_backend = Backend("confluence", hedge=True)
+
 # === Initialize FastMCP server ===
 mcp = FastMCP("Confluence MCP Server", port=8000)
 
@@ -35,7 +42,15 @@ def search_confluence(input: SearchInput) -> list:
             "Authorization": f"Bearer {PAT}",
             "Accept": "application/json"
         }
-        response = requests.get(url, headers=headers, verify=True)
+
+        def fetch():
+            response = requests.get(url, headers=headers, verify=True, timeout=REQUEST_TIMEOUT)
+            # Throttling and server errors trip the breaker; other statuses are reported below
+            if response.status_code >= 500 or response.status_code == 429:
+                response.raise_for_status()
+            return response
+
+        response = confluence_backend.call(fetch)
         if response.status_code == 200:
             results = response.json().get("results", [])
             return [
@@ -57,11 +72,16 @@ def get_confluence_page(space_key: str, page_title: str) -> dict:
     Retrieve a Confluence page by space key and title.
     """
     try:
-        # Fetch the page by title
-        page = confluence.get_page_by_title(space=space_key, title=page_title)
-        if page:
+        def fetch():
+            # Fetch the page by title
+            page = confluence.get_page_by_title(space=space_key, title=page_title)
+            if not page:
+                return None, None
             # Retrieve the page content
-            content = confluence.get_page_by_id(page_id=page["id"], expand="body.storage")
+            return page, confluence.get_page_by_id(page_id=page["id"], expand="body.storage")
+
+        page, content = confluence_backend.call(fetch)
+        if page:
             return {
                 "id": page["id"],
                 "title": page["title"],
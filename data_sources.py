@@ -0,0 +1,266 @@
+import csv
+import json
+import math
+import mmap
+import os
+import tempfile
+import time
+import uuid
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import deadlines
+from analytics import parse_number, to_number
+
+
+# --- Configurations ---
+# Uploaded blobs are spooled here and referenced as upload://<id>
+UPLOAD_DIR = os.environ.get("DFW_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "dfw_uploads"))
+UPLOAD_TTL_SECONDS = int(os.environ.get("DFW_UPLOAD_TTL_SECONDS", "3600"))
+# Largest accepted upload; bigger bodies are rejected and their spool file removed
+UPLOAD_MAX_BYTES = int(os.environ.get("DFW_UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+# Server-local paths are only readable under these roots (os.pathsep separated)
+DATA_DIRS = [d for d in os.environ.get("DFW_DATA_DIRS", "").split(os.pathsep) if d]
+CHUNK_ROWS = 65536
+
+UPLOAD_SCHEME = "upload://"
+FORMATS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+class SourceError(ValueError):
+    """Raised when a file reference cannot be resolved or read."""
+
+
+# --- Uploaded blobs ---
+
+def purge_uploads(max_age: int = UPLOAD_TTL_SECONDS) -> None:
+    """Delete spooled uploads older than max_age seconds."""
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def create_upload(filename: str) -> str:
+    """Reserve a spool file for an upload and return its path; the caller writes the bytes and commits it."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in FORMATS:
+        raise SourceError(f"Unsupported file type '{ext}'. Choose from: {', '.join(sorted(FORMATS))}")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    purge_uploads()
+    return os.path.join(UPLOAD_DIR, f"partial-{uuid.uuid4().hex}{ext}")
+
+
+def commit_upload(path: str, digest: str) -> str:
+    """
+    Name a finished upload by its content hash and return its upload:// reference.
+
+    Identical files therefore share one reference, which keeps results for them
+    cacheable across re-uploads.
+    """
+    upload_id = digest + os.path.splitext(path)[1]
+    final = os.path.join(UPLOAD_DIR, upload_id)
+    if os.path.exists(final):
+        os.remove(path)
+        # A re-upload restarts the existing file's purge clock
+        os.utime(final)
+    else:
+        os.replace(path, final)
+    return UPLOAD_SCHEME + upload_id
+
+
+def resolve_source(source: str) -> str:
+    """Map an upload:// reference or an allowed server-local path to a readable file path."""
+    if source.startswith(UPLOAD_SCHEME):
+        upload_id = source[len(UPLOAD_SCHEME):]
+        if not upload_id or os.path.basename(upload_id) != upload_id:
+            raise SourceError(f"Invalid upload reference: {source}")
+        path = os.path.join(UPLOAD_DIR, upload_id)
+    else:
+        path = os.path.realpath(source)
+        roots = [os.path.realpath(d) for d in DATA_DIRS]
+        if not any(os.path.commonpath([path, root]) == root for root in roots):
+            raise SourceError(f"Path is outside the allowed data directories (DFW_DATA_DIRS): {source}")
+    if not os.path.isfile(path):
+        raise SourceError(f"File not found: {source}")
+    return path
+
+
+def detect_format(path: str, file_format: Optional[str] = None) -> str:
+    if file_format:
+        file_format = file_format.lower().lstrip(".")
+        if file_format == "jsonl":
+            file_format = "ndjson"
+        if file_format not in set(FORMATS.values()):
+            raise SourceError(f"Unsupported format '{file_format}'. Choose from: csv, ndjson, parquet")
+        return file_format
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise SourceError(f"Cannot infer format from '{ext}'; pass file_format explicitly")
+    return FORMATS[ext]
+
+
+# --- Streaming readers; each yields {column: values} chunks of at most chunk_rows rows ---
+
+def _mapped_lines(path: str) -> Iterator[bytes]:
+    """Iterate the lines of a file through a read-only memory map."""
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+
+def _flush(buffers: Dict[str, array]) -> Dict[str, array]:
+    chunk = {key: values for key, values in buffers.items() if values}
+    for key in buffers:
+        buffers[key] = array("d")
+    return chunk
+
+
+def read_csv(path: str, columns: Optional[List[str]] = None, chunk_rows: int = CHUNK_ROWS,
+             keys: Optional[List[str]] = None) -> Iterator[Dict[str, array]]:
+    reader = csv.reader(line.decode("utf-8-sig") for line in _mapped_lines(path))
+    header = next(reader, None)
+    if header is None:
+        return
+    wanted = [(i, name) for i, name in enumerate(header)
+              if columns is None or name in columns or (keys and name in keys)]
+    if keys is not None:
+        yield from _read_csv_aligned(reader, wanted, keys, chunk_rows)
+        return
+    buffers = {name: array("d") for _, name in wanted}
+    rows = 0
+    for row in reader:
+        for i, name in wanted:
+            if i < len(row):
+                value = parse_number(row[i])
+                if value is not None:
+                    buffers[name].append(value)
+        rows += 1
+        if rows >= chunk_rows:
+            yield _flush(buffers)
+            rows = 0
+    if rows:
+        yield _flush(buffers)
+
+
+def _read_csv_aligned(reader, wanted, keys: List[str], chunk_rows: int) -> Iterator[Dict[str, Any]]:
+    """Row-aligned CSV chunks: key columns as raw strings, other columns as float64 with NaN for blanks."""
+    buffers: Dict[str, Any] = {name: [] if name in keys else array("d") for _, name in wanted}
+    rows = 0
+    for row in reader:
+        for i, name in wanted:
+            cell = row[i] if i < len(row) else None
+            if name in keys:
+                buffers[name].append(cell if cell != "" else None)
+            else:
+                buffers[name].append(to_number(cell))
+        rows += 1
+        if rows >= chunk_rows:
+            yield buffers
+            buffers = {name: [] if name in keys else array("d") for _, name in wanted}
+            rows = 0
+    if rows:
+        yield buffers
+
+
+def read_ndjson(path: str, columns: Optional[List[str]] = None, chunk_rows: int = CHUNK_ROWS,
+                keys: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    aligned = keys is not None
+    keys = keys or []
+    buffers: Dict[str, Any] = {}
+    rows = 0
+    for line in _mapped_lines(path):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            record = {"value": record}
+        for key, value in record.items():
+            if key in keys:
+                buffers.setdefault(key, [None] * rows).append(value)
+                continue
+            if columns is not None and key not in columns:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values = buffers.get(key)
+                if values is None:
+                    values = buffers[key] = array("d", [math.nan] * rows if aligned else [])
+                values.append(value)
+        rows += 1
+        if aligned:
+            # Pad columns missing from this record so every column stays row-aligned
+            for key, values in buffers.items():
+                if len(values) < rows:
+                    values.append(None if key in keys else math.nan)
+        if rows >= chunk_rows:
+            yield buffers if aligned else _flush(buffers)
+            if aligned:
+                buffers = {}
+            rows = 0
+    if rows:
+        yield buffers if aligned else _flush(buffers)
+
+
+def read_parquet(path: str, columns: Optional[List[str]] = None, chunk_rows: int = CHUNK_ROWS,
+                 keys: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SourceError("Parquet input requires the 'pyarrow' package on the server")
+
+    if columns is not None and keys:
+        columns = list(columns) + [k for k in keys if k not in columns]
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+        chunk = {}
+        for field, column in zip(batch.schema, batch.columns):
+            if keys and field.name in keys:
+                chunk[field.name] = [None if v is None else str(v) for v in column.to_pylist()]
+            elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or pa.types.is_decimal(field.type):
+                if keys is not None:
+                    chunk[field.name] = array("d", (math.nan if v is None else float(v) for v in column.to_pylist()))
+                else:
+                    chunk[field.name] = array("d", (float(v) for v in column.to_pylist() if v is not None))
+        yield chunk
+
+
+READERS = {
+    "csv": read_csv,
+    "ndjson": read_ndjson,
+    "parquet": read_parquet,
+}
+
+
+def _checked(chunks: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Stop reading between chunks once the tool call consuming them is cancelled or out of time."""
+    for chunk in chunks:
+        deadlines.check()
+        yield chunk
+
+
+def iter_chunks(source: str, file_format: Optional[str] = None, columns: Optional[List[str]] = None,
+                chunk_rows: int = CHUNK_ROWS, keys: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream numeric column chunks from a file reference without loading the whole file.
+
+    When keys is given the chunks are row-aligned: key columns hold raw values and
+    numeric columns hold NaN where a row has no number, as group-by needs.
+    """
+    path = resolve_source(source)
+    return _checked(READERS[detect_format(path, file_format)](path, columns=columns, chunk_rows=chunk_rows, keys=keys))
@@ -0,0 +1,103 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+# --- Configurations ---
+# Deadline of a tool call when the client sends none; client deadlines are capped to it
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("DFW_TOOL_TIMEOUT_SECONDS", "120"))
+# How often blocking waits inside a tool call wake up to notice that it was cancelled
+POLL_SECONDS = 0.25
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current tool call ran out of time or was cancelled; raised at the next checkpoint."""
+
+
+class CallScope:
+    """
+    Deadline and cancellation flag of one tool call.
+
+    The scope travels in a ContextVar, so it follows the call into tasks,
+    asyncio.to_thread and the executor helpers below. Blocking code cannot be
+    interrupted from outside, so it checks in at its natural waiting points
+    (check / timeout) and stops there once the scope is cancelled or expired.
+    """
+
+    def __init__(self, timeout: float, label: str = "tool call"):
+        self.deadline = time.monotonic() + timeout
+        self.timeout = timeout
+        self.label = label
+        self.cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+
+current_scope: contextvars.ContextVar[Optional[CallScope]] = contextvars.ContextVar("dfw_call_scope", default=None)
+
+
+@contextmanager
+def call_scope(timeout: float, label: str = "tool call"):
+    """Run the block under a new CallScope; the scope is cancelled on exit, however it exits."""
+    scope = CallScope(timeout, label)
+    token = current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        scope.cancel()
+        current_scope.reset(token)
+
+
+def check() -> None:
+    """Raise DeadlineExceeded if the current call was cancelled or is past its deadline."""
+    scope = current_scope.get()
+    if scope is None:
+        return
+    if scope.cancelled.is_set():
+        raise DeadlineExceeded(f"{scope.label} was cancelled")
+    if scope.remaining() <= 0:
+        raise DeadlineExceeded(f"{scope.label} exceeded its {scope.timeout:.0f}s deadline")
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current call, or None outside a tool call."""
+    scope = current_scope.get()
+    return None if scope is None else max(0.0, scope.remaining())
+
+
+def timeout(default: float) -> float:
+    """Timeout for one blocking operation: the default, shortened to the time the call has left."""
+    check()
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def poll_timeout() -> Optional[float]:
+    """Timeout for one slice of a blocking wait: None outside a tool call, else at most POLL_SECONDS."""
+    left = remaining()
+    return None if left is None else min(left, POLL_SECONDS)
+
+
+def submit(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """executor.submit that carries the caller's CallScope into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+async def run_in_executor(executor: Optional[Executor], fn: Callable, *args):
+    """
+    loop.run_in_executor that carries the caller's CallScope into the worker thread.
+
+    If the awaiting task is cancelled before the work starts, the queued work is
+    dropped and never takes a pool thread.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, contextvars.copy_context().run, fn, *args)
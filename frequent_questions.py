@@ -0,0 +1,266 @@
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# --- Configurations ---
+FAQ_PATH = os.environ.get("DFW_FAQ_PATH", "frequent_questions.db")
+# Distinct questions tracked by the Space-Saving counter
+FAQ_TRACKED = int(os.environ.get("DFW_FAQ_TRACKED", "2000"))
+FAQ_TOP_N = int(os.environ.get("DFW_FAQ_TOP_N", "10"))
+# Rankings and counter snapshots are refreshed at most this often
+FAQ_RERANK_SECONDS = float(os.environ.get("DFW_FAQ_RERANK_SECONDS", "5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    context TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (context, normalized)
+);
+CREATE TABLE IF NOT EXISTS popularity (
+    normalized TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    error INTEGER NOT NULL
+);
+"""
+
+
+def normalize_question(text: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form used for dedup and counting."""
+    return re.sub(r"\s+", " ", text).strip().rstrip("?.!").strip().lower()
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter counter over at most `capacity` keys.
+
+    When full, a new key replaces the current minimum and inherits its count as
+    the error bound, so every key whose true frequency exceeds total/capacity is
+    guaranteed to be tracked. The minimum is found through a lazily-cleaned heap.
+    """
+
+    def __init__(self, capacity: int = FAQ_TRACKED):
+        self.capacity = capacity
+        self.counts: Dict[str, List[int]] = {}
+        self.heap: List[Tuple[int, str]] = []
+
+    def add(self, key: str, weight: int = 1) -> None:
+        entry = self.counts.get(key)
+        if entry is None:
+            if len(self.counts) < self.capacity:
+                entry = self.counts[key] = [0, 0]
+            else:
+                floor, victim = self._pop_min()
+                del self.counts[victim]
+                entry = self.counts[key] = [floor, floor]
+        entry[0] += weight
+        heapq.heappush(self.heap, (entry[0], key))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, k) for k, (count, _) in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self.heap)
+            entry = self.counts.get(key)
+            if entry is not None and entry[0] == count:
+                return count, key
+
+    def count(self, key: str) -> int:
+        entry = self.counts.get(key)
+        return entry[0] if entry else 0
+
+    def load(self, rows) -> None:
+        for key, count, error in rows:
+            self.counts[key] = [count, error]
+        self.heap = [(count, k) for k, (count, _) in self.counts.items()]
+        heapq.heapify(self.heap)
+
+
+class FrequentQuestions:
+    """
+    Frequent questions per user context, persisted in SQLite and ranked by use.
+
+    Questions are deduplicated on their normalized text. Every question that
+    reaches a search/text-to-SQL tool is counted in a Space-Saving sketch; the
+    per-context top-N lists are rebuilt at most every rerank_seconds, so reads
+    return a precomputed list. Counter snapshots are persisted with the same
+    cadence so rankings survive restarts. Both run on a background thread from
+    a snapshot, so record() only updates the sketch.
+    """
+
+    def __init__(self, path: str = FAQ_PATH, top_n: int = FAQ_TOP_N, rerank_seconds: float = FAQ_RERANK_SECONDS):
+        self.path = path
+        self.top_n = top_n
+        self.rerank_seconds = rerank_seconds
+        self.lock = threading.Lock()
+        # Serializes transactions on the shared connection (add() and the refresh thread)
+        self.db_lock = threading.Lock()
+        self.refreshing = False
+        # Bumped by add(); a snapshot ranking older than the last add() is not published
+        self.generation = 0
+        self.open_lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        self.sketch = SpaceSaving()
+        # context -> [(normalized, prompt)] in insertion order
+        self.questions: Dict[str, List[Tuple[str, str]]] = {}
+        self.rankings: Dict[str, List[dict]] = {}
+        self.tops: Dict[str, List[dict]] = {}
+        self.overall: List[dict] = []
+        self.dirty = False
+        self.ranked_at = 0.0
+
+    def _open(self) -> None:
+        """Open the database and load questions and counters on first use, not at import of the server."""
+        if self.db is not None:
+            return
+        with self.open_lock:
+            if self.db is not None:
+                return
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                db.executescript(SCHEMA)
+            self.sketch.load(db.execute("SELECT normalized, count, error FROM popularity").fetchall())
+            for context, normalized, prompt in db.execute(
+                    "SELECT context, normalized, prompt FROM questions ORDER BY created_at"):
+                self.questions.setdefault(context, []).append((normalized, prompt))
+            self._rerank()
+            self.db = db
+
+    # --- writes ---
+
+    def add(self, context: str, prompts: List[str]) -> Tuple[int, int]:
+        """Store new questions under context; returns (added, duplicates)."""
+        self._open()
+        added = duplicates = 0
+        now = time.time()
+        with self.lock, self.db_lock, self.db:
+            known = {normalized for normalized, _ in self.questions.get(context, [])}
+            for prompt in prompts:
+                prompt = prompt.strip()
+                normalized = normalize_question(prompt)
+                if not normalized or normalized in known:
+                    duplicates += 1
+                    continue
+                self.db.execute("INSERT OR IGNORE INTO questions (context, normalized, prompt, created_at) VALUES (?, ?, ?, ?)",
+                                (context, normalized, prompt, now))
+                self.questions.setdefault(context, []).append((normalized, prompt))
+                known.add(normalized)
+                added += 1
+            self.generation += 1
+            self._rerank()
+        return added, duplicates
+
+    def record(self, text: str) -> None:
+        """Count one use of a question (fed from tool calls)."""
+        normalized = normalize_question(text)
+        if not normalized:
+            return
+        self._open()
+        with self.lock:
+            self.sketch.add(normalized)
+            self.dirty = True
+            due = not self.refreshing and time.monotonic() - self.ranked_at >= self.rerank_seconds
+            if due:
+                self.refreshing = True
+        if due:
+            threading.Thread(target=self._refresh, name="faq-refresh", daemon=True).start()
+
+    def _refresh(self) -> None:
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.warning(f"Frequent question refresh failed: {e}")
+        finally:
+            self.ranked_at = time.monotonic()
+            self.refreshing = False
+
+    def flush(self) -> None:
+        """Persist counters and refresh rankings now; used at shutdown and by the refresh thread."""
+        if self.db is None:
+            return
+        with self.lock:
+            counts = {key: tuple(entry) for key, entry in self.sketch.counts.items()}
+            questions = {context: list(items) for context, items in self.questions.items()}
+            dirty, self.dirty = self.dirty, False
+            generation = self.generation
+        if dirty:
+            try:
+                self._persist(counts)
+            except sqlite3.Error:
+                self.dirty = True
+                raise
+        self._rerank(counts, questions, generation)
+
+    def _persist(self, counts: Dict[str, Tuple[int, int]]) -> None:
+        logger.debug(f"Persisting {len(counts)} question counters")
+        # Merged, not replaced: every worker sharing the database persists its own sketch, and
+        # each keeps the highest count seen for a question; only the FAQ_TRACKED top rows are kept
+        with self.db_lock, self.db:
+            self.db.executemany(
+                "INSERT INTO popularity (normalized, count, error) VALUES (?, ?, ?)"
+                " ON CONFLICT (normalized) DO UPDATE SET"
+                " error = CASE WHEN excluded.count > count THEN excluded.error ELSE error END,"
+                " count = max(count, excluded.count)",
+                [(key, count, error) for key, (count, error) in counts.items()])
+            self.db.execute("DELETE FROM popularity WHERE normalized NOT IN"
+                            " (SELECT normalized FROM popularity ORDER BY count DESC LIMIT ?)",
+                            (self.sketch.capacity,))
+
+    def _rerank(self, counts: Optional[Dict[str, Tuple[int, int]]] = None,
+                questions: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+                generation: Optional[int] = None) -> None:
+        """Rebuild the rankings from a snapshot taken at generation, or from the live state under the lock."""
+        if counts is None:
+            count = self.sketch.count
+        else:
+            def count(key: str) -> int:
+                entry = counts.get(key)
+                return entry[0] if entry else 0
+        rankings = {}
+        for context, items in (self.questions if questions is None else questions).items():
+            ranked = sorted(enumerate(items), key=lambda item: (-count(item[1][0]), item[0]))
+            rankings[context] = [{"user_context": context, "prompt": prompt, "uses": count(normalized)}
+                                 for _, (normalized, prompt) in ranked]
+        overall = [item for ranked in rankings.values() for item in ranked if item["uses"]]
+        overall.sort(key=lambda item: -item["uses"])
+        tops = {context: ranked[:self.top_n] for context, ranked in rankings.items()}
+        if generation is None:
+            self._publish(rankings, tops, overall[:self.top_n])
+            return
+        with self.lock:
+            if generation == self.generation:
+                self._publish(rankings, tops, overall[:self.top_n])
+
+    def _publish(self, rankings: Dict[str, List[dict]], tops: Dict[str, List[dict]], overall: List[dict]) -> None:
+        # Whole lists replaced at once; readers never see a partial ranking
+        self.rankings = rankings
+        self.tops = tops
+        self.overall = overall
+        self.ranked_at = time.monotonic()
+
+    # --- reads (precomputed) ---
+
+    def questions_for(self, context: str) -> List[dict]:
+        self._open()
+        return self.rankings.get(context, [])
+
+    def top(self, context: Optional[str] = None) -> List[dict]:
+        self._open()
+        if context is None:
+            return self.overall
+        return self.tops.get(context, [])
+
+
+def context_from_uri(uri: str) -> str:
+    """genaiplatform://hedis/frequent_questions/{context} -> context"""
+    return uri.rstrip("/").rsplit("/", 1)[-1]
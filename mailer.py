@@ -0,0 +1,229 @@
+import asyncio
+import os
+import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+import deadlines
+import tracing
+
+
+# --- Configurations ---
+SMTP_MAX_CONNECTIONS = int(os.environ.get("DFW_SMTP_MAX_CONNECTIONS", "4"))
+# Idle sessions older than this are closed instead of reused
+SMTP_IDLE_TIMEOUT = float(os.environ.get("DFW_SMTP_IDLE_TIMEOUT", "240"))
+# Sessions idle longer than this are health-checked with NOOP before reuse
+SMTP_NOOP_AFTER = float(os.environ.get("DFW_SMTP_NOOP_AFTER", "15"))
+
+# Threads rendering personalized MIME messages for bulk sends
+RENDER_WORKERS = int(os.environ.get("DFW_RENDER_WORKERS", "4"))
+
+# Errors that mean the session itself is gone; the message is retried on a fresh one
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout, TimeoutError)
+
+
+class SMTPPool:
+    """
+    Pool of authenticated SMTP sessions for one relay.
+
+    Sessions are created by `connect` (e.g. get_ser_conn, which performs
+    STARTTLS and login), kept alive between messages, NOOP-checked when they
+    have been idle, and replaced when the relay drops them. At most
+    max_connections sessions exist: every delivery holds one of max_connections
+    slots, whether it comes from send() (run on a matching thread pool so the
+    event loop is never blocked by SMTP I/O) or from outbox worker threads.
+    """
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP], relay: str = "default",
+                 max_connections: int = SMTP_MAX_CONNECTIONS, idle_timeout: float = SMTP_IDLE_TIMEOUT,
+                 noop_after: float = SMTP_NOOP_AFTER):
+        self.connect = connect
+        self.relay = relay
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.idle: List[Tuple[smtplib.SMTP, float]] = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix=f"smtp-{relay}")
+        self.opened = 0
+        self.reused = 0
+
+    # --- session lifecycle (called on pool threads) ---
+
+    def _close(self, conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _healthy(self, conn: smtplib.SMTP) -> bool:
+        try:
+            return conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                conn, last_used = self.idle.pop()
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_timeout or (idle_for > self.noop_after and not self._healthy(conn)):
+                self._close(conn)
+                continue
+            self.reused += 1
+            return conn
+        self.opened += 1
+        logger.info(f"Opening SMTP session to relay {self.relay}")
+        with tracing.span("smtp.connect", tracing.CLIENT, **{"smtp.relay": self.relay}):
+            return self.connect()
+
+    def _checkin(self, conn: smtplib.SMTP) -> None:
+        with self.lock:
+            self.idle.append((conn, time.monotonic()))
+
+    # --- public API ---
+
+    def deliver(self, sender: str, recipients: Sequence[str], message: str) -> None:
+        """Blocking send over a pooled session, for callers already off the event loop (e.g. outbox workers)."""
+        while not self.slots.acquire(timeout=deadlines.poll_timeout()):
+            deadlines.check()
+        try:
+            self._deliver(sender, recipients, message)
+        finally:
+            self.slots.release()
+
+    def _deliver(self, sender: str, recipients: Sequence[str], message: str) -> None:
+        for attempt in (1, 2):
+            # Do not start a send for a tool call that was cancelled or ran out of time
+            deadlines.check()
+            conn = self._checkout()
+            try:
+                with tracing.span("smtp.sendmail", tracing.CLIENT, **{"smtp.relay": self.relay,
+                                                                        "smtp.recipients": len(recipients),
+                                                                        "smtp.attempt": attempt}):
+                    conn.sendmail(sender, list(recipients), message)
+            except CONNECTION_ERRORS:
+                self._close(conn)
+                if attempt == 2:
+                    raise
+                logger.warning(f"SMTP session to relay {self.relay} dropped; reconnecting")
+                continue
+            except Exception:
+                # Rejected message or recipients: the session is still usable
+                self._checkin(conn)
+                raise
+            self._checkin(conn)
+            return
+
+    async def send(self, sender: str, recipients: Sequence[str], message: str) -> None:
+        """Send one message over a pooled session without blocking the event loop."""
+        await deadlines.run_in_executor(self.executor, self.deliver, sender, recipients, message)
+
+    def close(self) -> None:
+        """QUIT every idle session; used at shutdown."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self.lock:
+            idle = len(self.idle)
+        return {"relay": self.relay, "idle": idle, "max_connections": self.max_connections,
+                "opened": self.opened, "reused": self.reused}
+
+
+def build_message(sender: str, recipients: Sequence[str], subject: str, body: str) -> str:
+    """Serialized HTML email, as sent by mcp-send-email."""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart()
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = ', '.join(recipients)
+    msg.attach(MIMEText(body, 'html'))
+    return msg.as_string()
+
+
+class MailTemplate:
+    """
+    Subject and HTML body with $name placeholders, parsed once and rendered per recipient.
+
+    Placeholders use string.Template syntax ($name or ${name}, $$ for a literal $);
+    `$email` is always available. A malformed placeholder raises ValueError here,
+    once for the whole send; a missing variable raises KeyError for that recipient
+    only. Values are HTML-escaped in the body and inserted as-is in the subject.
+    """
+
+    def __init__(self, sender: str, subject: str, body: str):
+        self.sender = sender
+        self.subject = self._parse("subject", subject)
+        self.body = self._parse("body", body)
+
+    @staticmethod
+    def _parse(field: str, text: str) -> Template:
+        template = Template(text)
+        for match in template.pattern.finditer(text):
+            if match.group("invalid") is not None:
+                start = match.start()
+                line = text.count("\n", 0, start) + 1
+                column = start - text.rfind("\n", 0, start)
+                raise ValueError(f"Invalid placeholder in {field} at line {line}, column {column}: "
+                                 f"{text[start:start + 12]!r}; write $$ for a literal $")
+        return template
+
+    def render(self, address: str, variables: Dict[str, Any]) -> str:
+        values = {"email": address, **variables}
+        body_values = {name: escape(str(value)) for name, value in values.items()}
+        return build_message(self.sender, [address], self.subject.substitute(values),
+                             self.body.substitute(body_values))
+
+
+_render_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_render_executor() -> ThreadPoolExecutor:
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="mime-render")
+    return _render_executor
+
+
+async def send_bulk(pool: SMTPPool, template: MailTemplate,
+                    recipients: Sequence[Tuple[str, Dict[str, Any]]]) -> List[dict]:
+    """
+    Render and send one personalized message per recipient.
+
+    Rendering runs on the render pool and each message is handed to the SMTP pool
+    as soon as it is ready, so rendering overlaps delivery; the pool's bounded
+    executor keeps at most max_connections sessions busy, each sending many
+    messages back to back. Returns one result per recipient, in input order, without raising.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def one(address: str, variables: Dict[str, Any]) -> dict:
+        try:
+            message = await loop.run_in_executor(get_render_executor(), template.render, address, variables)
+        except KeyError as e:
+            return {"email": address, "status": "error", "message": f"Missing template variable: {e.args[0]}"}
+        try:
+            await pool.send(template.sender, [address], message)
+        except Exception as e:
+            return {"email": address, "status": "error", "message": str(e)}
+        return {"email": address, "status": "sent"}
+
+    return list(await asyncio.gather(*[one(address, variables) for address, variables in recipients]))
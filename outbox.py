@@ -0,0 +1,308 @@
+import json
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from html import escape
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from mailer import SMTPPool, build_message
+
+
+# --- Configurations ---
+OUTBOX_PATH = os.environ.get("DFW_OUTBOX_PATH", "email_outbox.db")
+OUTBOX_WORKERS = int(os.environ.get("DFW_OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("DFW_OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.environ.get("DFW_OUTBOX_BACKOFF_BASE", "5"))
+OUTBOX_BACKOFF_MAX = float(os.environ.get("DFW_OUTBOX_BACKOFF_MAX", "900"))
+OUTBOX_POLL_SECONDS = float(os.environ.get("DFW_OUTBOX_POLL_SECONDS", "5"))
+# A message claimed this long ago and still 'sending' is taken to belong to a dead worker and is re-queued
+OUTBOX_LEASE_SECONDS = float(os.environ.get("DFW_OUTBOX_LEASE_SECONDS", "600"))
+# Default coalescing window for digest-mode emails
+DIGEST_WINDOW_SECONDS = float(os.environ.get("DFW_DIGEST_WINDOW_SECONDS", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    relay TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (relay, status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS digest (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest_id TEXT NOT NULL,
+    relay TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    flush_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS digest_group ON digest (relay, recipient, topic);
+CREATE INDEX IF NOT EXISTS digest_due ON digest (flush_at);
+"""
+
+
+def is_permanent(error: Exception) -> bool:
+    """5xx rejections will not succeed on retry; everything else (4xx, dropped sessions, timeouts) may."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def render_digest(topic: str, items: Sequence[sqlite3.Row]) -> tuple:
+    """Subject and HTML body of one digest email; a single item is sent unchanged."""
+    if len(items) == 1:
+        return items[0]["subject"], items[0]["body"]
+    sections = [
+        f"<h3>{escape(item['subject'])} <small>({time.strftime('%H:%M:%S', time.localtime(item['created_at']))})</small></h3>"
+        f"\n{item['body']}"
+        for item in items
+    ]
+    return f"[{topic}] {len(items)} updates", "\n<hr>\n".join(sections)
+
+
+class Outbox:
+    """
+    Durable email queue in SQLite with background delivery.
+
+    enqueue() commits the serialized message and returns its ID immediately.
+    Worker threads (per relay) claim due messages, deliver them through the
+    relay's SMTPPool and record the outcome: sent, retried with exponential
+    backoff and jitter, or failed after max_attempts / a permanent rejection.
+    A claim is a lease: a message still 'sending' OUTBOX_LEASE_SECONDS after it
+    was claimed belonged to a worker that died mid-delivery and is claimed
+    again (at-least-once). Live workers of other processes sharing the
+    database keep their claims.
+
+    Digest items are buffered per (relay, recipient, topic); the first item opens
+    a window and a flusher thread turns the whole group into one queued message,
+    under the ID handed out for the first item, when the window closes.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH, workers: int = OUTBOX_WORKERS,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, lease: float = OUTBOX_LEASE_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.pools: Dict[str, SMTPPool] = {}
+        self.threads: List[threading.Thread] = []
+        self.local = threading.local()
+        self.wakeup = threading.Condition()
+        self.started = False
+        self.stopping = False
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened (and the schema created) on first use, not at import of the server
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.executescript(SCHEMA)
+            self.local.db = db
+        return db
+
+    def register(self, pool: SMTPPool) -> None:
+        """Deliver messages queued for pool.relay through this pool."""
+        self.pools[pool.relay] = pool
+
+    def start(self) -> None:
+        """Start the delivery workers once; safe to call repeatedly."""
+        if self.started:
+            return
+        self.started = True
+        for relay in self.pools:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, args=(relay,), name=f"outbox-{relay}-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        thread = threading.Thread(target=self._flush_digests, name="outbox-digest", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self) -> None:
+        self.stopping = True
+        with self.wakeup:
+            self.wakeup.notify_all()
+
+    def _insert(self, db: sqlite3.Connection, message_id: str, relay: str, sender: str,
+                recipients: Sequence[str], message: str, now: float) -> None:
+        db.execute(
+            "INSERT INTO outbox (id, relay, sender, recipients, message, status, next_attempt_at, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (message_id, relay, sender, json.dumps(list(recipients)), message, now, now, now),
+        )
+
+    def _wake(self) -> None:
+        self.start()
+        with self.wakeup:
+            self.wakeup.notify_all()
+
+    def enqueue(self, relay: str, sender: str, recipients: Sequence[str], message: str) -> str:
+        if relay not in self.pools:
+            raise ValueError(f"No SMTP pool registered for relay '{relay}'")
+        message_id = uuid.uuid4().hex
+        with self._db() as db:
+            self._insert(db, message_id, relay, sender, recipients, message, time.time())
+        self._wake()
+        return message_id
+
+    def add_digest(self, relay: str, sender: str, recipient: str, topic: str, subject: str, body: str,
+                   window: float = DIGEST_WINDOW_SECONDS) -> dict:
+        """Buffer one digest item; returns the digest's message_id and when it will be sent."""
+        if relay not in self.pools:
+            raise ValueError(f"No SMTP pool registered for relay '{relay}'")
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT digest_id, flush_at FROM digest WHERE relay = ? AND recipient = ? AND topic = ? LIMIT 1",
+                (relay, recipient, topic),
+            ).fetchone()
+            digest_id, flush_at = (row["digest_id"], row["flush_at"]) if row else (uuid.uuid4().hex, now + window)
+            db.execute(
+                "INSERT INTO digest (digest_id, relay, sender, recipient, topic, subject, body, created_at, flush_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest_id, relay, sender, recipient, topic, subject, body, now, flush_at),
+            )
+        self._wake()
+        return {"message_id": digest_id, "flush_at": flush_at}
+
+    def status(self, message_id: str) -> Optional[dict]:
+        row = self._db().execute(
+            "SELECT id, relay, recipients, status, attempts, last_error, created_at, updated_at, sent_at, next_attempt_at"
+            " FROM outbox WHERE id = ?", (message_id,),
+        ).fetchone()
+        if row is None:
+            return self._digest_status(message_id)
+        result = dict(row)
+        result["recipients"] = json.loads(result["recipients"])
+        if result["status"] != "queued":
+            result.pop("next_attempt_at")
+        return result
+
+    def _digest_status(self, digest_id: str) -> Optional[dict]:
+        row = self._db().execute(
+            "SELECT relay, recipient, topic, COUNT(*) AS items, MIN(created_at) AS created_at, MAX(flush_at) AS flush_at"
+            " FROM digest WHERE digest_id = ? GROUP BY relay, recipient, topic", (digest_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": digest_id, "relay": row["relay"], "recipients": [row["recipient"]], "status": "buffered",
+                "topic": row["topic"], "items": row["items"], "created_at": row["created_at"], "flush_at": row["flush_at"]}
+
+    # --- digest flusher and delivery workers ---
+
+    def flush_digests(self, now: Optional[float] = None) -> int:
+        """Queue every digest whose window has closed; returns the number of digests queued."""
+        now = time.time() if now is None else now
+        db = self._db()
+        flushed = 0
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            due = [r["digest_id"] for r in db.execute(
+                "SELECT DISTINCT digest_id FROM digest WHERE flush_at <= ?", (now,)).fetchall()]
+            for digest_id in due:
+                items = db.execute("SELECT * FROM digest WHERE digest_id = ? ORDER BY seq", (digest_id,)).fetchall()
+                first = items[0]
+                subject, body = render_digest(first["topic"], items)
+                message = build_message(first["sender"], [first["recipient"]], subject, body)
+                self._insert(db, digest_id, first["relay"], first["sender"], [first["recipient"]], message, now)
+                db.execute("DELETE FROM digest WHERE digest_id = ?", (digest_id,))
+                flushed += 1
+        return flushed
+
+    def _flush_digests(self) -> None:
+        while not self.stopping:
+            try:
+                if self.flush_digests():
+                    with self.wakeup:
+                        self.wakeup.notify_all()
+                next_flush = self._db().execute("SELECT MIN(flush_at) FROM digest").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.error(f"Digest flush failed: {e}")
+                next_flush = None
+            wait = OUTBOX_POLL_SECONDS if next_flush is None else min(OUTBOX_POLL_SECONDS, max(0.0, next_flush - time.time()))
+            with self.wakeup:
+                self.wakeup.wait(wait)
+
+    def _claim(self, relay: str) -> Optional[sqlite3.Row]:
+        db = self._db()
+        now = time.time()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT * FROM outbox WHERE relay = ? AND status = 'queued' AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at LIMIT 1", (relay, now),
+            ).fetchone()
+            if row is None:
+                row = db.execute(
+                    "SELECT * FROM outbox WHERE relay = ? AND status = 'sending' AND updated_at <= ?"
+                    " ORDER BY updated_at LIMIT 1", (relay, now - self.lease),
+                ).fetchone()
+                if row is not None:
+                    logger.warning(f"Outbox lease of {row['id']} expired; delivering it again")
+            if row is not None:
+                db.execute("UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?", (now, row["id"]))
+        return row
+
+    def _finish(self, row: sqlite3.Row, error: Optional[Exception]) -> None:
+        now = time.time()
+        attempts = row["attempts"] + 1
+        with self._db() as db:
+            if error is None:
+                db.execute("UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, updated_at = ?, last_error = NULL"
+                           " WHERE id = ?", (attempts, now, now, row["id"]))
+            elif is_permanent(error) or attempts >= self.max_attempts:
+                db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                           (attempts, str(error), now, row["id"]))
+            else:
+                delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                db.execute("UPDATE outbox SET status = 'queued', attempts = ?, last_error = ?, next_attempt_at = ?,"
+                           " updated_at = ? WHERE id = ?", (attempts, str(error), now + delay, now, row["id"]))
+
+    def _work(self, relay: str) -> None:
+        pool = self.pools[relay]
+        while not self.stopping:
+            try:
+                row = self._claim(relay)
+            except sqlite3.Error as e:
+                logger.error(f"Outbox claim failed: {e}")
+                row = None
+            if row is None:
+                with self.wakeup:
+                    self.wakeup.wait(OUTBOX_POLL_SECONDS)
+                continue
+            try:
+                pool.deliver(row["sender"], json.loads(row["recipients"]), row["message"])
+                error = None
+            except Exception as e:
+                logger.warning(f"Outbox delivery of {row['id']} failed: {e}")
+                error = e
+            try:
+                self._finish(row, error)
+            except Exception as e:
+                # The row stays 'sending' and is picked up again once its lease expires
+                logger.error(f"Outbox could not record the outcome of {row['id']}: {e}")
@@ -0,0 +1,89 @@
+import base64
+import binascii
+import math
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence, Union
+
+
+# --- Packed numeric payloads ---
+# A compact alternative to JSON number arrays: base64 of little-endian float64/float32
+# values plus a shape header. Shape [n] is one series; shape [k, n] is k columns of n
+# values each, stored one column after another and named by `columns`.
+
+PACKED_DTYPES = {"float64": "d", "float32": "f"}
+
+
+class PayloadError(ValueError):
+    """Raised when a packed payload's header does not match its data."""
+
+
+def decode_packed(data: str, dtype: str = "float64", shape: Optional[List[int]] = None,
+                  columns: Optional[List[str]] = None) -> Dict[str, Sequence[float]]:
+    """
+    Decode a packed payload into {column: values} without per-element conversion.
+
+    float64 columns are memoryview slices over the decoded buffer (no copy on
+    little-endian hosts); float32 is widened to float64 in a single C-level pass.
+    1-D payloads come back as a single "value" column.
+    """
+    code = PACKED_DTYPES.get((dtype or "").lower())
+    if code is None:
+        raise PayloadError(f"Unsupported dtype '{dtype}'. Choose from: {', '.join(PACKED_DTYPES)}")
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise PayloadError(f"Invalid base64 payload: {e}")
+
+    itemsize = array(code).itemsize
+    if shape is None:
+        shape = [len(raw) // itemsize]
+    if len(shape) not in (1, 2) or any(dim < 0 for dim in shape):
+        raise PayloadError("shape must be [n] or [columns, n]")
+    if len(raw) != math.prod(shape) * itemsize:
+        raise PayloadError(f"Payload holds {len(raw)} bytes but shape {shape} of {dtype} needs {math.prod(shape) * itemsize}")
+
+    if len(shape) == 1:
+        names = ["value"]
+    else:
+        names = list(columns) if columns else [f"col{i}" for i in range(shape[0])]
+        if len(names) != shape[0]:
+            raise PayloadError(f"Expected {shape[0]} column names, got {len(names)}")
+
+    if code == "d" and sys.byteorder == "little":
+        view = memoryview(raw).cast("d")
+    else:
+        values = array(code)
+        values.frombytes(raw)
+        if sys.byteorder != "little":
+            values.byteswap()
+        view = memoryview(values if code == "d" else array("d", values))
+
+    rows = shape[-1]
+    return {name: view[i * rows:(i + 1) * rows] for i, name in enumerate(names)}
+
+
+def encode_packed(data: Union[Sequence[float], Dict[str, Sequence[float]]], dtype: str = "float64") -> dict:
+    """Client-side counterpart of decode_packed for a list of numbers or equal-length {column: numbers}."""
+    code = PACKED_DTYPES.get(dtype)
+    if code is None:
+        raise PayloadError(f"Unsupported dtype '{dtype}'. Choose from: {', '.join(PACKED_DTYPES)}")
+    if isinstance(data, dict):
+        names = list(data)
+        lengths = {len(values) for values in data.values()}
+        if len(lengths) > 1:
+            raise PayloadError("All columns of a packed payload must have the same length")
+        values = array(code)
+        for name in names:
+            values.extend(array(code, data[name]))
+        shape = [len(names), lengths.pop() if lengths else 0]
+    else:
+        names = None
+        values = array(code, data)
+        shape = [len(values)]
+    if sys.byteorder != "little":
+        values.byteswap()
+    payload = {"dtype": dtype, "shape": shape, "data": base64.b64encode(values.tobytes()).decode("ascii")}
+    if names is not None:
+        payload["columns"] = names
+    return payload
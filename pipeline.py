@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+
+# --- Configurations ---
+# Largest pipeline accepted in one call
+PIPELINE_MAX_STEPS = int(os.environ.get("DFW_PIPELINE_MAX_STEPS", "32"))
+
+# {"$ref": "step"} or {"$ref": "step.field.0"} inside a step's arguments
+REF = "$ref"
+
+
+class PipelineError(ValueError):
+    """The pipeline itself is invalid (unknown step or tool, duplicate id, cycle, bad reference)."""
+
+
+class StepError(Exception):
+    """A step's tool returned an error result instead of raising."""
+
+    def __init__(self, result: Any):
+        if isinstance(result, dict):
+            detail = result.get("error") or result.get("message") or json.dumps(result, default=str)
+        else:
+            detail = str(result).strip()
+        super().__init__(detail)
+        self.result = result
+
+
+class StepFailed(Exception):
+    """A step raised or returned an error result; the remaining steps were cancelled."""
+
+    def __init__(self, step: str, error: BaseException):
+        super().__init__(f"Step {step!r} failed: {error}")
+        self.step = step
+        self.error = error
+
+
+def _split_ref(ref: Any) -> List[str]:
+    if not isinstance(ref, str) or not ref:
+        raise PipelineError(f"Invalid reference {ref!r}: expected 'step' or 'step.path'")
+    return ref.split(".")
+
+
+def references(value: Any) -> Set[str]:
+    """Step ids referenced anywhere inside an argument value."""
+    if isinstance(value, dict):
+        if set(value) == {REF}:
+            return {_split_ref(value[REF])[0]}
+        return set().union(*(references(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(references(v) for v in value)) if value else set()
+    return set()
+
+
+def _follow(value: Any, path: List[str], ref: str) -> Any:
+    for part in path:
+        if isinstance(value, str):
+            # Tools that return JSON text (e.g. DFWSearch) can be navigated like their parsed result
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise PipelineError(f"Reference {ref!r}: cannot look up {part!r} in a plain string") from None
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.lstrip("-").isdigit() and -len(value) <= int(part) < len(value):
+            value = value[int(part)]
+        elif part in (getattr(type(value), "model_fields", None) or {}):
+            # Declared fields of a pydantic result only; never arbitrary attributes
+            value = getattr(value, part)
+        else:
+            raise PipelineError(f"Reference {ref!r}: {part!r} not found in the step output")
+    return value
+
+
+def resolve(value: Any, results: Dict[str, Any]) -> Any:
+    """Copy of an argument value with every reference replaced by the referenced output."""
+    if isinstance(value, dict):
+        if set(value) == {REF}:
+            step, *path = _split_ref(value[REF])
+            return _follow(results[step], path, value[REF])
+        return {k: resolve(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve(v, results) for v in value]
+    return value
+
+
+def plan(steps: List[Dict[str, Any]], tools: Iterable[str]) -> Dict[str, Set[str]]:
+    """Validate a pipeline and return each step's dependencies."""
+    if not steps:
+        raise PipelineError("A pipeline needs at least one step")
+    if len(steps) > PIPELINE_MAX_STEPS:
+        raise PipelineError(f"A pipeline has at most {PIPELINE_MAX_STEPS} steps, got {len(steps)}")
+    tools = set(tools)
+    deps: Dict[str, Set[str]] = {}
+    for step in steps:
+        if step["id"] in deps:
+            raise PipelineError(f"Duplicate step id {step['id']!r}")
+        if step["tool"] not in tools:
+            raise PipelineError(f"Step {step['id']!r}: unknown tool {step['tool']!r}")
+        deps[step["id"]] = references(step["arguments"])
+    for step, needs in deps.items():
+        unknown = needs - deps.keys()
+        if unknown:
+            raise PipelineError(f"Step {step!r} references unknown step(s): {', '.join(sorted(unknown))}")
+
+    # Kahn's algorithm: anything left over sits on a cycle
+    indegree = {step: len(needs) for step, needs in deps.items()}
+    ready = [step for step, n in indegree.items() if not n]
+    seen = 0
+    while ready:
+        done = ready.pop()
+        seen += 1
+        for step, needs in deps.items():
+            if done in needs:
+                indegree[step] -= 1
+                if not indegree[step]:
+                    ready.append(step)
+    if seen != len(deps):
+        cycle = sorted(step for step, n in indegree.items() if n)
+        raise PipelineError(f"Steps form a cycle: {', '.join(cycle)}")
+    return deps
+
+
+async def run_pipeline(steps: List[Dict[str, Any]], call: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+                       tools: Iterable[str], outputs: Optional[List[str]] = None,
+                       is_error: Optional[Callable[[Any], bool]] = None) -> Dict[str, Any]:
+    """
+    Run a DAG of tool calls and return the requested step outputs.
+
+    steps: [{"id", "tool", "arguments"}]; arguments may embed {"$ref": "step.path"}.
+    call: runs one tool and returns its Python result.
+    outputs: step ids to return; by default the steps no other step consumes.
+    is_error: recognizes error results of tools that report failures by
+        returning them; such a step fails like one that raised.
+
+    Each step starts as soon as the steps it references have finished, so
+    independent branches run concurrently. The first failing step cancels
+    everything still running and is reported as StepFailed.
+    """
+    deps = plan(steps, tools)
+    if outputs is None:
+        consumed = set().union(*deps.values())
+        outputs = [step["id"] for step in steps if step["id"] not in consumed]
+    missing = [step for step in outputs if step not in deps]
+    if missing:
+        raise PipelineError(f"Unknown output step(s): {', '.join(missing)}")
+
+    results: Dict[str, Any] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(step: Dict[str, Any]) -> None:
+        needs = [tasks[dep] for dep in deps[step["id"]]]
+        if needs:
+            await asyncio.gather(*needs)
+        arguments = resolve(step["arguments"], results)
+        try:
+            result = await call(step["tool"], arguments)
+        except (asyncio.CancelledError, PipelineError):
+            raise
+        except Exception as e:
+            raise StepFailed(step["id"], e) from e
+        if is_error is not None and is_error(result):
+            # Dependants never see the error as their input
+            raise StepFailed(step["id"], StepError(result))
+        results[step["id"]] = result
+
+    # Create tasks in dependency order so every dependency's task exists first
+    pending = {step["id"]: step for step in steps}
+    while pending:
+        for step_id, step in list(pending.items()):
+            if deps[step_id] <= tasks.keys():
+                tasks[step_id] = asyncio.ensure_future(run(step))
+                del pending[step_id]
+
+    try:
+        done, running = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        failed = [task for task in done if not task.cancelled() and task.exception() is not None]
+        if failed:
+            # The first failure in step order; dependents failed with the same error
+            first = min(failed, key=lambda t: list(tasks.values()).index(t))
+            raise first.exception()
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return {step: results[step] for step in outputs}
@@ -0,0 +1,181 @@
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from string import Template
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+
+# --- Configurations ---
+PROMPTS_PATH = os.environ.get("DFW_PROMPTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.json"))
+# The prompts file is stat()ed at most this often; edits are picked up without a restart
+PROMPTS_RELOAD_SECONDS = float(os.environ.get("DFW_PROMPTS_RELOAD_SECONDS", "2"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+@dataclass
+class PromptEntry:
+    name: str
+    category: str
+    prompt: str
+    title: str = ""
+    description: str = ""
+    # Names of $placeholders a client must supply when rendering
+    arguments: List[str] = field(default_factory=list)
+
+    def render(self, arguments: Optional[Dict[str, str]] = None) -> str:
+        if not self.arguments:
+            return self.prompt
+        return Template(self.prompt).safe_substitute(arguments or {})
+
+
+class PromptIndex:
+    """
+    Immutable in-memory index over one snapshot of the prompt file.
+
+    Every word of a prompt's name, title, description and text maps to the set of
+    prompts containing it; the sorted vocabulary lets the last query word match
+    as a prefix (search-as-you-type). Queries intersect the posting sets starting
+    from the smallest, and only the prompts whose name/title match need scoring;
+    the rest are taken in precomputed name order. Lookups stay well under a
+    millisecond for thousands of prompts.
+    """
+
+    PREFIX_CACHE_SIZE = 4096
+
+    def __init__(self, entries: List[PromptEntry]):
+        self.entries: Dict[str, PromptEntry] = {entry.name: entry for entry in entries}
+        self.ordered = sorted(self.entries)
+        self.categories: Dict[str, List[str]] = {}
+        self.category_sets: Dict[str, Set[str]] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.title_postings: Dict[str, Set[str]] = {}
+        for entry in entries:
+            self.categories.setdefault(entry.category, []).append(entry.name)
+            self.category_sets.setdefault(entry.category, set()).add(entry.name)
+            headline = set(tokenize(f"{entry.name} {entry.title}"))
+            for word in headline:
+                self.title_postings.setdefault(word, set()).add(entry.name)
+            for word in headline | set(tokenize(f"{entry.description} {entry.prompt}")):
+                self.postings.setdefault(word, set()).add(entry.name)
+        self.vocabulary = sorted(self.postings)
+        self.prefixes: Dict[str, Set[str]] = {}
+
+    def _matching(self, word: str, prefix: bool) -> Set[str]:
+        if not prefix:
+            return self.postings.get(word, set())
+        names = self.prefixes.get(word)
+        if names is None:
+            names = set()
+            for i in range(bisect_left(self.vocabulary, word), len(self.vocabulary)):
+                candidate = self.vocabulary[i]
+                if not candidate.startswith(word):
+                    break
+                names |= self.postings[candidate]
+            if len(self.prefixes) >= self.PREFIX_CACHE_SIZE:
+                self.prefixes.clear()
+            self.prefixes[word] = names
+        return names
+
+    def search(self, query: str = "", category: Optional[str] = None, limit: int = 20) -> List[PromptEntry]:
+        words = tokenize(query)
+        filters = [self._matching(word, prefix=i == len(words) - 1) for i, word in enumerate(words)]
+        if category is not None:
+            filters.append(self.category_sets.get(category.lower(), set()))
+        if not filters:
+            return [self.entries[name] for name in self.ordered[:limit]]
+        filters.sort(key=len)
+        candidates = filters[0].intersection(*filters[1:])
+
+        # Name/title matches first (most matching words, then name); then the rest by name
+        scores: Dict[str, int] = {}
+        for word in words:
+            for name in self.title_postings.get(word, ()):
+                if name in candidates:
+                    scores[name] = scores.get(name, 0) + 1
+        names = sorted(scores, key=lambda name: (-scores[name], name))[:limit]
+        if len(names) < limit:
+            if len(candidates) <= 4 * limit:
+                names += sorted(name for name in candidates if name not in scores)[:limit - len(names)]
+            else:
+                for name in self.ordered:
+                    if name in candidates and name not in scores:
+                        names.append(name)
+                        if len(names) == limit:
+                            break
+        return [self.entries[name] for name in names]
+
+
+class PromptRegistry:
+    """Prompt library loaded from a JSON file and reloaded when the file changes."""
+
+    def __init__(self, path: str = PROMPTS_PATH, reload_seconds: float = PROMPTS_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.lock = threading.Lock()
+        self.signature = None
+        # None until the first read, which loads the file (it is not read at import of the server)
+        self.checked_at: Optional[float] = None
+        self.index = PromptIndex([])
+
+    def reload(self) -> None:
+        """(Re)build the index if the file changed; a broken file keeps the previous snapshot."""
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            logger.warning(f"Prompt file unavailable: {e}")
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = [PromptEntry(**{**item, "category": item["category"].lower()}) for item in json.load(f)]
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.error(f"Invalid prompt file {self.path}: {e}")
+            return
+        # Swapped in one assignment, so readers never see a half-built index
+        self.index = PromptIndex(entries)
+        self.signature = signature
+        logger.info(f"Loaded {len(entries)} prompts from {self.path}")
+
+    def current(self) -> PromptIndex:
+        now = time.monotonic()
+        if self.checked_at is None:
+            with self.lock:
+                if self.checked_at is None:
+                    self.reload()
+                    self.checked_at = now
+        elif now - self.checked_at >= self.reload_seconds and self.lock.acquire(blocking=False):
+            try:
+                self.checked_at = now
+                self.reload()
+            finally:
+                self.lock.release()
+        return self.index
+
+    def get(self, name: str) -> Optional[PromptEntry]:
+        return self.current().entries.get(name)
+
+    def all(self) -> List[PromptEntry]:
+        return list(self.current().entries.values())
+
+    def category(self, category: str) -> List[PromptEntry]:
+        index = self.current()
+        return [index.entries[name] for name in index.categories.get(category.lower(), [])]
+
+    def categories(self) -> List[str]:
+        return sorted(self.current().categories)
+
+    def search(self, query: str = "", category: Optional[str] = None, limit: int = 20) -> List[PromptEntry]:
+        return self.current().search(query, category, limit)
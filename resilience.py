@@ -0,0 +1,240 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import deadlines
+import tracing
+from deadlines import DeadlineExceeded
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+
+def transient_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the backend is unhealthy (and should trip the breaker).
+
+    Timeouts, connection errors, 429 and 5xx do; other HTTP errors (404, 400, ...)
+    are the caller's problem. Non-HTTP errors (e.g. Snowflake driver errors) do.
+    Deadline and cancellation outcomes never reach this: see inconclusive().
+    """
+    # Only backends that use requests import it; if it is not loaded, this is not a requests error
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status >= 500 or status == 429
+    if isinstance(error, requests.exceptions.RequestException):
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    return True
+
+
+def inconclusive(error: BaseException) -> bool:
+    """
+    The caller gave up (deadline or cancellation) before the backend answered:
+    that says nothing about the backend's health either way.
+    """
+    return isinstance(error, (DeadlineExceeded, asyncio.CancelledError))
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failures; open calls fail
+    fast with CircuitOpen. After reset_timeout the breaker is half-open and lets
+    half_open_max trial calls through: a success closes it, a failure reopens it.
+    Calls that end inconclusively (deadline, cancellation) count as neither and
+    give their half-open trial slot back.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30, half_open_max: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def before(self) -> None:
+        with self.lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    retry = self.reset_timeout - (time.monotonic() - self.opened_at)
+                    raise CircuitOpen(f"{self.name} is unavailable (circuit open); retry in {retry:.0f}s")
+                self.state = "half_open"
+                self.trials = 0
+            if self.state == "half_open":
+                if self.trials >= self.half_open_max:
+                    self.rejected += 1
+                    raise CircuitOpen(f"{self.name} is recovering (circuit half-open); retry shortly")
+                self.trials += 1
+
+    def success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def release(self) -> None:
+        with self.lock:
+            if self.state == "half_open" and self.trials > 0:
+                self.trials -= 1
+
+    def failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self, is_failure: Callable[[BaseException], bool] = transient_failure):
+        self.before()
+        try:
+            yield
+        except BaseException as e:
+            if inconclusive(e):
+                self.release()
+            elif is_failure(e):
+                self.failure()
+            else:
+                self.success()
+            raise
+        self.success()
+
+
+class LatencyTracker:
+    """Recent successful call durations; the p95 is recomputed every `every` samples."""
+
+    def __init__(self, size: int = 256, every: int = 16):
+        self.samples: deque = deque(maxlen=size)
+        self.every = every
+        self.pending = 0
+        self.cached_p95: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+            self.pending += 1
+            if self.pending >= self.every or self.cached_p95 is None:
+                ordered = sorted(self.samples)
+                self.cached_p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                self.pending = 0
+
+    def p95(self) -> Optional[float]:
+        return self.cached_p95 if len(self.samples) >= 20 else None
+
+
+class Backend:
+    """
+    One external dependency (NWS, Cortex Search, Confluence ...): a circuit breaker,
+    a latency profile and, for idempotent reads, hedged requests.
+
+    A hedged call starts the request and, if it has not finished after the
+    backend's p95 latency, sends one duplicate; the first successful response
+    wins and the other is discarded. Hedges are capped at hedge_ratio of calls
+    and are not sent while the breaker is probing a recovering backend.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30, hedge: bool = False,
+                 hedge_ratio: float = 0.1, min_hedge_delay: float = 0.02, max_workers: int = 16,
+                 is_failure: Callable[[BaseException], bool] = transient_failure):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.hedge = hedge
+        self.hedge_ratio = hedge_ratio
+        self.min_hedge_delay = min_hedge_delay
+        self.is_failure = is_failure
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}") if hedge else None
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        BACKENDS[name] = self
+
+    def _timed(self, fn: Callable, args, kwargs, attempt: Optional[str] = None):
+        started = time.monotonic()
+        try:
+            if attempt is None:
+                result = fn(*args, **kwargs)
+            else:
+                with tracing.span(f"{self.name} {attempt}", tracing.CLIENT):
+                    result = fn(*args, **kwargs)
+        except Exception as e:
+            requests = sys.modules.get("requests")
+            if requests is not None and isinstance(e, requests.exceptions.Timeout):
+                # A timeout shortened to the tool call's deadline is the call's, not the backend's
+                deadlines.check()
+            raise
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self.breaker.state != "closed" or self.hedges >= self.hedge_ratio * self.calls + 1:
+            return None
+        p95 = self.latency.p95()
+        return None if p95 is None else max(self.min_hedge_delay, p95)
+
+    def call(self, fn: Callable, *args, hedge: bool = True, **kwargs):
+        """
+        Run fn(*args, **kwargs) through the breaker (blocking); hedged when allowed and enabled.
+
+        Inside a tool call nothing is started once its deadline has passed, and a
+        hedged call stops waiting at the deadline or on cancellation (the attempts
+        still running are abandoned to the pool and their results discarded).
+        """
+        deadlines.check()
+        with tracing.span(self.name, tracing.CLIENT, **{"dfw.backend": self.name}) as span, \
+                self.breaker.guard(self.is_failure):
+            self.calls += 1
+            delay = self._hedge_delay() if hedge else None
+            if delay is None:
+                return self._timed(fn, args, kwargs)
+            primary = deadlines.submit(self.executor, self._timed, fn, args, kwargs, "primary")
+            left = deadlines.remaining()
+            done, _ = wait([primary], timeout=delay if left is None else min(delay, left))
+            if done:
+                return primary.result()
+            deadlines.check()
+            self.hedges += 1
+            if span is not None:
+                span.set("dfw.hedged", True)
+            backup = deadlines.submit(self.executor, self._timed, fn, args, kwargs, "hedge")
+            pending = {primary, backup}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, timeout=deadlines.poll_timeout(), return_when=FIRST_COMPLETED)
+                if not done:
+                    deadlines.check()
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self.hedge_wins += 1
+                            if span is not None:
+                                span.set("dfw.hedge_won", True)
+                        return future.result()
+                    error = future.exception()
+            raise error
+
+    async def acall(self, fn: Callable, *args, hedge: bool = True, **kwargs):
+        """call() from async code, on a worker thread that carries the tool call's deadline."""
+        return await asyncio.to_thread(self.call, fn, *args, hedge=hedge, **kwargs)
+
+    def stats(self) -> dict:
+        return {"state": self.breaker.state, "failures": self.breaker.failures, "rejected": self.breaker.rejected,
+                "calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins, "p95": self.latency.p95()}
+
+
+# Every Backend by name, for health reporting
+BACKENDS: Dict[str, Backend] = {}
@@ -0,0 +1,66 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+from result_cache import new_hasher
+
+
+def call_key(name: str, arguments: Dict[str, Any]) -> str:
+    """Tool name plus canonical (key-sorted, compact) JSON arguments, digested to a fixed size."""
+    canonical = json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+    hasher = new_hasher()
+    hasher.update(f"{name}\0{canonical}".encode())
+    return hasher.hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is running await the same task and receive the same result
+    or exception. Each caller awaits through shield(), so a cancelled caller
+    does not cancel the shared execution for the others; when the last caller
+    for a key goes away the execution is cancelled, since nobody wants the
+    result any more. The key is released as soon as the execution finishes;
+    nothing is cached afterwards.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Future] = {}
+        self.waiters: Dict[str, int] = {}
+        self.executed = 0
+        self.shared = 0
+        self.abandoned = 0
+
+    def _release(self, key: str, task: asyncio.Future) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+            self.waiters.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.executed += 1
+        else:
+            self.shared += 1
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.calls.get(key) is task:
+                self.waiters[key] -= 1
+                if not self.waiters[key] and not task.done():
+                    self.abandoned += 1
+                    task.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.calls), "executed": self.executed, "shared": self.shared,
+                "abandoned": self.abandoned}
@@ -1,66 +1,454 @@
-from typing import Union, List, Dict, Optional, Any
-import statistics
+from typing import TYPE_CHECKING, Union, List, Dict, Optional, Any
+import asyncio
+import atexit
 import json
+from array import array
 import logging
-import requests
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+import sqlite3
 from pydantic import BaseModel
 from dataclasses import dataclass
 from mcp.server.fastmcp import FastMCP, Context
-from snowflake.connector import SnowflakeConnection
-from ReduceReuseRecycleGENAI.snowflake import snowflake_conn
-from snowflake.core import Root
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from loguru import logger
-from ReduceReuseRecycleGENAI.smtp import get_ser_conn
+from analytics import (
+    VALID_OPERATIONS, AnalysisError, aggregate_chunks, align_columns, compute, extract_numbers,
+    grouped_aggregate, normalize_operation, rolling_aggregate, to_number,
+)
+from analyze_pool import aggregate_parallel, analyze_parallel, input_size, should_parallelize
+from data_sources import UPLOAD_SCHEME, SourceError, iter_chunks, resolve_source
+from mailer import MailTemplate, SMTPPool, build_message, send_bulk
+from outbox import DIGEST_WINDOW_SECONDS, Outbox
+from payloads import PayloadError, decode_packed
+from pipeline import PipelineError, StepFailed, run_pipeline
+from prompt_registry import PromptRegistry
+from frequent_questions import FrequentQuestions, context_from_uri
+from single_flight import SingleFlight, call_key
+from cache_tiers import CACHES, cached, is_error_result
+from admission import AdmissionController
+from agent import ASK_MAX_STEPS, ASK_MODEL, ToolSpec, completion_text, run_agent
+import deadlines
+from deadlines import TOOL_TIMEOUT_SECONDS, DeadlineExceeded
+from metrics import REGISTRY, SIZE_BUCKETS, timed
+import tracing
+from resilience import BACKENDS, Backend, CircuitOpen
+from result_cache import ANALYZE_CACHE_MIN_VALUES, analyze_cache, file_fingerprint, fingerprint
+
+if TYPE_CHECKING:
+    from snowflake.connector import SnowflakeConnection
 
 
 from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.fastmcp.server import _convert_to_content
+from mcp.types import GetPromptResult, Prompt as MCPPrompt, PromptArgument, PromptMessage, TextContent
 logger = logging.getLogger(__name__)
 
 
+# Tools whose argument is a user question; each call counts towards frequent-question popularity
+QUESTION_TOOLS = {"DFWAnalyst": "prompt", "DFWSearch": "query"}
+
+# Tools without side effects; concurrent identical calls share one execution
+READ_ONLY_TOOLS = {
+    "DFWAnalyst", "DFWSearch", "calculator", "get_weather", "get_weather_batch", "analyze",
+    "ready-prompts", "search-prompts", "suggested_top_prompts", "mcp-email-status",
+}
+
+# Admission cost class per tool (admission.COST_CLASSES); anything else is "standard"
+TOOL_COST_CLASSES = {
+    "analyze": "heavy", "DFWAnalyst": "heavy", "DFWSearch": "heavy", "get_weather_batch": "heavy",
+    "mcp-send-bulk-email": "heavy",
+    "calculator": "light", "ready-prompts": "light", "search-prompts": "light", "suggested_top_prompts": "light",
+    "mcp-email-status": "light", "add-frequent-questions": "light",
+}
+
+# Tools that only orchestrate other tool calls; they are not admitted themselves
+COMPOSITE_TOOLS = {"run-pipeline", "ask"}
+
+TOOL_CALLS = REGISTRY.counter("dfw_tool_calls_total", "Tool calls by tool and status (ok/error)", ["tool", "status"])
+TOOL_SECONDS = REGISTRY.histogram("dfw_tool_duration_seconds", "Tool call latency as seen by the caller", ["tool"])
+TOOL_IN_FLIGHT = REGISTRY.gauge("dfw_tool_in_flight", "Tool calls in progress", ["tool"])
+TOOL_RESPONSE_BYTES = REGISTRY.histogram("dfw_tool_response_bytes", "Size of tool results returned to clients",
+                                         ["tool"], SIZE_BUCKETS)
+RESOURCE_READS = REGISTRY.counter("dfw_resource_reads_total", "Resource reads by resource and status (ok/error)",
+                                  ["resource", "status"])
+RESOURCE_SECONDS = REGISTRY.histogram("dfw_resource_duration_seconds", "Resource read latency", ["resource"])
+RESOURCE_IN_FLIGHT = REGISTRY.gauge("dfw_resource_in_flight", "Resource reads in progress", ["resource"])
+RESOURCE_BYTES = REGISTRY.histogram("dfw_resource_response_bytes", "Size of resource contents", ["resource"],
+                                    SIZE_BUCKETS)
+
+
+class DataFlyWheelMCP(FastMCP):
+    """
+    FastMCP whose prompt list and prompt lookup are served from the file-backed
+    prompt registry, and whose tool calls feed frequent-question popularity.
+    Calls to READ_ONLY_TOOLS are single-flighted: identical concurrent calls
+    (same tool, same canonical arguments) share one execution and one result.
+    Every execution is admitted through its TOOL_COST_CLASSES bulkhead first.
+
+    Each call runs under a deadline: the client's `_meta.timeout` (seconds),
+    capped to TOOL_TIMEOUT_SECONDS, which is also the default. On expiry or on
+    an MCP cancellation the tool task is cancelled and its CallScope is marked
+    cancelled, so backend calls still on worker threads stop at their next
+    checkpoint instead of holding pool slots.
+    """
+
+    def _client_key(self) -> str:
+        try:
+            request_context = self._mcp_server.request_context
+        except LookupError:
+            return "local"
+        client_id = getattr(request_context.meta, "client_id", None) if request_context.meta else None
+        return client_id or f"session-{id(request_context.session)}"
+
+    def _trace_context(self) -> tuple:
+        try:
+            return tracing.trace_context(self._mcp_server.request_context.meta)
+        except LookupError:
+            return None, None
+
+    def _call_timeout(self) -> float:
+        try:
+            meta = self._mcp_server.request_context.meta
+        except LookupError:
+            meta = None
+        try:
+            requested = float(getattr(meta, "timeout", None) or 0)
+        except (TypeError, ValueError):
+            requested = 0
+        timeout = min(requested, TOOL_TIMEOUT_SECONDS) if requested > 0 else TOOL_TIMEOUT_SECONDS
+        # A step of a server-side composite call gets no more than the call has left
+        left = deadlines.remaining()
+        return timeout if left is None else min(timeout, left)
+
+    async def _run(self, name: str, arguments: Dict[str, Any]):
+        # The tool's Python result; call_tool converts it to MCP content
+        return await self._tool_manager.call_tool(name, arguments, context=self.get_context())
+
+    async def _admitted_call(self, name: str, arguments: Dict[str, Any], client: str):
+        if name in COMPOSITE_TOOLS:
+            # Holds no slot itself; every tool call it makes is admitted on its own
+            return await self._run(name, arguments)
+        async with admission.admit(TOOL_COST_CLASSES.get(name, "standard"), client, name):
+            return await self._run(name, arguments)
+
+    async def _deadline_call(self, name: str, arguments: Dict[str, Any], client: str, timeout: float):
+        with deadlines.call_scope(timeout, name):
+            try:
+                return await asyncio.wait_for(self._admitted_call(name, arguments, client), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"{name} exceeded its {timeout:.0f}s deadline") from None
+
+    async def _dispatch(self, name: str, arguments: Dict[str, Any], record: bool):
+        question = arguments.get(QUESTION_TOOLS.get(name, "")) if record else None
+        if isinstance(question, str):
+            try:
+                frequent_questions.record(question)
+            except sqlite3.Error as e:
+                logger.warning(f"Frequent question tracking failed: {e}")
+        client = self._client_key()
+        timeout = self._call_timeout()
+        if name not in READ_ONLY_TOOLS:
+            return await self._deadline_call(name, arguments, client, timeout)
+        key = call_key(name, arguments)
+        span = tracing.current_span.get()
+        if span is not None:
+            # A joined execution's backend spans are recorded in the trace of the call that started it
+            span.set("dfw.single_flight", "joined" if key in tool_flights.calls else "leader")
+        # The shared execution runs under the first caller's deadline; each caller
+        # stops waiting at its own, and the execution is cancelled once none is left
+        try:
+            return await asyncio.wait_for(
+                tool_flights.do(key, lambda: self._deadline_call(name, arguments, client, timeout)),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{name} exceeded its {timeout:.0f}s deadline") from None
+
+    def _tool_label(self, name: str) -> str:
+        # Unknown names are collapsed so clients cannot create unbounded metric series
+        return name if self._tool_manager.get_tool(name) else "unknown"
+
+    def _resource_label(self, uri: str) -> str:
+        if uri in self._resource_manager._resources:
+            return uri
+        for template in self._resource_manager.list_templates():
+            if template.matches(uri) is not None:
+                return template.uri_template
+        return "unknown"
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]):
+        label = self._tool_label(name)
+        with timed(TOOL_CALLS, TOOL_SECONDS, TOOL_IN_FLIGHT, label) as outcome, \
+                tracing.root_span(f"tool {label}", *self._trace_context(), **{"mcp.tool": name}):
+            result = await self._dispatch(name, arguments, record=True)
+            if is_error_result(result):
+                outcome.status = "error"
+        content = _convert_to_content(result)
+        TOOL_RESPONSE_BYTES.observe(sum(len(getattr(item, "text", "") or "") for item in content), label)
+        return content
+
+    async def call_tool_raw(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Call a tool from inside the server and return its Python result rather than
+        MCP content. Admission, deadlines and single-flight apply as for a client call;
+        the question is not counted again for frequent questions.
+        """
+        label = self._tool_label(name)
+        with timed(TOOL_CALLS, TOOL_SECONDS, TOOL_IN_FLIGHT, label) as outcome, \
+                tracing.root_span(f"tool {label}", *self._trace_context(), **{"mcp.tool": name}):
+            result = await self._dispatch(name, arguments, record=False)
+            if is_error_result(result):
+                outcome.status = "error"
+            return result
+
+    async def read_resource(self, uri):
+        label = self._resource_label(str(uri))
+        with timed(RESOURCE_READS, RESOURCE_SECONDS, RESOURCE_IN_FLIGHT, label), \
+                tracing.root_span(f"resource {label}", *self._trace_context(), **{"mcp.resource": str(uri)}):
+            timeout = self._call_timeout()
+            with deadlines.call_scope(timeout, f"resource {label}"):
+                try:
+                    contents = await asyncio.wait_for(super().read_resource(uri), timeout)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"resource {label} exceeded its {timeout:.0f}s deadline") from None
+        RESOURCE_BYTES.observe(sum(len(item.content) for item in contents), label)
+        return contents
+
+    async def list_prompts(self) -> List[MCPPrompt]:
+        prompts = await super().list_prompts()
+        return prompts + [
+            MCPPrompt(
+                name=entry.name,
+                description=entry.description,
+                arguments=[PromptArgument(name=arg, required=True) for arg in entry.arguments],
+            )
+            for entry in prompt_registry.all()
+        ]
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> GetPromptResult:
+        entry = prompt_registry.get(name)
+        if entry is None:
+            return await super().get_prompt(name, arguments)
+        logger.info(f"Prompt {name} served from registry")
+        return GetPromptResult(
+            description=entry.description,
+            messages=[PromptMessage(role="user", content=TextContent(type="text", text=entry.render(arguments)))],
+        )
+
+
 # Create a named server
 NWS_API_BASE = "https://api.weather.gov"
-mcp = FastMCP("DataFlyWheel App")
+prompt_registry = PromptRegistry()
+frequent_questions = FrequentQuestions()
+tool_flights = SingleFlight()
+admission = AdmissionController()
+atexit.register(frequent_questions.flush)
+mcp = DataFlyWheelMCP("DataFlyWheel App")
+_weather = None
+
+
+def weather_client():
+    """NWS client and its prefetcher, created on the first weather call (the weather stack pulls in requests)."""
+    global _weather
+    if _weather is None:
+        from weather import NWSClient, PrefetchScheduler
+        nws = NWSClient(NWS_API_BASE)
+        _weather = nws, PrefetchScheduler(nws)
+    return _weather
+
+
+# Backend connectors load the Snowflake and SMTP client libraries; import them on first use
+def snowflake_conn(*args, **kwargs):
+    from ReduceReuseRecycleGENAI.snowflake import snowflake_conn as connect
+    with tracing.span("snowflake.connect", tracing.CLIENT):
+        return snowflake_login.call(connect, *args, **kwargs)
+
+
+async def connect_snowflake():
+    """Log in on a worker thread: the login (and its breaker) blocks, and the thread carries the call's deadline."""
+    return await asyncio.to_thread(
+        snowflake_conn,
+        logger,
+        aplctn_cd="aedl",
+        env="preprod",
+        region_name="us-east-1",
+        warehouse_size_suffix="",
+        prefix=""
+    )
+
+
+def get_ser_conn(*args, **kwargs):
+    from ReduceReuseRecycleGENAI.smtp import get_ser_conn as connect
+    return connect(*args, **kwargs)
 
 
 # --- Configurations ---
 ENV = "preprod"
 REGION_NAME = "us-east-1"
 SENDER_EMAIL = 'AbhinavVarma.Lakamraju@elevancehealth.com'
+CORTEX_TIMEOUT = 60
+SNOWFLAKE_QUERY_TIMEOUT = 60
+
+# Fail fast while Cortex is unhealthy; searches are idempotent reads and may be hedged
+cortex_analyst = Backend("cortex-analyst")
+cortex_search = Backend("cortex-search", hedge=True)
+cortex_complete = Backend("cortex-complete")
+# Every Snowflake tool and resource logs in first; fail fast while login is failing
+snowflake_login = Backend("snowflake-login")
+
+smtp_pool = SMTPPool(
+    lambda: get_ser_conn(logger, env=ENV, region_name=REGION_NAME, aplctn_cd="aedl", port=None, tls=True, debug=False),
+    relay=f"aedl-{ENV}-{REGION_NAME}",
+)
+atexit.register(smtp_pool.close)
+email_outbox = Outbox()
+email_outbox.register(smtp_pool)
+atexit.register(email_outbox.stop)
+
+
+@REGISTRY.collector
+def pool_and_cache_metrics():
+    """Pool utilization, breaker and cache state, read from their owners at scrape time."""
+    classes = admission.stats()
+    yield ("dfw_admission_running", "gauge", "Tool calls holding a slot, per cost class",
+           [({"class": name}, c["running"]) for name, c in classes.items()])
+    yield ("dfw_admission_slots", "gauge", "Slots per cost class",
+           [({"class": name}, c["slots"]) for name, c in classes.items()])
+    yield ("dfw_admission_utilization", "gauge", "Fraction of a cost class's slots in use",
+           [({"class": name}, c["running"] / c["slots"]) for name, c in classes.items()])
+    yield ("dfw_admission_queued", "gauge", "Tool calls waiting for a slot, per cost class",
+           [({"class": name}, c["queued"]) for name, c in classes.items()])
+    yield ("dfw_admission_shed_total", "counter", "Tool calls rejected up front, per cost class",
+           [({"class": name}, c["shed"]) for name, c in classes.items()])
+    yield ("dfw_admission_timed_out_total", "counter", "Tool calls that waited too long for a slot, per cost class",
+           [({"class": name}, c["timed_out"]) for name, c in classes.items()])
+
+    smtp = smtp_pool.stats()
+    yield ("dfw_smtp_idle_connections", "gauge", "Idle pooled SMTP sessions", [({}, smtp["idle"])])
+    yield ("dfw_smtp_max_connections", "gauge", "SMTP session pool size", [({}, smtp["max_connections"])])
+    yield ("dfw_smtp_sessions_opened_total", "counter", "SMTP sessions opened", [({}, smtp["opened"])])
+    yield ("dfw_smtp_sessions_reused_total", "counter", "Sends that reused a pooled SMTP session",
+           [({}, smtp["reused"])])
+
+    backends = {name: backend.stats() for name, backend in list(BACKENDS.items())}
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    yield ("dfw_backend_circuit_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+           [({"backend": name}, states[b["state"]]) for name, b in backends.items()])
+    yield ("dfw_backend_calls_total", "counter", "Backend calls through the breaker",
+           [({"backend": name}, b["calls"]) for name, b in backends.items()])
+    yield ("dfw_backend_rejected_total", "counter", "Backend calls failed fast by an open breaker",
+           [({"backend": name}, b["rejected"]) for name, b in backends.items()])
+    yield ("dfw_backend_hedges_total", "counter", "Hedged duplicate requests sent",
+           [({"backend": name}, b["hedges"]) for name, b in backends.items()])
+    yield ("dfw_backend_p95_seconds", "gauge", "Recent p95 backend latency",
+           [({"backend": name}, b["p95"]) for name, b in backends.items() if b["p95"] is not None])
+
+    caches = {name: cache.stats() for name, cache in list(CACHES.items())}
+    analyze = analyze_cache.stats()
+    yield ("dfw_cache_hits_total", "counter", "Cache hits per cache and tier",
+           [({"cache": name, "tier": tier}, hits)
+            for name, c in caches.items() for tier, hits in zip(c["tiers"], c["hits"])]
+           + [({"cache": "analyze", "tier": "MemoryTier"}, analyze["hits"])])
+    yield ("dfw_cache_misses_total", "counter", "Cache misses (all tiers)",
+           [({"cache": name}, c["misses"]) for name, c in caches.items()] + [({"cache": "analyze"}, analyze["misses"])])
+    ratios = [(name, sum(c["hits"]), c["misses"]) for name, c in caches.items()] + [
+        ("analyze", analyze["hits"], analyze["misses"])]
+    yield ("dfw_cache_hit_ratio", "gauge", "Hits / lookups since start",
+           [({"cache": name}, hits / (hits + misses)) for name, hits, misses in ratios if hits + misses])
+    yield ("dfw_cache_stale_served_total", "counter", "Stale results served while refreshing",
+           [({"cache": name}, c["stale_served"]) for name, c in caches.items()])
+    yield ("dfw_analyze_cache_bytes", "gauge", "Bytes held by the analyze result cache", [({}, analyze["bytes"])])
+
+    flights = tool_flights.stats()
+    yield ("dfw_single_flight_in_flight", "gauge", "Distinct read-only tool executions in progress",
+           [({}, flights["in_flight"])])
+    yield ("dfw_single_flight_shared_total", "counter", "Calls that joined an identical in-flight execution",
+           [({}, flights["shared"])])
 
 
 # --- Categorized Prompt Library ---
-
-PROMPT_LIBRARY = {
-    "hedis": [
-        {"name": "Explain BCS Measure", "prompt": "Explain the purpose of the BCS HEDIS measure."},
-        {"name": "List 2024 HEDIS Measures", "prompt": "List all HEDIS measures for the year 2024."},
-        {"name": "Age Criteria for CBP", "prompt": "What is the age criteria for the CBP measure?"}
-    ],
-    "contract": [
-        {"name": "Summarize Contract H123", "prompt": "Summarize contract ID H123 for 2023."},
-        {"name": "Compare Contracts H456 & H789", "prompt": "Compare contracts H456 and H789 on key metrics."}
-    ]
-}
+# Prompts live in prompts.json (DFW_PROMPTS_PATH) and are reloaded when the file changes
 
 @mcp.tool(name="ready-prompts", description="Return ready-made prompts by application category")
 def get_ready_prompts(category: str) -> dict:
     category = category.lower()
-    if category not in PROMPT_LIBRARY:
+    prompts = prompt_registry.category(category)
+    if not prompts:
         return {"error": f"No prompts found for category '{category}'"}
     return {
         "category": category,
-        "prompts": PROMPT_LIBRARY[category]
+        "prompts": [{"name": entry.title or entry.name, "prompt": entry.prompt} for entry in prompts]
+    }
+
+@mcp.tool(name="search-prompts", description="""
+Search the prompt library by keyword, optionally within one category.
+
+Args:
+    query: Words that must all appear in the prompt; the last word also matches as a prefix
+    category: Restrict to one category (e.g. "hedis", "contract")
+    limit: Maximum number of prompts returned
+
+Returns matching prompts (name, category, title, description, prompt), name/title matches first.
+""")
+def search_prompts(query: str = "", category: Optional[str] = None, limit: int = 20) -> dict:
+    matches = prompt_registry.search(query, category, limit)
+    return {
+        "query": query,
+        "categories": prompt_registry.categories(),
+        "prompts": [
+            {"name": e.name, "category": e.category, "title": e.title, "description": e.description, "prompt": e.prompt}
+            for e in matches
+        ],
     }
 
 
+# --- Frequent Questions ---
+class FrequentQuestion(BaseModel):
+    user_context: Optional[str] = None
+    prompt: str
+
+@mcp.resource(uri="genaiplatform://hedis/frequent_questions/{context}", name="hedis_frequent_questions",
+              description="Frequent questions for a user context, most used first")
+async def get_frequent_questions(context: str) -> List[Dict]:
+    return frequent_questions.questions_for(context)
+
+@mcp.tool(name="add-frequent-questions", description="""
+Store frequent questions for a user context.
+
+Args:
+    uri: genaiplatform://hedis/frequent_questions/{context} resource the questions belong to
+    questions: [{"user_context": ..., "prompt": ...}]; user_context defaults to the uri's context
+
+Questions already stored for the context (ignoring case, spacing and trailing punctuation) are skipped.
+""")
+async def add_frequent_questions(uri: str, questions: List[FrequentQuestion]) -> Dict:
+    default_context = context_from_uri(uri)
+    by_context: Dict[str, List[str]] = {}
+    for question in questions:
+        by_context.setdefault(question.user_context or default_context, []).append(question.prompt)
+    added = duplicates = 0
+    try:
+        for context, prompts in by_context.items():
+            new, dup = await asyncio.to_thread(frequent_questions.add, context, prompts)
+            added += new
+            duplicates += dup
+    except sqlite3.Error as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "success", "added": added, "duplicates": duplicates}
+
+@mcp.tool(name="suggested_top_prompts", description="""
+Most used frequent questions, optionally for one user context.
+
+Args:
+    context: User context (e.g. "Initialization"); all contexts when omitted
+    top_n: Number of suggestions (at most DFW_FAQ_TOP_N)
+""")
+def suggested_top_prompts(context: Optional[str] = None, top_n: Optional[int] = None) -> Dict:
+    top = frequent_questions.top(context)
+    return {"status": "success", "context": context, "prompts": top if top_n is None else top[:top_n]}
+
+
 @dataclass
 class AppContext:
-    conn: SnowflakeConnection
+    conn: "SnowflakeConnection"
     db: str
     schema: str
     host: str  
@@ -82,6 +470,15 @@ class AppContext:
 #mcp = FastMCP("DataFlyWheel App", lifespan=app_lifespan)
 
 
+def run_query(conn, sql: str) -> list:
+    """Run a Snowflake query (blocking) with its timeout shortened to what the current call has left."""
+    cursor = conn.cursor()
+    try:
+        with tracing.span("snowflake.query", tracing.CLIENT, **{"db.statement": sql}):
+            return cursor.execute(sql, timeout=max(1, int(deadlines.timeout(SNOWFLAKE_QUERY_TIMEOUT)))).fetchall()
+    finally:
+        cursor.close()
+
 #Stag name may need to be determined; requires code change
 #Resources; Have access to resources required for the server; Cortex Search; Cortex stage schematic config; stage area should be fully qualified name
 @mcp.resource(uri="schematiclayer://cortex_analyst/schematic_models/{stagename}/list", name="hedis_schematic_models", description="Hedis Schematic models")
@@ -90,19 +487,15 @@ async def get_schematic_model(stagename: str):
     #ctx = mcp.get_context()
 
     HOST = "carelon-eda-preprod.privatelink.snowflakecomputing.com"
-    conn = snowflake_conn(
-           logger,
-           aplctn_cd="aedl",
-           env="preprod",
-           region_name="us-east-1",
-           warehouse_size_suffix="",
-           prefix=""
-        )
+    conn = await connect_snowflake()
     #conn = ctx.request_context.lifespan_context.conn
     db = 'POC_SPC_SNOWPARK_DB'
     schema = 'HEDIS_SCHEMA'
-    cursor = conn.cursor()
-    snfw_model_list = cursor.execute("LIST @{db}.{schema}.{stagename}".format(db=db, schema=schema, stagename=stagename))
+    try:
+        snfw_model_list = await asyncio.to_thread(
+            run_query, conn, "LIST @{db}.{schema}.{stagename}".format(db=db, schema=schema, stagename=stagename))
+    finally:
+        conn.close()
 
     return [stg_nm[0].split("/")[-1] for stg_nm in snfw_model_list if stg_nm[0].endswith('yaml')]
    
@@ -111,20 +504,16 @@ async def get_search_service():
     """Cortex search service"""
 
     HOST = "carelon-eda-preprod.privatelink.snowflakecomputing.com"
-    conn = snowflake_conn(
-           logger,
-           aplctn_cd="aedl",
-           env="preprod",
-           region_name="us-east-1",
-           warehouse_size_suffix="",
-           prefix=""
-        )
+    conn = await connect_snowflake()
     #conn = ctx.request_context.lifespan_context.conn
     db = 'POC_SPC_SNOWPARK_DB'
     schema = 'HEDIS_SCHEMA'
-    cursor = conn.cursor()
-    snfw_search_objs = cursor.execute("SHOW CORTEX SEARCH SERVICES IN SCHEMA {db}.{schema}".format(db=db, schema=schema))
-    result = [search_obj[1] for search_obj in snfw_search_objs.fetchall()]
+    try:
+        snfw_search_objs = await asyncio.to_thread(
+            run_query, conn, "SHOW CORTEX SEARCH SERVICES IN SCHEMA {db}.{schema}".format(db=db, schema=schema))
+    finally:
+        conn.close()
+    result = [search_obj[1] for search_obj in snfw_search_objs]
    
     return result
 
@@ -145,18 +534,12 @@ async def get_search_service():
 
         """
 )
+@cached(ttl=3600, stale_while_revalidate=86400, ignore=(Context,))
 async def dfw_text2sql(prompt: str, ctx: Context) -> dict:
     """Tool to convert natural language text to snowflake sql for hedis system, text should be passed as 'prompt' input perameter"""
 
     HOST = "carelon-eda-preprod.privatelink.snowflakecomputing.com"
-    conn = snowflake_conn(
-           logger,
-           aplctn_cd="aedl",
-           env="preprod",
-           region_name="us-east-1",
-           warehouse_size_suffix="",
-           prefix=""
-        )
+    conn = await connect_snowflake()
 
     #conn = ctx.request_context.lifespan_context.conn
     db = 'POC_SPC_SNOWPARK_DB'
@@ -169,16 +552,32 @@ async def dfw_text2sql(prompt: str, ctx: Context) -> dict:
         "semantic_model_file": f"@{db}.{schema}.{stage_name}/{file_name}",
     }
 
-    token = conn.rest.token
-    resp = requests.post(
-        url=f"https://{host}/api/v2/cortex/analyst/message",
-        json=request_body,
-        headers={
-            "Authorization": f'Snowflake Token="{token}"',
-            "Content-Type": "application/json",
-        },
-    )
-    return resp.json()
+    with tracing.span("snowflake.token"):
+        token = conn.rest.token
+
+    def send():
+        import requests
+        with tracing.span("POST cortex/analyst/message", tracing.CLIENT) as span:
+            resp = requests.post(
+                url=f"https://{host}/api/v2/cortex/analyst/message",
+                json=request_body,
+                headers={
+                    "Authorization": f'Snowflake Token="{token}"',
+                    "Content-Type": "application/json",
+                },
+                timeout=deadlines.timeout(CORTEX_TIMEOUT),
+            )
+            if span is not None:
+                span.set("http.status_code", resp.status_code)
+        if resp.status_code >= 500 or resp.status_code == 429:
+            resp.raise_for_status()
+        with tracing.span("json.parse", **{"http.response_bytes": len(resp.content)}):
+            return resp.json()
+
+    try:
+        return await cortex_analyst.acall(send)
+    finally:
+        conn.close()
 
 #Need to change the type of serch, implimented in the below code; Revisit
 @mcp.tool(
@@ -198,18 +597,12 @@ async def dfw_text2sql(prompt: str, ctx: Context) -> dict:
               query (str): text to be passed
        """
 )
+@cached(ttl=3600, stale_while_revalidate=86400, ignore=(Context,))
 async def dfw_search(ctx: Context, query: str):
     """Tool to provide search againest HEDIS business documents for the year 2024, search string should be provided as 'query' perameter"""
 
     HOST = "carelon-eda-preprod.privatelink.snowflakecomputing.com"
-    conn = snowflake_conn(
-           logger,
-           aplctn_cd="aedl",
-           env="preprod",
-           region_name="us-east-1",
-           warehouse_size_suffix="",
-           prefix=""
-        )
+    conn = await connect_snowflake()
 
     #conn = ctx.request_context.lifespan_context.conn
     db = 'POC_SPC_SNOWPARK_DB'
@@ -218,14 +611,24 @@ async def dfw_search(ctx: Context, query: str):
     columns = ['chunk']
     limit = 2    
 
-    root = Root(conn)
-    search_service = root.databases[db].schemas[schema].cortex_search_services[search_service]
-    response = search_service.search(
-        query=query,
-        columns=columns,
-        limit=limit
-    )
-    return response.to_json()
+    def lookup(name):
+        from snowflake.core import Root
+        with tracing.span("snowflake.search_service"):
+            return Root(conn).databases[db].schemas[schema].cortex_search_services[name]
+
+    def search(service):
+        response = service.search(
+            query=query,
+            columns=columns,
+            limit=limit
+        )
+        return response.to_json()
+
+    try:
+        service = await asyncio.to_thread(lookup, search_service)
+        return await cortex_search.acall(search, service)
+    finally:
+        conn.close()
 
 @mcp.tool(
         name="calculator",
@@ -261,68 +664,134 @@ def calculate(expression: str) -> str:
         print(" Error in calculate:", str(e), flush=True)
         return f" Error: {str(e)}"
 
+def format_weather(point: Dict, forecast_data: Dict) -> str:
+    """Formats the current forecast period for a gridpoint as text"""
+    location_name = f"{point['city']}, {point['state']}"
+
+    # Extract the current period's forecast
+    current_period = forecast_data['properties']['periods'][0]
+
+    # Format and return the weather information
+    return (
+        f" Weather for {location_name}:\n"
+        f" - Period: {current_period['name']}\n"
+        f" - Temperature: {current_period['temperature']}°{current_period['temperatureUnit']}\n"
+        f" - Conditions: {current_period['shortForecast']}\n"
+        f" - Wind: {current_period['windSpeed']} {current_period['windDirection']}\n"
+        f" - Detailed Forecast: {current_period['detailedForecast']}"
+    )
+
 @mcp.tool()
-def get_weather(latitude: float, longitude: float) -> str:
+async def get_weather(latitude: float, longitude: float, structured: bool = False) -> Union[str, Dict]:
     """
     Fetches current weather forecast for a given location using the NWS API.
    
     Args:
         latitude: Latitude of the location (e.g., 40.7128 for New York City)
         longitude: Longitude of the location (e.g., -74.0060 for New York City)
+        structured: Return typed fields (temperature, unit, short_forecast, wind,
+            snow/precipitation flags, period) instead of formatted text; a flag is
+            false when the forecast only mentions it negated ("little or no snow")
    
     Returns:
-        Weather forecast information as a string
+        Weather forecast information as a string, or a dict when structured is set
     """
     print(f" get_weather() called for coordinates: ({latitude}, {longitude})", flush=True)
+    import requests
+    from weather import PREFETCH_ENABLED, summarize_period
+    nws, prefetcher = weather_client()
     try:
-        # Set headers for the API request
-        headers = {
-            "User-Agent": "MCP Weather Client (your-email@example.com)",
-            "Accept": "application/geo+json"
-        }
-       
-        # Step 1: Get the grid points for the provided coordinates
-        points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-        points_response = requests.get(points_url, headers=headers)
-        points_response.raise_for_status()
-        points_data = points_response.json()
-       
-        # Extract the forecast URL from the response
-        forecast_url = points_data['properties']['forecast']
-        location_name = f"{points_data['properties']['relativeLocation']['properties']['city']}, {points_data['properties']['relativeLocation']['properties']['state']}"
-       
-        # Step 2: Get the forecast using the URL from the previous response
-        forecast_response = requests.get(forecast_url, headers=headers)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
-       
-        # Extract the current period's forecast
-        current_period = forecast_data['properties']['periods'][0]
-       
-        # Format and return the weather information
-        weather_info = (
-            f" Weather for {location_name}:\n"
-            f" - Period: {current_period['name']}\n"
-            f" - Temperature: {current_period['temperature']}°{current_period['temperatureUnit']}\n"
-            f" - Conditions: {current_period['shortForecast']}\n"
-            f" - Wind: {current_period['windSpeed']} {current_period['windDirection']}\n"
-            f" - Detailed Forecast: {current_period['detailedForecast']}"
-        )
-        return weather_info
+        # Gridpoint lookups are cached permanently and forecasts until their Expires,
+        # so most calls make zero or one upstream request
+        if PREFETCH_ENABLED:
+            prefetcher.ensure_running()
+        # Rate limiting, hedging and the HTTP calls block, so they run on the client's pool
+        point, forecast_data = await deadlines.run_in_executor(nws.executor, nws.forecast, latitude, longitude)
+        if structured:
+            return dict(summarize_period(point, forecast_data), status="success")
+        return format_weather(point, forecast_data)
        
     except requests.exceptions.RequestException as e:
         print(" Error in get_weather (request):", str(e), flush=True)
+        if structured:
+            return {"status": "error", "error": f"Error fetching weather data: {str(e)}"}
         return f" Error fetching weather data: {str(e)}"
     except (KeyError, ValueError, json.JSONDecodeError) as e:
         print(" Error in get_weather (parsing):", str(e), flush=True)
+        if structured:
+            return {"status": "error", "error": f"Error parsing weather data: {str(e)}"}
         return f" Error parsing weather data: {str(e)}"
 
+class WeatherLocation(BaseModel):
+    latitude: float
+    longitude: float
+    name: Optional[str] = None
+
+@mcp.tool(
+    name="get_weather_batch",
+    description="""
+    Fetches current weather forecasts for many locations in one call using the NWS API.
+
+    Locations that fall on the same NWS gridpoint share one upstream request, and
+    the remaining requests are made concurrently with polite rate limiting.
+
+    Example inputs:
+        [{"name": "Colorado", "latitude": 39.059811, "longitude": -105.311104},
+         {"name": "Maine", "latitude": 44.693947, "longitude": -69.381927}]
+
+    Args:
+        locations (List[WeatherLocation]): Coordinates with an optional name
+        structured (bool): Return typed forecast fields per location instead of text
+
+    Returns:
+        Dict: Forecast (or error) per location, keyed by name or "latitude,longitude"
+    """
+)
+async def get_weather_batch(locations: List[WeatherLocation], structured: bool = False) -> Dict:
+    """Concurrent, gridpoint-deduplicated weather lookup for many locations"""
+    print(f" get_weather_batch() called for {len(locations)} locations", flush=True)
+    import requests
+    from weather import PREFETCH_ENABLED, summarize_period
+    nws, prefetcher = weather_client()
+    if PREFETCH_ENABLED:
+        prefetcher.ensure_running()
+    coordinates = [(loc.latitude, loc.longitude) for loc in locations]
+    forecasts = await nws.forecast_many(coordinates)
+
+    results = {}
+    for loc in locations:
+        key = loc.name or f"{loc.latitude},{loc.longitude}"
+        outcome = forecasts[nws.point_key(loc.latitude, loc.longitude)]
+        if isinstance(outcome, requests.exceptions.RequestException):
+            results[key] = {"status": "error", "error": f"Error fetching weather data: {str(outcome)}"}
+        elif isinstance(outcome, Exception):
+            results[key] = {"status": "error", "error": f"Error parsing weather data: {str(outcome)}"}
+        else:
+            try:
+                if structured:
+                    results[key] = dict(summarize_period(*outcome), status="success")
+                else:
+                    results[key] = {"status": "success", "weather": format_weather(*outcome)}
+            except (KeyError, IndexError, TypeError) as e:
+                results[key] = {"status": "error", "error": f"Error parsing weather data: {str(e)}"}
+    return {"status": "success", "results": results}
+
 # --- Email Tool ---
 class EmailRequest(BaseModel):
     subject: str
     body: str
     receivers: str
 
+class BulkRecipient(BaseModel):
+    email: str
+    variables: Dict[str, Any] = {}
+
+class PackedArray(BaseModel):
+    dtype: str = "float64"
+    shape: List[int]
+    data: str
+    columns: Optional[List[str]] = None
+
 @mcp.tool(
     name="analyze",
     description="""
@@ -331,93 +800,246 @@ class EmailRequest(BaseModel):
     Example inputs:
         Data: [1, 2, 3, 4, 5], Operation: "mean"
         Data: {"col1": [10, 20, 30], "col2": [5, 15, 25]}, Operation: "sum"
+        Source: "upload://<id>.csv", Operation: "max", Columns: ["website_traffic"]
+        Data: {"region": ["east", "west", "east"], "sales": [120, 150, 80]}, Operation: "sum", Group_by: ["region"]
+        Data: {"website_traffic": [1520, 1845, 1350, 2100]}, Operation: "mean", Rolling: 3
 
     Supported operations:
         "sum", "mean", "median", "min", "max", "average"
 
+    Large inputs should be passed as a file reference instead of inline data:
+    either an upload:// reference returned by the server's /uploads endpoint or a
+    server-local path. CSV, NDJSON and Parquet files are read in streaming chunks.
+
+    Large numeric inputs can be sent as a packed payload instead of a JSON array:
+    {"dtype": "float64" | "float32", "shape": [n] or [columns, n], "data": <base64 of
+    little-endian values>, "columns": [names]}. 2-D payloads store one column after another.
+
+    Breakdowns are computed in a single pass and returned as one record per group:
+    group_by key columns, resample a time_column by "hour", "day", "week" or "month",
+    or cut fixed windows of N rows. Rolling returns the trailing N-row statistic for
+    every position of each column instead.
+
     Args:
         data (Union[List, Dict[str, List]]): Numeric data to analyze
         operation (str): Statistical operation to perform
+        source (str): Optional file reference to analyze instead of data
+        file_format (str): Optional "csv", "ndjson" or "parquet"; inferred from the extension by default
+        columns (List[str]): Optional subset of file columns to analyze
+        group_by (List[str]): Optional key columns to aggregate per group
+        time_column (str): Timestamp column (ISO-8601 or epoch seconds) used by resample
+        resample (str): Optional "hour", "day", "week" or "month" buckets over time_column
+        window (int): Optional fixed window size in rows
+        rolling (int): Optional rolling window size in rows
+        packed (PackedArray): Optional packed binary payload to analyze instead of data
 
     Returns:
         Dict: Result of statistical analysis with status
     """
 )
-async def analyze(data: Union[List, Dict[str, List]], operation: str) -> Dict:
+async def analyze(data: Optional[Union[List, Dict[str, List]]] = None, *, operation: str,
+                  source: Optional[str] = None, file_format: Optional[str] = None,
+                  columns: Optional[List[str]] = None, group_by: Optional[List[str]] = None,
+                  time_column: Optional[str] = None, resample: Optional[str] = None,
+                  window: Optional[int] = None, rolling: Optional[int] = None,
+                  packed: Optional[PackedArray] = None) -> Dict:
     """Performs statistical analysis on numeric data"""
     logger.info(f"Analyzer called with operation: {operation}")
     try:
-        operation = operation.lower()
-        
-        # Map 'average' to 'mean' since they are mathematically equivalent
-        if operation == "average":
-            operation = "mean"
-            
-        valid_ops = ["sum", "mean", "median", "min", "max", "average"]
-        
-        if operation not in valid_ops:
-            return {"status": "error", "error": f"Invalid operation. Choose from: {', '.join(valid_ops)}"}
-
-        def extract_numbers(raw):
-            return [float(n) for n in raw if isinstance(n, (int, float)) or
-                   (isinstance(n, str) and n.replace('.', '', 1).isdigit())]
-
-        if isinstance(data, list):
-            numbers = extract_numbers(data)
-            if not numbers:
-                return {"status": "error", "error": "No valid numeric values found in list."}
-
-            result = {
-                "sum": sum(numbers),
-                "mean": statistics.mean(numbers),
-                "median": statistics.median(numbers),
-                "min": min(numbers),
-                "max": max(numbers)
-            }[operation]
-
-            return {"status": "success", "result": result}
-
-        elif isinstance(data, dict):
-            result_dict = {}
-            for key, values in data.items():
-                if not isinstance(values, list):
-                    continue
-
-                numbers = extract_numbers(values)
-                if numbers:
-                    result_dict[key] = {
-                        "sum": sum(numbers),
-                        "mean": statistics.mean(numbers),
-                        "median": statistics.median(numbers),
-                        "min": min(numbers),
-                        "max": max(numbers)
-                    }[operation]
-
-            if not result_dict:
-                return {"status": "error", "error": "No valid numeric data in any columns."}
-
-            return {"status": "success", "result": result_dict}
-
-        return {"status": "error", "error": f"Invalid input type: {type(data).__name__}"}
-
+        operation = normalize_operation(operation)
+
+        if operation is None:
+            return {"status": "error", "error": f"Invalid operation. Choose from: {', '.join(VALID_OPERATIONS)}"}
+
+        packed_columns = None
+        if packed is not None:
+            # Decoded as memoryviews over the payload buffer; no per-element validation
+            packed_columns = decode_packed(packed.data, packed.dtype, packed.shape, packed.columns)
+            data = packed_columns["value"] if len(packed.shape) == 1 else packed_columns
+
+        # Identical data + operation set (e.g. a Streamlit re-render) is served from the result cache
+        params = {"operation": operation, "file_format": file_format, "columns": columns, "group_by": group_by,
+                  "time_column": time_column, "resample": resample, "window": window, "rolling": rolling}
+        key = await _analysis_key(data, source, params)
+        if key is not None:
+            cached = analyze_cache.get(key)
+            if cached is not None:
+                return cached
+
+        if packed_columns is not None:
+            response = await _run_packed_analysis(packed_columns, len(packed.shape) == 1, operation,
+                                                  group_by, resample, window, rolling)
+        else:
+            response = await _run_analysis(data, operation, source, file_format, columns,
+                                           group_by, time_column, resample, window, rolling)
+        if key is not None and response.get("status") == "success":
+            analyze_cache.put(key, response)
+        return response
+
+    except (SourceError, AnalysisError, PayloadError) as e:
+        return {"status": "error", "error": str(e)}
     except Exception as e:
         logger.error(f"Error in analyzer: {str(e)}")
         return {"status": "error", "error": str(e)}
 
-@mcp.tool(name="mcp-send-email", description="Send an email with a subject and HTML body to recipients.")
-def mcp_send_email(subject: str, body: str, receivers: str) -> Dict:
+
+async def _analysis_key(data, source: Optional[str], params: dict) -> Optional[str]:
+    """Result cache key for an analyze call, or None when the input is too small to be worth hashing."""
+    if source:
+        if source.startswith(UPLOAD_SCHEME):
+            # Upload references are content hashes already
+            return fingerprint(source, params)
+        return file_fingerprint(resolve_source(source), params)
+    size = input_size(data)
+    if size < ANALYZE_CACHE_MIN_VALUES:
+        return None
+    if size < 100000:
+        return fingerprint(data, params)
+    return await asyncio.to_thread(fingerprint, data, params)
+
+
+async def _run_packed_analysis(columns: Dict[str, Any], series: bool, operation: str, group_by: Optional[List[str]],
+                               resample: Optional[str], window: Optional[int], rolling: Optional[int]) -> Dict:
+    """Runs a decoded packed payload straight through the chunk aggregators"""
+    if group_by or resample:
+        return {"status": "error", "error": "group_by and resample need key columns; send them as JSON data or a file source."}
+    if rolling and window:
+        return {"status": "error", "error": "rolling cannot be combined with group_by, resample or window."}
+
+    if rolling:
+        result = await asyncio.to_thread(rolling_aggregate, [columns], operation, rolling)
+    elif window:
+        result = await asyncio.to_thread(grouped_aggregate, [columns], operation, None, None, None, window)
+    elif should_parallelize(columns):
+        result = await aggregate_parallel(columns, operation)
+    else:
+        result = await asyncio.to_thread(aggregate_chunks, [columns], operation)
+
+    if not result:
+        return {"status": "error", "error": "No valid numeric data in any columns."}
+    if series and not window:
+        result = result.get("value")
+    return {"status": "success", "result": result}
+
+
+async def _run_analysis(data, operation: str, source: Optional[str], file_format: Optional[str],
+                        columns: Optional[List[str]], group_by: Optional[List[str]], time_column: Optional[str],
+                        resample: Optional[str], window: Optional[int], rolling: Optional[int]) -> Dict:
+    """Dispatches an analyze call to the grouped, rolling, parallel, streamed or inline path"""
+    if group_by or resample or window:
+        if rolling:
+            return {"status": "error", "error": "rolling cannot be combined with group_by, resample or window."}
+        keys = list(group_by or []) + ([time_column] if time_column else [])
+        if source:
+            chunks = iter_chunks(source, file_format, columns, keys=keys)
+        elif isinstance(data, dict):
+            chunks = [align_columns(data, keys)]
+        elif isinstance(data, list) and window:
+            chunks = [{"value": array("d", map(to_number, data))}]
+        else:
+            return {"status": "error", "error": "group_by and resample need column data (a dict or a file source)."}
+
+        records = await asyncio.to_thread(
+            grouped_aggregate, chunks, operation, group_by, time_column, resample, window
+        )
+        if not records:
+            return {"status": "error", "error": "No valid numeric data in any columns."}
+        return {"status": "success", "result": records}
+
+    if rolling:
+        if source:
+            chunks = iter_chunks(source, file_format, columns)
+        elif isinstance(data, dict):
+            chunks = [{key: extract_numbers(values) for key, values in data.items() if isinstance(values, list)}]
+        elif isinstance(data, list):
+            chunks = [{"value": extract_numbers(data)}]
+        else:
+            return {"status": "error", "error": f"Invalid input type: {type(data).__name__}"}
+
+        series = await asyncio.to_thread(rolling_aggregate, chunks, operation, rolling)
+        series = {key: values for key, values in series.items() if values}
+        if not series:
+            return {"status": "error", "error": "No valid numeric data in any columns."}
+        return {"status": "success", "result": series["value"] if isinstance(data, list) and not source else series}
+
+    if should_parallelize(data):
+        # Large inline inputs are sharded across the process pool via shared memory
+        result = await analyze_parallel(data, operation)
+        if result is None or result == {}:
+            return {"status": "error", "error": "No valid numeric data in any columns."}
+        return {"status": "success", "result": result}
+
+    if source:
+        # Stream the file off the event loop so other sessions keep being served
+        result_dict = await asyncio.to_thread(
+            aggregate_chunks, iter_chunks(source, file_format, columns), operation
+        )
+        if not result_dict:
+            return {"status": "error", "error": "No valid numeric data in any columns."}
+        return {"status": "success", "result": result_dict}
+
+    if isinstance(data, list):
+        numbers = extract_numbers(data)
+        if not numbers:
+            return {"status": "error", "error": "No valid numeric values found in list."}
+
+        return {"status": "success", "result": compute(numbers, operation)}
+
+    elif isinstance(data, dict):
+        result_dict = {}
+        for key, values in data.items():
+            if not isinstance(values, list):
+                continue
+
+            numbers = extract_numbers(values)
+            if numbers:
+                result_dict[key] = compute(numbers, operation)
+
+        if not result_dict:
+            return {"status": "error", "error": "No valid numeric data in any columns."}
+
+        return {"status": "success", "result": result_dict}
+
+    return {"status": "error", "error": f"Invalid input type: {type(data).__name__}"}
+
+@mcp.tool(name="mcp-send-email", description="""
+Send an email with a subject and HTML body to recipients.
+
+Args:
+    subject: Email subject
+    body: HTML body
+    receivers: Comma-separated recipient addresses
+    outbox: Queue the message durably and return a message_id immediately instead of
+        waiting for the relay; poll delivery with mcp-email-status
+    digest_topic: Digest mode. Messages to the same recipient with the same topic are
+        merged into one email, sent when the recipient's window closes
+    digest_window: Digest window in seconds (default DFW_DIGEST_WINDOW_SECONDS)
+""")
+async def mcp_send_email(subject: str, body: str, receivers: str, outbox: bool = False,
+                         digest_topic: Optional[str] = None, digest_window: Optional[float] = None) -> Dict:
     try:
         recipients = [email.strip() for email in receivers.split(",")]
 
-        msg = MIMEMultipart()
-        msg['Subject'] = subject
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = ', '.join(recipients)
-        msg.attach(MIMEText(body, 'html'))
+        if digest_topic:
+            window = DIGEST_WINDOW_SECONDS if digest_window is None else digest_window
+            digests = {}
+            for recipient in recipients:
+                digests[recipient] = await asyncio.to_thread(
+                    email_outbox.add_digest, smtp_pool.relay, SENDER_EMAIL, recipient, digest_topic, subject, body, window)
+            logger.info(f"Email buffered for digest '{digest_topic}'.")
+            return {"status": "buffered", "digests": digests}
 
-        smtp = get_ser_conn(logger, env=ENV, region_name=REGION_NAME, aplctn_cd="aedl", port=None, tls=True, debug=False)
-        smtp.sendmail(SENDER_EMAIL, recipients, msg.as_string())
-        smtp.quit()
+        message = build_message(SENDER_EMAIL, recipients, subject, body)
+
+        if outbox:
+            # Committed to SQLite before returning; background workers deliver with retry and backoff
+            message_id = await asyncio.to_thread(
+                email_outbox.enqueue, smtp_pool.relay, SENDER_EMAIL, recipients, message)
+            logger.info(f"Email queued as {message_id}.")
+            return {"status": "queued", "message_id": message_id}
+
+        # Reuses a kept-alive, already authenticated relay session when one is idle
+        await smtp_pool.send(SENDER_EMAIL, recipients, message)
 
         logger.info("Email sent successfully.")
         return {"status": "success", "message": "Email sent successfully."}
@@ -425,51 +1047,153 @@ def mcp_send_email(subject: str, body: str, receivers: str) -> Dict:
         logger.error(f"Error sending email: {e}")
         return {"status": "error", "message": str(e)}
 
+@mcp.tool(name="mcp-email-status", description="""
+Delivery state of a message queued with mcp-send-email(outbox=True).
+
+Args:
+    message_id: ID returned when the message was queued
+
+Also accepts digest IDs from mcp-send-email(digest_topic=...).
+
+Returns status (buffered, queued, sending, sent or failed), attempts, last_error and timestamps.
+""")
+async def mcp_email_status(message_id: str) -> Dict:
+    state = await asyncio.to_thread(email_outbox.status, message_id)
+    if state is None:
+        return {"status": "error", "message": f"Unknown message_id: {message_id}"}
+    return {"status": "success", "delivery": state}
+
+@mcp.tool(name="mcp-send-bulk-email", description="""
+Send a personalized email to many recipients from one template.
+
+Placeholders use $name or ${name} and are filled from each recipient's variables;
+$email is always available. Write $$ for a literal dollar sign (e.g. "costs $$5").
+Variable values are HTML-escaped in the body. The template is parsed once, messages
+are rendered in a worker pool and delivered over pooled SMTP sessions.
+
+Example:
+    subject: "Your $month report"
+    body: "<p>Hi $first_name, your score is $score.</p>"
+    recipients: [{"email": "a@x.com", "variables": {"first_name": "Ann", "month": "May", "score": 91}}]
+
+Returns one result per recipient: sent, or error with the reason. A malformed
+template fails the whole call with one error before anything is sent.
+""")
+async def mcp_send_bulk_email(subject: str, body: str, recipients: List[BulkRecipient]) -> Dict:
+    if not recipients:
+        return {"status": "error", "message": "No recipients provided."}
+    try:
+        template = MailTemplate(SENDER_EMAIL, subject, body)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    results = await send_bulk(smtp_pool, template, [(r.email.strip(), r.variables) for r in recipients])
+    sent = sum(1 for r in results if r["status"] == "sent")
+    logger.info(f"Bulk email: {sent}/{len(results)} sent.")
+    return {"status": "success" if sent == len(results) else "partial" if sent else "error",
+            "sent": sent, "failed": len(results) - sent, "results": results}
+
+class PipelineStep(BaseModel):
+    id: str
+    tool: str
+    arguments: Dict[str, Any] = {}
+
+@mcp.tool(name="run-pipeline", description="""
+Run several tool calls on the server in one request, passing outputs between them.
+
+Steps form a small DAG: a step's arguments may contain {"$ref": "<step id>"} or
+{"$ref": "<step id>.<field>.<index>"} in place of a value, which is replaced by that
+step's output. Steps start as soon as what they reference is ready, so independent
+branches run concurrently; intermediate data never leaves the server.
+
+Example:
+    steps: [
+      {"id": "sql", "tool": "DFWAnalyst", "arguments": {"prompt": "Codes in the BCS value set?"}},
+      {"id": "spec", "tool": "DFWSearch", "arguments": {"query": "BCS age criteria"}},
+      {"id": "mail", "tool": "mcp-send-email", "arguments": {"subject": "BCS", "receivers": "a@x.com",
+        "body": {"$ref": "spec"}}}
+    ]
+    outputs: ["sql", "mail"]
+
+outputs lists the step ids to return (default: steps no other step consumes).
+The first failing step (one that raises or returns an error result) cancels the
+rest, so its dependants never run, and is reported with its id.
+""")
+async def mcp_run_pipeline(steps: List[PipelineStep], outputs: Optional[List[str]] = None) -> Dict:
+    tools = {tool.name for tool in await mcp.list_tools()} - COMPOSITE_TOOLS
+    try:
+        results = await run_pipeline([step.model_dump() for step in steps], mcp.call_tool_raw, tools, outputs,
+                                     is_error=is_error_result)
+    except PipelineError as e:
+        return {"status": "error", "error": str(e)}
+    except StepFailed as e:
+        return {"status": "error", "step": e.step, "error": str(e.error)}
+    return {"status": "success", "outputs": results}
+
+@mcp.tool(name="ask", description="""
+Answer a question end to end on the server: an agent loop (Cortex COMPLETE) picks
+and calls the read-only tools (DFWAnalyst, DFWSearch, analyze, weather, prompts ...)
+next to their backends and returns the final answer, so a multi-step answer costs
+one round trip.
+
+Each tool call is streamed while the loop runs as a progress notification plus an
+info log message. max_steps caps the number of tool calls (server limit applies).
+
+Args:
+    question (str): the user's question
+
+Returns the answer and the steps taken (tool, arguments, output).
+""")
+async def mcp_ask(question: str, ctx: Context, max_steps: int = ASK_MAX_STEPS) -> Dict:
+    import requests
+    max_steps = max(1, min(max_steps, ASK_MAX_STEPS))
+    tools = [ToolSpec(tool.name, tool.description or "", tool.inputSchema.get("properties", {}))
+             for tool in await mcp.list_tools() if tool.name in READ_ONLY_TOOLS]
+
+    HOST = "carelon-eda-preprod.privatelink.snowflakecomputing.com"
+    # Logs in on a worker thread through the snowflake-login breaker, which checks the deadline first
+    try:
+        conn = await connect_snowflake()
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        return {"status": "error", "error": f"Snowflake login unavailable: {e}"}
+    with tracing.span("snowflake.token"):
+        token = conn.rest.token
+
+    def send(messages):
+        resp = requests.post(
+            url=f"https://{HOST}/api/v2/cortex/inference:complete",
+            json={"model": ASK_MODEL, "messages": messages, "stream": True},
+            headers={
+                "Authorization": f'Snowflake Token="{token}"',
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+            },
+            timeout=deadlines.timeout(CORTEX_TIMEOUT),
+            stream=True,
+        )
+        resp.raise_for_status()
+        return completion_text(resp)
+
+    async def complete(messages):
+        return await cortex_complete.acall(send, messages)
+
+    async def on_step(step):
+        await ctx.report_progress(step["step"], max_steps)
+        await ctx.info(f"Step {step['step']}: {step['tool']} {json.dumps(step['arguments'], default=str)}")
+
+    try:
+        return await run_agent(question, tools, complete, mcp.call_tool_raw, on_step, max_steps)
+    except (requests.RequestException, CircuitOpen) as e:
+        return {"status": "error", "error": f"Cortex COMPLETE unavailable: {e}"}
+    finally:
+        conn.close()
+
 # --- MCP Prompts ---
-# HEDIS Application Prompts
-@mcp.prompt(name="hedis.explain-bcs", description="Explain the BCS HEDIS measure.")
-async def explain_bcs() -> str:
-    print("\n [HEDIS] BCS Prompt Called")
-    return "Explain the purpose of the BCS HEDIS measure."
-
-@mcp.prompt(name="hedis.list-2024", description="List HEDIS measures for 2024.")
-async def list_hedis_2024() -> str:
-    print("\n [HEDIS] 2024 List Prompt Called")
-    return "List all HEDIS measures for the year 2024."
-
-@mcp.prompt(name="hedis.cbp-age", description="Get age criteria for CBP measure.")
-async def cbp_age_criteria() -> str:
-    print("\n [HEDIS] CBP Age Criteria Prompt Called")
-    return "What is the age criteria for the CBP HEDIS measure?"
-
-# Contract Application Prompts
-@mcp.prompt(name="contract.summarize-h123", description="Summarize contract ID H123.")
-async def summarize_contract() -> str:
-    print("\n [CONTRACT] H123 Summary Prompt Called")
-    return "Summarize contract ID H123 for 2023."
-
-@mcp.prompt(name="contract.compare", description="Compare contracts H456 and H789.")
-async def compare_contracts() -> str:
-    print("\n [CONTRACT] Comparison Prompt Called")
-    return "Compare contracts H456 and H789 on key metrics."
-
-# Original MCP Prompts
-@mcp.prompt(name="mcp-prompt-calculator", description="Prompt template for calculator use case.")
-async def mcp_prompt_calculator() -> str:
-    return "You are a calculator assistant. Use the mcp-calculator tool to evaluate expressions."
-
-@mcp.prompt(name="mcp-prompt-json-analyzer", description="Prompt template for JSON analysis use case.")
-async def mcp_prompt_json_analyzer() -> str:
-    return "You are a data analyst. Use the mcp-json-analyzer tool to analyze JSON numeric data."
-
-@mcp.prompt(name="mcp-prompt-weather", description="Prompt template for weather lookup use case.")
-async def mcp_prompt_weather() -> str:
-    return "You are a weather assistant. Use the mcp-get-weather tool to get the forecast for a location."
-
-@mcp.prompt(name="mcp-prompt-send-email", description="Prompt template for email dispatch use case.")
-async def mcp_prompt_send_email() -> str:
-    return "You are an automated mail agent. Use the mcp-send-email tool to send messages."
+# Served from prompt_registry by DataFlyWheelMCP.list_prompts/get_prompt
 
 
 if __name__ == "__main__":
+    # Drain anything left queued by a previous run
+    email_outbox.start()
     mcp.run(transport="sse")
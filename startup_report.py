@@ -0,0 +1,106 @@
+"""
+Import-time report and startup budget check for the MCP servers.
+
+    python startup_report.py                      # report for smtp_server
+    python startup_report.py --budget 1.5         # also fail if startup is over 1.5s
+    python startup_report.py confulance --top 10
+
+Startup is the best wall time of `import <module>` over several fresh
+interpreters, i.e. everything the server does before it can serve a call.
+The check exits non-zero when that is over budget or when a backend library
+that should load on first use (DEFERRED_IMPORTS) was imported at startup, so
+it can gate CI and deploy pipelines.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+
+# --- Configurations ---
+STARTUP_BUDGET_SECONDS = float(os.environ.get("DFW_STARTUP_BUDGET_SECONDS", "1.5"))
+STARTUP_RUNS = int(os.environ.get("DFW_STARTUP_RUNS", "3"))
+# Heavy backend libraries that smtp_server imports inside the tools that use them
+DEFERRED_IMPORTS = ("fastapi", "requests", "snowflake", "ReduceReuseRecycleGENAI", "weather")
+
+_TIMER = "import time, {module}; print(time.perf_counter() - START)"
+
+
+class ImportFailed(Exception):
+    """Importing the module failed; carries the interpreter's stderr."""
+
+    def __init__(self, module: str, stderr: str):
+        super().__init__(f"import {module} failed")
+        self.module = module
+        self.stderr = stderr
+
+
+def _run(module: str, args: List[str]) -> subprocess.CompletedProcess:
+    try:
+        return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise ImportFailed(module, e.stderr) from None
+
+
+def startup_seconds(module: str, runs: int = STARTUP_RUNS) -> float:
+    """Best wall time of importing module in a fresh interpreter."""
+    best = float("inf")
+    for _ in range(runs):
+        code = "import time; START = time.perf_counter(); " + _TIMER.format(module=module)
+        out = _run(module, ["-c", code]).stdout
+        best = min(best, float(out.strip().splitlines()[-1]))
+    return best
+
+
+def import_times(module: str) -> List[Tuple[int, int, str]]:
+    """(cumulative_us, self_us, module) for every module loaded by importing module, from -X importtime."""
+    result = _run(module, ["-X", "importtime", "-c", f"import {module}"])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+
+def deferred_violations(rows: List[Tuple[int, int, str]]) -> List[str]:
+    return sorted({name for _, _, name in rows if name.split(".")[0] in DEFERRED_IMPORTS})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time report and startup budget check")
+    parser.add_argument("module", nargs="?", default="smtp_server")
+    parser.add_argument("--top", type=int, default=20, help="modules to list, by cumulative import time")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="startup budget in seconds")
+    parser.add_argument("--runs", type=int, default=STARTUP_RUNS)
+    args = parser.parse_args(argv)
+
+    try:
+        rows = import_times(args.module)
+        seconds = startup_seconds(args.module, args.runs)
+    except ImportFailed as e:
+        # -X importtime interleaves its rows with the traceback; keep only the error
+        error = "\n".join(line for line in e.stderr.splitlines() if not line.startswith("import time:"))
+        print(f"FAIL: {e}\n{error.strip()}")
+        return 1
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+    print(f"\nStartup (import {args.module}, best of {args.runs}): {seconds:.3f}s, budget {args.budget:.3f}s")
+    failed = False
+    if seconds > args.budget:
+        print(f"FAIL: startup is {seconds - args.budget:.3f}s over budget")
+        failed = True
+    violations = deferred_violations(rows) if args.module == "smtp_server" else []
+    if violations:
+        print(f"FAIL: imported at startup instead of on first use: {', '.join(violations)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("loguru")
+
+from admission import AdmissionController, CostClass, Overloaded  # noqa: E402
+
+
+def controller(slots=1, max_wait=1.0, max_queue=8):
+    return AdmissionController({"heavy": CostClass("heavy", slots=slots, max_wait=max_wait, max_queue=max_queue)})
+
+
+def test_running_calls_never_exceed_the_slots():
+    admission = controller(slots=2)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with admission.admit("heavy", "client"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*[call() for _ in range(6)])
+
+    asyncio.run(main())
+    assert peak == 2
+    assert admission.stats()["heavy"]["admitted"] == 6
+
+
+def test_full_queue_sheds_new_calls():
+    admission = controller(slots=1, max_queue=1)
+
+    async def hold(release):
+        async with admission.admit("heavy", "a"):
+            await release.wait()
+
+    async def main():
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(release))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(hold(release))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded, match="already queued"):
+            async with admission.admit("heavy", "b"):
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+
+    asyncio.run(main())
+    assert admission.stats()["heavy"]["shed"] == 1
+
+
+def test_waiting_past_max_wait_is_rejected():
+    admission = controller(slots=1, max_wait=0.02)
+
+    async def main():
+        async with admission.admit("heavy", "a"):
+            with pytest.raises(Overloaded, match="waited"):
+                async with admission.admit("heavy", "b", "DFWAnalyst"):
+                    pass
+
+    asyncio.run(main())
+    stats = admission.stats()["heavy"]
+    assert stats["timed_out"] == 1
+    assert stats["running"] == 0 and stats["queued"] == 0
+
+
+def test_client_with_fewer_running_calls_goes_first():
+    admission = controller(slots=2)
+    order = []
+
+    async def call(client, release):
+        async with admission.admit("heavy", client):
+            order.append(client)
+            await release.wait()
+
+    async def main():
+        release = asyncio.Event()
+        # Client "a" holds both slots, then queues another call before "b" arrives
+        tasks = [asyncio.ensure_future(call("a", release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(call("b", release)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "a", "b", "a"]
@@ -0,0 +1,65 @@
+import json
+import math
+from array import array
+
+import pytest
+
+from analytics import AnalysisError, ColumnStats, compute, grouped_aggregate, rolling_aggregate
+
+NAN = math.nan
+
+
+@pytest.mark.parametrize("operation, expected", [
+    ("mean", [None, 1.5, 2.0, 4.0, 4.5, 5.5, 6.5]),
+    ("median", [None, 1.5, 2.0, 4.0, 4.5, 5.5, 6.5]),
+    ("sum", [None, 3.0, 2.0, 4.0, 9.0, 11.0, 13.0]),
+    ("min", [None, 1.0, 2.0, 4.0, 4.0, 5.0, 6.0]),
+    ("max", [None, 2.0, 2.0, 4.0, 5.0, 6.0, 7.0]),
+])
+def test_rolling_skips_missing_values(operation, expected):
+    result = rolling_aggregate([{"x": array("d", [1, 2, NAN, 4, 5, 6, 7])}], operation, 2)
+    assert result == {"x": expected}
+
+
+def test_rolling_window_of_only_missing_values_is_none():
+    result = rolling_aggregate([{"x": array("d", [NAN, NAN, 1, NAN, NAN])}], "mean", 2)
+    assert result == {"x": [None, None, 1.0, 1.0, None]}
+    # The tool result must stay valid JSON (no NaN literals)
+    json.dumps(result, allow_nan=False)
+
+
+def test_rolling_missing_values_across_chunks():
+    chunks = [{"x": array("d", [1, NAN])}, {"x": array("d", [3, NAN, 5])}]
+    assert rolling_aggregate(chunks, "median", 3) == {"x": [None, None, 2.0, 3.0, 4.0]}
+
+
+def test_group_by_unknown_column_is_an_error():
+    chunk = {"region": ["east", "west"], "sales": array("d", [1, 2])}
+    with pytest.raises(AnalysisError, match="regoin"):
+        grouped_aggregate([chunk], "sum", group_by=["regoin"])
+
+
+def test_resample_unknown_time_column_is_an_error():
+    chunk = {"ts": ["2024-01-01", "2024-01-02"], "sales": array("d", [1, 2])}
+    with pytest.raises(AnalysisError, match="when"):
+        grouped_aggregate([chunk], "sum", time_column="when", resample="day")
+
+
+def test_group_by_known_column():
+    chunk = {"region": ["east", "west", "east"], "sales": array("d", [1, 2, 3])}
+    assert grouped_aggregate([chunk], "sum", group_by=["region"]) == [
+        {"region": "east", "sales": 4.0}, {"region": "west", "sales": 2.0}]
+
+
+def test_opposite_infinities_do_not_raise():
+    stats = ColumnStats(keep_values=True)
+    stats.update(array("d", [-math.inf, math.inf, 1.0]))
+    assert stats.count == 3
+    assert math.isnan(stats.result("sum"))
+    assert stats.result("min") == -math.inf
+    assert stats.result("median") == 1.0
+
+
+def test_sum_past_float_range_is_infinite():
+    assert compute([1e308, 1e308], "sum") == math.inf
+    assert compute([math.inf, 1.0], "max") == math.inf
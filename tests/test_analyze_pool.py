@@ -0,0 +1,34 @@
+import asyncio
+import statistics
+
+import analyze_pool
+
+
+def test_wide_input_gets_one_shard_per_column(monkeypatch):
+    monkeypatch.setattr(analyze_pool, "PARALLEL_MIN_COLUMNS", 3)
+    monkeypatch.setattr(analyze_pool, "PARALLEL_WORKERS", 2)
+    lengths = {"a": 10, "b": 1000, "c": 5}
+    assert analyze_pool._plan(lengths) == [("a", 0, 10), ("b", 10, 1010), ("c", 1010, 1015)]
+
+
+def test_long_columns_are_cut_into_row_ranges(monkeypatch):
+    monkeypatch.setattr(analyze_pool, "PARALLEL_MIN_COLUMNS", 3)
+    monkeypatch.setattr(analyze_pool, "PARALLEL_WORKERS", 2)
+    shards = analyze_pool._plan({"a": 1000, "b": 10})
+    assert [shard for shard in shards if shard[0] == "b"] == [("b", 1000, 1010)]
+    a = [(start, stop) for name, start, stop in shards if name == "a"]
+    assert len(a) > 1
+    assert a[0][0] == 0 and a[-1][1] == 1000
+    assert all(stop == start for (_, stop), (start, _) in zip(a, a[1:]))
+
+
+def test_parallel_median_matches_inline(monkeypatch):
+    monkeypatch.setattr(analyze_pool, "PARALLEL_WORKERS", 2)
+    columns = {"x": [(i * 7919) % 1001 for i in range(5001)], "y": [3, 1, 2, 4]}
+    try:
+        result = asyncio.run(analyze_pool.analyze_parallel(columns, "median"))
+    finally:
+        if analyze_pool._pool is not None:
+            analyze_pool._pool.shutdown()
+            analyze_pool._pool = None
+    assert result == {"x": statistics.median(columns["x"]), "y": 2.5}
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("loguru")
+
+from cache_tiers import CACHES, TieredCache, cached, is_error_result  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # @cached opens its disk tier in the working directory
+    monkeypatch.chdir(tmp_path)
+    yield
+    CACHES.clear()
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = TieredCache("tool", 1 << 20, path=path, redis_url="")
+    writer.set("k", ({"v": 1}, time.time() + 60, time.time() + 60))
+
+    reader = TieredCache("tool", 1 << 20, path=path, redis_url="")
+    assert reader.get("k")[0] == {"v": 1}
+    assert reader.hits == [0, 1]
+    assert reader.get("k")[0] == {"v": 1}
+    assert reader.hits == [1, 1]
+
+
+def test_namespaces_are_separate(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TieredCache("a", 1 << 20, path=path, redis_url="").set("k", (1, time.time() + 60, time.time() + 60))
+    assert TieredCache("b", 1 << 20, path=path, redis_url="").get("k") is None
+
+
+def test_fresh_results_are_served_from_the_cache():
+    calls = []
+
+    @cached(ttl=60)
+    async def lookup(city: str):
+        calls.append(city)
+        return {"status": "success", "city": city}
+
+    async def main():
+        return [await lookup("Austin"), await lookup(city="Austin"), await lookup("Boston")]
+
+    results = asyncio.run(main())
+    assert calls == ["Austin", "Boston"]
+    assert results[0] == results[1]
+
+
+def test_error_results_are_not_cached():
+    calls = []
+
+    @cached(ttl=60)
+    async def lookup(city: str):
+        calls.append(city)
+        return {"status": "error", "error": "backend down"}
+
+    async def main():
+        await lookup("Austin")
+        await lookup("Austin")
+
+    asyncio.run(main())
+    assert calls == ["Austin", "Austin"]
+
+
+def test_stale_result_is_served_while_refreshing():
+    calls = []
+
+    @cached(ttl=0.2, stale_while_revalidate=60)
+    async def lookup(city: str):
+        calls.append(city)
+        return len(calls)
+
+    async def main():
+        first = await lookup("Austin")
+        await asyncio.sleep(0.25)
+        stale = await lookup("Austin")
+        await asyncio.sleep(0.02)
+        return first, stale, await lookup("Austin")
+
+    assert asyncio.run(main()) == (1, 1, 2)
+    assert lookup.cache.stale == 1
+
+
+@pytest.mark.parametrize("result, expected", [
+    ({"status": "error", "error": "down"}, True),
+    ({"error": "Unknown trace"}, True),
+    ({"status": "success", "error": None}, False),
+    ({"status": "success"}, False),
+    ("Error: division by zero", True),
+    (" Error: division by zero", True),
+    (" Result: 2", False),
+    ([{"status": "error"}], False),
+    (None, False),
+])
+def test_is_error_result(result, expected):
+    assert is_error_result(result) is expected
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import deadlines
+from deadlines import DeadlineExceeded
+
+
+def test_outside_a_call_nothing_is_limited():
+    deadlines.check()
+    assert deadlines.remaining() is None
+    assert deadlines.timeout(30) == 30
+    assert deadlines.poll_timeout() is None
+
+
+def test_timeouts_are_shortened_to_the_time_left():
+    with deadlines.call_scope(1.0):
+        assert deadlines.timeout(30) <= 1.0
+        assert deadlines.timeout(0.5) == 0.5
+        assert deadlines.poll_timeout() <= deadlines.POLL_SECONDS
+
+
+def test_expired_call_raises_at_the_next_checkpoint():
+    with deadlines.call_scope(0.01, "get_weather"):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded, match="get_weather exceeded"):
+            deadlines.check()
+
+
+def test_scope_is_cancelled_when_the_call_ends():
+    with deadlines.call_scope(60) as scope:
+        pass
+    assert scope.cancelled.is_set()
+    assert deadlines.current_scope.get() is None
+
+
+def test_submit_carries_the_scope_into_worker_threads():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with deadlines.call_scope(60) as scope:
+            assert deadlines.submit(executor, deadlines.current_scope.get).result() is scope
+            scope.cancel()
+            with pytest.raises(DeadlineExceeded, match="cancelled"):
+                deadlines.submit(executor, deadlines.check).result()
+
+
+def test_run_in_executor_and_to_thread_carry_the_scope():
+    async def main():
+        with deadlines.call_scope(60) as scope:
+            in_executor = await deadlines.run_in_executor(None, deadlines.current_scope.get)
+            in_thread = await asyncio.to_thread(deadlines.current_scope.get)
+            return scope, in_executor, in_thread
+
+    scope, in_executor, in_thread = asyncio.run(main())
+    assert in_executor is scope
+    assert in_thread is scope
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("loguru")
+
+from frequent_questions import FrequentQuestions, SpaceSaving, normalize_question  # noqa: E402
+
+
+def test_normalize_question():
+    assert normalize_question("  What is  BCS?? ") == "what is bcs"
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(capacity=3)
+    for _ in range(50):
+        sketch.add("hot")
+    for i in range(100):
+        sketch.add(f"rare-{i}")
+    assert len(sketch.counts) == 3
+    assert sketch.count("hot") == 50
+    # An admitted key inherits the evicted minimum as its error bound
+    assert all(count >= error for count, error in sketch.counts.values())
+
+
+def test_questions_are_deduplicated_and_ranked(tmp_path):
+    faq = FrequentQuestions(str(tmp_path / "faq.db"), rerank_seconds=3600)
+    assert faq.add("hedis", ["What is BCS?", "what is bcs", "Explain CBP"]) == (2, 1)
+    for _ in range(3):
+        faq.record("Explain CBP?")
+    faq.flush()
+    assert [item["prompt"] for item in faq.questions_for("hedis")] == ["Explain CBP", "What is BCS?"]
+    assert faq.top() == [{"user_context": "hedis", "prompt": "Explain CBP", "uses": 3}]
+
+
+def test_workers_sharing_a_database_merge_counts(tmp_path):
+    path = str(tmp_path / "faq.db")
+    first = FrequentQuestions(path, rerank_seconds=3600)
+    second = FrequentQuestions(path, rerank_seconds=3600)
+    first.add("hedis", ["Explain CBP", "What is BCS?"])
+    for _ in range(5):
+        first.record("Explain CBP")
+    second.record("What is BCS?")
+    first.flush()
+    second.flush()
+    restarted = FrequentQuestions(path, rerank_seconds=3600)
+    assert [(item["prompt"], item["uses"]) for item in restarted.questions_for("hedis")] == [
+        ("Explain CBP", 5), ("What is BCS?", 1)]
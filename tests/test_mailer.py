@@ -0,0 +1,87 @@
+import smtplib
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("loguru")
+
+from mailer import MailTemplate, SMTPPool  # noqa: E402
+
+
+class FakeSMTP:
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.messages = []
+        self.drop_next = False
+
+    def sendmail(self, sender, recipients, message):
+        with FakeSMTP.lock:
+            FakeSMTP.active += 1
+            FakeSMTP.peak = max(FakeSMTP.peak, FakeSMTP.active)
+        try:
+            if self.drop_next:
+                self.drop_next = False
+                raise smtplib.SMTPServerDisconnected("dropped")
+            time.sleep(0.02)
+            self.messages.append(message)
+        finally:
+            with FakeSMTP.lock:
+                FakeSMTP.active -= 1
+
+    def noop(self):
+        return 250, b"ok"
+
+    def quit(self):
+        pass
+
+
+def test_sessions_are_reused():
+    pool = SMTPPool(FakeSMTP, max_connections=2)
+    for _ in range(3):
+        pool.deliver("a@example.com", ["b@example.com"], "hello")
+    assert pool.stats()["opened"] == 1
+    assert pool.stats()["reused"] == 2
+
+
+def test_dropped_session_is_replaced():
+    sessions = []
+
+    def connect():
+        sessions.append(FakeSMTP())
+        sessions[-1].drop_next = len(sessions) == 1
+        return sessions[-1]
+
+    pool = SMTPPool(connect)
+    pool.deliver("a@example.com", ["b@example.com"], "hello")
+    assert len(sessions) == 2
+    assert sessions[1].messages == ["hello"]
+
+
+def test_deliver_never_exceeds_max_connections():
+    FakeSMTP.peak = 0
+    pool = SMTPPool(FakeSMTP, max_connections=2)
+    # Direct callers (e.g. outbox workers) bypass the pool's executor
+    threads = [threading.Thread(target=pool.deliver, args=("a@example.com", ["b@example.com"], "hello"))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert FakeSMTP.peak == 2
+    assert pool.stats()["opened"] <= 2
+
+
+def test_template_escapes_body_values_only():
+    template = MailTemplate("a@example.com", "Hi $name", "<p>$name owes $$5</p>")
+    message = template.render("b@example.com", {"name": "<Bob>"})
+    assert "Subject: Hi <Bob>" in message
+    assert "&lt;Bob&gt; owes $5" in message
+
+
+def test_template_rejects_malformed_placeholders():
+    with pytest.raises(ValueError, match="line 1, column 4"):
+        MailTemplate("a@example.com", "Hi", "<p>$5</p>")
@@ -0,0 +1,140 @@
+import smtplib
+import time
+
+import pytest
+
+pytest.importorskip("loguru")
+
+from outbox import Outbox  # noqa: E402
+
+
+class FakePool:
+    relay = "default"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    def deliver(self, sender, recipients, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((sender, recipients, message))
+
+
+def make_outbox(tmp_path, pool, **kwargs):
+    outbox = Outbox(str(tmp_path / "outbox.db"), **kwargs)
+    outbox.register(pool)
+    # Deliveries are driven by hand through _claim/_finish; no worker threads
+    outbox.started = True
+    return outbox
+
+
+def deliver_next(outbox, pool):
+    row = outbox._claim(pool.relay)
+    if row is None:
+        return None
+    try:
+        pool.deliver(row["sender"], [], row["message"])
+        error = None
+    except Exception as e:
+        error = e
+    outbox._finish(row, error)
+    return row["id"]
+
+
+def make_due(outbox, message_id):
+    with outbox._db() as db:
+        db.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (message_id,))
+
+
+def test_transient_failure_is_retried_with_backoff(tmp_path):
+    pool = FakePool([smtplib.SMTPServerDisconnected("dropped")])
+    outbox = make_outbox(tmp_path, pool)
+    message_id = outbox.enqueue("default", "a@example.com", ["b@example.com"], "hello")
+
+    assert deliver_next(outbox, pool) == message_id
+    status = outbox.status(message_id)
+    assert status["status"] == "queued"
+    assert status["attempts"] == 1
+    assert status["next_attempt_at"] > time.time()
+    # Not due yet
+    assert deliver_next(outbox, pool) is None
+
+    make_due(outbox, message_id)
+    assert deliver_next(outbox, pool) == message_id
+    assert outbox.status(message_id)["status"] == "sent"
+    assert outbox.status(message_id)["attempts"] == 2
+
+
+def test_sent_message_is_delivered_once(tmp_path):
+    pool = FakePool()
+    outbox = make_outbox(tmp_path, pool)
+    outbox.enqueue("default", "a@example.com", ["b@example.com"], "hello")
+    assert deliver_next(outbox, pool) is not None
+    assert deliver_next(outbox, pool) is None
+    assert len(pool.sent) == 1
+
+
+def test_permanent_rejection_fails_without_retry(tmp_path):
+    pool = FakePool([smtplib.SMTPRecipientsRefused({"b@example.com": (550, b"no such user")})])
+    outbox = make_outbox(tmp_path, pool)
+    message_id = outbox.enqueue("default", "a@example.com", ["b@example.com"], "hello")
+    deliver_next(outbox, pool)
+    status = outbox.status(message_id)
+    assert status["status"] == "failed"
+    assert status["attempts"] == 1
+    assert "no such user" in status["last_error"]
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    pool = FakePool([smtplib.SMTPResponseException(451, b"try later")] * 2)
+    outbox = make_outbox(tmp_path, pool, max_attempts=2)
+    message_id = outbox.enqueue("default", "a@example.com", ["b@example.com"], "hello")
+    deliver_next(outbox, pool)
+    make_due(outbox, message_id)
+    deliver_next(outbox, pool)
+    assert outbox.status(message_id)["status"] == "failed"
+    assert pool.sent == []
+
+
+def test_claim_is_a_lease(tmp_path):
+    pool = FakePool()
+    outbox = make_outbox(tmp_path, pool, lease=3600)
+    message_id = outbox.enqueue("default", "a@example.com", ["b@example.com"], "hello")
+    assert outbox._claim("default")["id"] == message_id
+    # A live claim is not handed out twice...
+    assert outbox._claim("default") is None
+    # ...but one whose worker died is, once the lease has expired
+    outbox.lease = 0
+    assert outbox._claim("default")["id"] == message_id
+
+
+def test_digest_items_coalesce_into_one_message(tmp_path):
+    pool = FakePool()
+    outbox = make_outbox(tmp_path, pool)
+    first = outbox.add_digest("default", "a@example.com", "b@example.com", "alerts", "One", "<p>1</p>")
+    second = outbox.add_digest("default", "a@example.com", "b@example.com", "alerts", "Two", "<p>2</p>")
+    assert first["message_id"] == second["message_id"]
+    assert outbox.status(first["message_id"])["items"] == 2
+
+    assert outbox.flush_digests(now=first["flush_at"]) == 1
+    assert outbox.status(first["message_id"])["status"] == "queued"
+    make_due(outbox, first["message_id"])
+    deliver_next(outbox, pool)
+    assert len(pool.sent) == 1
+    assert "[alerts] 2 updates" in pool.sent[0][2]
+
+
+def test_workers_deliver_in_the_background(tmp_path):
+    pool = FakePool()
+    outbox = Outbox(str(tmp_path / "outbox.db"), workers=1)
+    outbox.register(pool)
+    try:
+        message_id = outbox.enqueue("default", "a@example.com", ["b@example.com"], "hello")
+        deadline = time.monotonic() + 5
+        while outbox.status(message_id)["status"] != "sent" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert outbox.status(message_id)["status"] == "sent"
+        assert pool.sent == [("a@example.com", ["b@example.com"], "hello")]
+    finally:
+        outbox.stop()
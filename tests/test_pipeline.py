@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline import PipelineError, StepFailed, plan, resolve, run_pipeline
+
+TOOLS = {"echo", "fail", "error_result"}
+
+
+def run(steps, outputs=None, calls=None, is_error=None):
+    calls = [] if calls is None else calls
+
+    async def call(tool, arguments):
+        calls.append((tool, arguments))
+        if tool == "fail":
+            raise RuntimeError("kaput")
+        if tool == "error_result":
+            return {"status": "error", "error": "no data"}
+        await asyncio.sleep(arguments.get("delay", 0))
+        return arguments.get("value")
+
+    return asyncio.run(run_pipeline(steps, call, TOOLS, outputs, is_error=is_error))
+
+
+def is_error(result):
+    return isinstance(result, dict) and result.get("status") == "error"
+
+
+def test_references_are_resolved_into_dependent_steps():
+    steps = [
+        {"id": "a", "tool": "echo", "arguments": {"value": {"rows": [{"code": "X1"}, {"code": "X2"}]}}},
+        {"id": "b", "tool": "echo", "arguments": {"value": {"$ref": "a.rows.-1.code"}}},
+    ]
+    assert run(steps) == {"b": "X2"}
+
+
+def test_json_text_outputs_can_be_navigated():
+    steps = [
+        {"id": "a", "tool": "echo", "arguments": {"value": '{"results": [{"chunk": "spec"}]}'}},
+        {"id": "b", "tool": "echo", "arguments": {"value": {"$ref": "a.results.0.chunk"}}},
+    ]
+    assert run(steps) == {"b": "spec"}
+
+
+def test_independent_branches_run_concurrently():
+    steps = [{"id": name, "tool": "echo", "arguments": {"value": name, "delay": 0.2}} for name in "abc"]
+    started = time.perf_counter()
+    assert run(steps) == {"a": "a", "b": "b", "c": "c"}
+    assert time.perf_counter() - started < 0.5
+
+
+def test_raising_step_fails_and_skips_its_dependants():
+    calls = []
+    steps = [
+        {"id": "a", "tool": "fail", "arguments": {}},
+        {"id": "b", "tool": "echo", "arguments": {"value": {"$ref": "a"}}},
+    ]
+    with pytest.raises(StepFailed) as info:
+        run(steps, calls=calls)
+    assert info.value.step == "a"
+    assert [tool for tool, _ in calls] == ["fail"]
+
+
+def test_error_result_fails_the_step_and_is_not_passed_on():
+    calls = []
+    steps = [
+        {"id": "spec", "tool": "error_result", "arguments": {}},
+        {"id": "mail", "tool": "echo", "arguments": {"value": {"$ref": "spec"}}},
+    ]
+    with pytest.raises(StepFailed) as info:
+        run(steps, calls=calls, is_error=is_error)
+    assert info.value.step == "spec"
+    assert str(info.value.error) == "no data"
+    assert [tool for tool, _ in calls] == ["error_result"]
+
+
+def test_references_cannot_walk_object_attributes():
+    class Result:
+        secret = "x"
+
+    with pytest.raises(PipelineError):
+        resolve({"$ref": "a.__class__"}, {"a": Result()})
+    with pytest.raises(PipelineError):
+        resolve({"$ref": "a.secret"}, {"a": Result()})
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([], "at least one step"),
+    ([{"id": "a", "tool": "echo", "arguments": {}}, {"id": "a", "tool": "echo", "arguments": {}}], "Duplicate"),
+    ([{"id": "a", "tool": "nope", "arguments": {}}], "unknown tool"),
+    ([{"id": "a", "tool": "echo", "arguments": {"v": {"$ref": "z"}}}], "unknown step"),
+    ([{"id": "a", "tool": "echo", "arguments": {"v": {"$ref": "b"}}},
+      {"id": "b", "tool": "echo", "arguments": {"v": {"$ref": "a"}}}], "cycle"),
+])
+def test_invalid_pipelines_are_rejected(steps, message):
+    with pytest.raises(PipelineError, match=message):
+        plan(steps, TOOLS)
@@ -0,0 +1,106 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("loguru")
+
+from deadlines import DeadlineExceeded  # noqa: E402
+from resilience import BACKENDS, Backend, CircuitBreaker, CircuitOpen  # noqa: E402
+
+
+def fail(breaker, error=ConnectionError("down")):
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("nws", failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        fail(breaker)
+    assert breaker.state == "closed"
+    fail(breaker)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen, match="circuit open"):
+        breaker.before()
+    assert breaker.rejected == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("nws", failure_threshold=2, reset_timeout=60)
+    fail(breaker)
+    with breaker.guard():
+        pass
+    fail(breaker)
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_success_closes():
+    breaker = CircuitBreaker("nws", failure_threshold=1, reset_timeout=0.01)
+    fail(breaker)
+    time.sleep(0.02)
+    with breaker.guard():
+        assert breaker.state == "half_open"
+        # Only half_open_max trials at a time
+        with pytest.raises(CircuitOpen, match="half-open"):
+            breaker.before()
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = CircuitBreaker("nws", failure_threshold=1, reset_timeout=0.01)
+    fail(breaker)
+    time.sleep(0.02)
+    fail(breaker)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        breaker.before()
+
+
+def test_inconclusive_trial_gives_its_slot_back():
+    breaker = CircuitBreaker("nws", failure_threshold=1, reset_timeout=0.01)
+    fail(breaker)
+    time.sleep(0.02)
+    fail(breaker, DeadlineExceeded("deadline"))
+    assert breaker.state == "half_open"
+    assert breaker.trials == 0
+    with breaker.guard():
+        pass
+    assert breaker.state == "closed"
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    requests = pytest.importorskip("requests")
+    response = requests.Response()
+    response.status_code = 404
+    breaker = CircuitBreaker("nws", failure_threshold=1, reset_timeout=60)
+    fail(breaker, requests.exceptions.HTTPError(response=response))
+    assert breaker.state == "closed"
+    response.status_code = 503
+    fail(breaker, requests.exceptions.HTTPError(response=response))
+    assert breaker.state == "open"
+
+
+def test_hedged_call_returns_the_first_success():
+    backend = Backend("test-hedged", hedge=True, min_hedge_delay=0.01)
+    for _ in range(20):
+        backend.latency.add(0.01)
+    attempts = itertools.count()
+    release = threading.Event()
+
+    def fetch():
+        if next(attempts) == 0:
+            release.wait(2)
+            return "slow"
+        return "fast"
+
+    try:
+        assert backend.call(fetch) == "fast"
+    finally:
+        release.set()
+        BACKENDS.pop(backend.name)
+    assert backend.hedges == 1
+    assert backend.hedge_wins == 1
+    assert backend.breaker.state == "closed"
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight, call_key
+
+
+def test_call_key_ignores_argument_order():
+    assert call_key("get_weather", {"a": 1, "b": 2}) == call_key("get_weather", {"b": 2, "a": 1})
+    assert call_key("get_weather", {"a": 1}) != call_key("get_weather", {"a": 2})
+    assert call_key("get_weather", {"a": 1}) != call_key("get_alerts", {"a": 1})
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def main():
+        return await asyncio.gather(*[flights.do("k", work) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"in_flight": 0, "executed": 1, "shared": 4, "abandoned": 0}
+
+
+def test_exception_reaches_every_caller():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("backend down")
+
+    async def main():
+        return await asyncio.gather(*[flights.do("k", work) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_nothing_is_cached_after_the_call_finishes():
+    flights = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        return len(runs)
+
+    async def main():
+        return [await flights.do("k", work), await flights.do("k", work)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("k", work))
+        second = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert flights.abandoned == 0
+
+
+def test_execution_is_cancelled_when_every_caller_leaves():
+    flights = SingleFlight()
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def main():
+        caller = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.08)
+
+    asyncio.run(main())
+    assert finished == []
+    assert flights.abandoned == 1
+    assert flights.stats()["in_flight"] == 0
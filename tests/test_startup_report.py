@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import startup_report
+
+
+def test_startup_seconds_times_an_import():
+    seconds = startup_report.startup_seconds("json", runs=1)
+    assert 0 < seconds < 10
+
+
+def test_import_times_lists_the_imported_modules():
+    rows = startup_report.import_times("json")
+    assert "json" in [name for _, _, name in rows]
+    assert all(cumulative >= own >= 0 for cumulative, own, _ in rows)
+
+
+def test_deferred_violations_names_backend_imports():
+    rows = [(900, 10, "requests"), (500, 5, "requests.adapters"), (300, 3, "snowflake.connector"),
+            (100, 1, "json"), (50, 1, "weatherly")]
+    assert startup_report.deferred_violations(rows) == ["requests", "requests.adapters", "snowflake.connector"]
+    assert startup_report.deferred_violations([(100, 1, "json")]) == []
+
+
+def test_failed_import_is_reported(capsys):
+    assert startup_report.main(["no_such_module_xyz", "--runs", "1"]) == 1
+    out = capsys.readouterr().out
+    assert out.startswith("FAIL: import no_such_module_xyz failed")
+    assert "ModuleNotFoundError" in out
+
+
+def test_smtp_server_starts_within_budget(monkeypatch):
+    for name in ("mcp", "loguru", "pydantic"):
+        pytest.importorskip(name)
+    # The timing interpreters import the server from the working directory
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        seconds = startup_report.startup_seconds("smtp_server")
+    except startup_report.ImportFailed as e:
+        pytest.skip(f"smtp_server does not import here: {e.stderr.strip().splitlines()[-1]}")
+    assert seconds <= startup_report.STARTUP_BUDGET_SECONDS
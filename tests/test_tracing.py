@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("loguru")
+
+import tracing  # noqa: E402
+
+
+def _trace(trace_id, name="tool"):
+    trace = tracing.Trace(trace_id)
+    trace.root = tracing.Span(trace, name, None, tracing.SERVER, {})
+    trace.root.end_ns = trace.root.start_ns + 1000
+    trace.spans.append(trace.root)
+    return trace
+
+
+def test_recent_traces_are_bounded_in_total():
+    store = tracing.TraceStore(keep_slowest=0, keep_recent=5)
+    for i in range(3):
+        store.add(_trace("a" * 32))
+    for i in range(4):
+        store.add(_trace("b" * 32))
+    assert sum(len(traces) for traces in store.recent.values()) == 5
+    # The oldest traces of the least recently active trace_id go first
+    assert len(store.get("a" * 32)) == 1
+    assert len(store.get("b" * 32)) == 4
+
+
+def test_a_continued_trace_cannot_exceed_the_bound():
+    store = tracing.TraceStore(keep_slowest=0, keep_recent=3)
+    traces = [_trace("c" * 32) for _ in range(10)]
+    for trace in traces:
+        store.add(trace)
+    assert store.get("c" * 32) == traces[-3:]
+
+
+def test_child_spans_join_the_root_trace(monkeypatch):
+    monkeypatch.setattr(tracing, "store", tracing.TraceStore())
+    monkeypatch.setattr(tracing, "exporter", None)
+    with tracing.root_span("tool-call") as root:
+        with tracing.span("backend", tracing.CLIENT) as child:
+            assert child.parent_id == root.span_id
+    assert [span.name for span in root.trace.spans] == ["backend", "tool-call"]
+    assert tracing.store.get(root.trace.trace_id) == [root.trace]
+
+
+def test_span_outside_a_trace_is_a_no_op():
+    with tracing.span("background") as span:
+        assert span is None
+
+
+def test_traceparent_is_continued():
+    class Meta:
+        traceparent = "00-" + "ab" * 16 + "-" + "cd" * 8 + "-01"
+    assert tracing.trace_context(Meta()) == ("ab" * 16, "cd" * 8)
+    assert tracing.trace_context(None) == (None, None)
@@ -0,0 +1,98 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("requests")
+
+import weather  # noqa: E402
+
+
+class Response:
+    def __init__(self, status_code, body, headers):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        pass
+
+
+POINT = {"properties": {"forecast": "https://nws/gridpoints/BOU/1,2/forecast", "gridId": "BOU", "gridX": 1,
+                        "gridY": 2, "relativeLocation": {"properties": {"city": "Boulder", "state": "CO"}}}}
+FORECAST = {"properties": {"periods": [{"name": "Tonight", "shortForecast": "Snow"}]}}
+
+
+class FakeSession:
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append((url, dict(headers or {})))
+        if "/points/" in url:
+            return Response(200, POINT, {})
+        cache = {"Cache-Control": f"max-age={self.max_age}"}
+        if headers and headers.get("If-Modified-Since"):
+            return Response(304, None, cache)
+        return Response(200, FORECAST, dict(cache, **{"Last-Modified": "Mon, 19 Oct 2026 10:00:00 GMT"}))
+
+
+def test_cache_lifetime_from_max_age_less_age():
+    assert weather.cache_lifetime({"Cache-Control": "public, max-age=300", "Age": "100"}, time.time()) == 200
+
+
+def test_cache_lifetime_from_expires():
+    now = time.time()
+    lifetime = weather.cache_lifetime({"Expires": formatdate(now + 120, usegmt=True)}, now)
+    assert 118 <= lifetime <= 120
+
+
+@pytest.mark.parametrize("headers", [{"Cache-Control": "no-cache, max-age=300"}, {"Expires": "garbage"}, {}])
+def test_uncacheable_responses(headers):
+    assert weather.cache_lifetime(headers, time.time()) == 0
+
+
+def make_client(max_age):
+    client = weather.NWSClient("https://nws")
+    client.session = FakeSession(max_age)
+    return client
+
+
+def test_fresh_forecast_and_gridpoint_are_served_from_cache():
+    client = make_client(max_age=60)
+    point, forecast = client.forecast(40.01501, -105.27)
+    assert point["city"] == "Boulder" and forecast == FORECAST
+    client.forecast(40.01501, -105.27)
+    # Rounded coordinates share the gridpoint entry
+    client.forecast(40.015012, -105.270004)
+    assert len(client.session.calls) == 2
+    assert client.upstream_requests == 2
+
+
+def test_expired_forecast_is_revalidated():
+    client = make_client(max_age=0)
+    client.forecast(40.0, -105.0)
+    _, forecast = client.forecast(40.0, -105.0)
+    url, headers = client.session.calls[-1]
+    assert url.endswith("/forecast")
+    assert headers["If-Modified-Since"] == "Mon, 19 Oct 2026 10:00:00 GMT"
+    # 304: the cached document is reused
+    assert forecast == FORECAST
+    # The gridpoint is never fetched again
+    assert sum("/points/" in url for url, _ in client.session.calls) == 1
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("snow likely after midnight", True),
+    ("little or no snow accumulation", False),
+    ("chance of rain. little or no snow accumulation", False),
+    ("no snow expected. snow showers after 3pm", True),
+    ("sunny", False),
+])
+def test_snow_mentions(text, expected):
+    assert weather.mentions(text, weather.SNOW_PATTERN) is expected
@@ -0,0 +1,280 @@
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+# --- Configurations ---
+# OTLP/JSON export, one ExportTraceServiceRequest per line per finished trace; empty disables the file
+TRACE_PATH = os.environ.get("DFW_TRACE_PATH", "traces.jsonl")
+# The export file is rotated to <path>.1 when it grows past this
+TRACE_MAX_BYTES = int(os.environ.get("DFW_TRACE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Finished traces kept in memory for the admin endpoint: the slowest N and the most recent N
+TRACE_KEEP_SLOWEST = int(os.environ.get("DFW_TRACE_KEEP_SLOWEST", "100"))
+TRACE_KEEP_RECENT = int(os.environ.get("DFW_TRACE_KEEP_RECENT", "500"))
+SERVICE_NAME = os.environ.get("DFW_SERVICE_NAME", "dataflywheel-mcp")
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """The spans of one tool call or resource read; finished when its root span ends."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+        self.root: Optional[Span] = None
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        return {"trace_id": self.trace_id, "name": root.name, "duration_ms": round(root.duration_ms(), 3),
+                "start_unix_nano": root.start_ns, "error": root.error, "spans": len(self.spans)}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return to_otlp([self])
+
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    """One ExportTraceServiceRequest with the spans of all the given traces."""
+    spans = []
+    for trace in traces:
+        with trace.lock:
+            spans.extend(span.to_otlp() for span in trace.spans)
+    return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "dataflywheel"}, "spans": spans}],
+        }]}
+
+
+class TraceStore:
+    """
+    The slowest and the most recent finished traces, for the admin endpoint.
+
+    Calls that continue a client's trace (traceparent) share its trace_id, so
+    the recent traces are kept as a list per trace_id. At most keep_recent
+    traces are kept in total; the oldest traces of the least recently active
+    trace_id are evicted first.
+    """
+
+    def __init__(self, keep_slowest: int = TRACE_KEEP_SLOWEST, keep_recent: int = TRACE_KEEP_RECENT):
+        self.keep_slowest = keep_slowest
+        self.keep_recent = keep_recent
+        # Min-heap of (duration, seq, trace): the fastest of the kept traces is evicted first
+        self.slowest: List[tuple] = []
+        self.recent: "OrderedDict[str, List[Trace]]" = OrderedDict()
+        self.recent_count = 0
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, trace: Trace) -> None:
+        duration = trace.root.duration_ms()
+        with self.lock:
+            entry = (duration, next(self.sequence), trace)
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif self.slowest and duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+            traces = self.recent.get(trace.trace_id)
+            if traces is None:
+                traces = self.recent[trace.trace_id] = []
+            else:
+                self.recent.move_to_end(trace.trace_id)
+            traces.append(trace)
+            self.recent_count += 1
+            while self.recent_count > self.keep_recent:
+                oldest_id, oldest = next(iter(self.recent.items()))
+                del oldest[0]
+                self.recent_count -= 1
+                if not oldest:
+                    del self.recent[oldest_id]
+
+    def top(self, limit: int = 20, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            traces = [trace for _, _, trace in self.slowest]
+        if name:
+            traces = [trace for trace in traces if trace.root.name == name]
+        traces.sort(key=lambda trace: trace.root.duration_ms(), reverse=True)
+        return [trace.summary() for trace in traces[:limit]]
+
+    def get(self, trace_id: str) -> List[Trace]:
+        """Every retained trace with this trace_id, oldest first."""
+        with self.lock:
+            traces = list(self.recent.get(trace_id, ()))
+            traces += [t for _, _, t in self.slowest if t.trace_id == trace_id and t not in traces]
+        return sorted(traces, key=lambda trace: trace.root.start_ns)
+
+
+class FileExporter:
+    """Appends finished traces as OTLP/JSON lines from a background thread, rotating at max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.queue: "queue.Queue[Trace]" = queue.Queue(maxsize=10000)
+        self.dropped = 0
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            lines = [json.dumps(self.queue.get().to_otlp(), separators=(",", ":"))]
+            while not self.queue.empty() and len(lines) < 256:
+                lines.append(json.dumps(self.queue.get_nowait().to_otlp(), separators=(",", ":")))
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write("\n".join(lines) + "\n")
+            except OSError as e:
+                logger.warning(f"Trace export to {self.path} failed: {e}")
+
+
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("dfw_current_span", default=None)
+store = TraceStore()
+exporter = FileExporter(TRACE_PATH) if TRACE_PATH else None
+
+
+def trace_context(meta: Any) -> tuple:
+    """(trace_id, parent_span_id) from MCP request _meta: W3C traceparent, or trace_id / parent_span_id."""
+    if meta is None:
+        return None, None
+    match = _TRACEPARENT.match(str(getattr(meta, "traceparent", "") or ""))
+    if match:
+        return match.group(1), match.group(2)
+    trace_id = str(getattr(meta, "trace_id", "") or "").lower()
+    if re.fullmatch(r"[0-9a-f]{32}", trace_id):
+        return trace_id, getattr(meta, "parent_span_id", None)
+    return None, None
+
+
+def _finish(trace: Trace) -> None:
+    store.add(trace)
+    if exporter is not None:
+        exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes):
+    """
+    Child span of the current span. Outside a trace this is a no-op yielding
+    None, so backends used by background work (outbox, prefetch) add no spans.
+    """
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        current_span.reset(token)
+        with child.trace.lock:
+            child.trace.spans.append(child)
+
+
+@contextmanager
+def root_span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, kind: int = SERVER,
+              **attributes):
+    """
+    Start a trace (or continue the caller's trace_id). Nested inside another
+    trace it is an ordinary child span, e.g. for tools called by a pipeline.
+    """
+    if current_span.get() is not None:
+        with span(name, kind, **attributes) as child:
+            yield child
+        return
+    trace = Trace(trace_id or _new_id(128))
+    root = trace.root = Span(trace, name, parent_id, kind, attributes)
+    token = current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        current_span.reset(token)
+        with trace.lock:
+            trace.spans.append(root)
+        _finish(trace)
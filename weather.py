@@ -0,0 +1,392 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import deadlines
+import tracing
+from resilience import Backend, CircuitOpen
+
+
+# --- Configurations ---
+DEFAULT_HEADERS = {
+    "User-Agent": "MCP Weather Client (your-email@example.com)",
+    "Accept": "application/geo+json"
+}
+# NWS resolves /points at 4 decimal places (~11 m); finer input maps to the same gridpoint
+COORD_PRECISION = 4
+REQUEST_TIMEOUT = 10
+# Politeness toward api.weather.gov: concurrent requests and sustained requests/second
+NWS_MAX_CONCURRENCY = int(os.environ.get("DFW_NWS_MAX_CONCURRENCY", "16"))
+NWS_RATE_PER_SECOND = float(os.environ.get("DFW_NWS_RATE_PER_SECOND", "20"))
+# Background refresh of the most requested gridpoints
+PREFETCH_ENABLED = os.environ.get("DFW_PREFETCH_ENABLED", "1") == "1"
+PREFETCH_TOP_N = int(os.environ.get("DFW_PREFETCH_TOP_N", "50"))
+PREFETCH_LEAD_SECONDS = float(os.environ.get("DFW_PREFETCH_LEAD_SECONDS", "60"))
+PREFETCH_BUDGET_PER_MINUTE = float(os.environ.get("DFW_PREFETCH_BUDGET_PER_MINUTE", "30"))
+PREFETCH_HALF_LIFE_SECONDS = float(os.environ.get("DFW_PREFETCH_HALF_LIFE_SECONDS", "3600"))
+PREFETCH_INTERVAL_SECONDS = float(os.environ.get("DFW_PREFETCH_INTERVAL_SECONDS", "15"))
+# Fail fast after this many consecutive NWS failures, probing again after the reset timeout
+NWS_BREAKER_FAILURES = int(os.environ.get("DFW_NWS_BREAKER_FAILURES", "5"))
+NWS_BREAKER_RESET_SECONDS = float(os.environ.get("DFW_NWS_BREAKER_RESET_SECONDS", "30"))
+# Send a duplicate GET when the first is slower than the recent p95
+NWS_HEDGE = os.environ.get("DFW_NWS_HEDGE", "1") == "1"
+# Structured forecasts report precipitation when its probability is at least this (percent)
+PRECIP_PROBABILITY_THRESHOLD = float(os.environ.get("DFW_PRECIP_PROBABILITY_THRESHOLD", "30"))
+
+
+class RateLimiter:
+    """Thread-safe token bucket; acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # Inside a tool call, stop waiting once the call is cancelled or out of time
+            deadlines.check()
+            slice_ = deadlines.poll_timeout()
+            time.sleep(wait if slice_ is None else min(wait, slice_))
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now, without waiting."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class DecayingCounter:
+    """Per-key request counts that halve every half_life seconds, so recent traffic dominates."""
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self.scores: Dict[str, Tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def add(self, key: str, amount: float = 1.0) -> None:
+        now = time.monotonic()
+        with self.lock:
+            score, updated = self.scores.get(key, (0.0, now))
+            self.scores[key] = (self._decayed(score, updated, now) + amount, now)
+
+    def top(self, n: int, floor: float = 0.01) -> List[Tuple[str, float]]:
+        """The n highest current scores; keys that decayed below floor are dropped."""
+        now = time.monotonic()
+        with self.lock:
+            current = {key: self._decayed(score, updated, now) for key, (score, updated) in self.scores.items()}
+            for key, score in current.items():
+                if score < floor:
+                    del self.scores[key]
+        ranked = sorted(((k, s) for k, s in current.items() if s >= floor), key=lambda item: item[1], reverse=True)
+        return ranked[:n]
+
+
+def cache_lifetime(headers, now: float) -> float:
+    """Seconds a response may be reused, from Cache-Control max-age (minus Age) or Expires."""
+    cache_control = headers.get("Cache-Control", "")
+    if re.search(r"\b(no-store|no-cache)\b", cache_control):
+        return 0.0
+    match = re.search(r"\bmax-age=(\d+)", cache_control)
+    if match:
+        return max(0.0, int(match.group(1)) - int(headers.get("Age", "0") or 0))
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - now)
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0
+
+
+class NWSClient:
+    """
+    NWS API client with a two-tier cache.
+
+    /points lookups (coordinates -> gridpoint and forecast URL) never change and are
+    cached permanently by rounded coordinates. Forecasts are cached per gridpoint for
+    as long as their Cache-Control/Expires headers allow, then revalidated with
+    If-Modified-Since so an unchanged forecast costs a cheap 304.
+    """
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url
+        self.headers = dict(headers or DEFAULT_HEADERS)
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=NWS_MAX_CONCURRENCY))
+        self.points: Dict[Tuple[float, float], Dict[str, Any]] = {}
+        self.forecasts: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.limiter = RateLimiter(NWS_RATE_PER_SECOND)
+        self.executor = ThreadPoolExecutor(max_workers=NWS_MAX_CONCURRENCY, thread_name_prefix="nws")
+        self.popularity = DecayingCounter(PREFETCH_HALF_LIFE_SECONDS)
+        self.upstream_requests = 0
+        self.backend = Backend("nws", NWS_BREAKER_FAILURES, NWS_BREAKER_RESET_SECONDS, hedge=NWS_HEDGE,
+                               max_workers=NWS_MAX_CONCURRENCY)
+
+    def _send(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        self.limiter.acquire()
+        with self.lock:
+            self.upstream_requests += 1
+        with tracing.span("GET api.weather.gov", tracing.CLIENT, **{"http.url": url}) as span:
+            response = self.session.get(url, headers=headers, timeout=deadlines.timeout(REQUEST_TIMEOUT))
+            if span is not None:
+                span.set("http.status_code", response.status_code)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        try:
+            return self.backend.call(self._send, url, dict(self.headers, **(headers or {})))
+        except CircuitOpen as e:
+            # Reported like any other fetch failure
+            raise requests.exceptions.ConnectionError(str(e)) from None
+
+    def point_key(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        return round(latitude, COORD_PRECISION), round(longitude, COORD_PRECISION)
+
+    def gridpoint(self, latitude: float, longitude: float) -> Dict[str, Any]:
+        """Gridpoint metadata for a coordinate: forecast URL, grid id/x/y and nearest city/state."""
+        key = self.point_key(latitude, longitude)
+        with self.lock:
+            point = self.points.get(key)
+        if point is not None:
+            return point
+
+        properties = self._get(f"{self.base_url}/points/{key[0]},{key[1]}").json()['properties']
+        location = properties['relativeLocation']['properties']
+        point = {
+            "forecast_url": properties['forecast'],
+            "grid_id": properties.get('gridId'),
+            "grid_x": properties.get('gridX'),
+            "grid_y": properties.get('gridY'),
+            "city": location['city'],
+            "state": location['state'],
+        }
+        with self.lock:
+            self.points[key] = point
+        return point
+
+    def forecast_for_url(self, forecast_url: str, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Forecast document for a gridpoint, served from cache while fresh and revalidated once stale.
+
+        refresh=True is the prefetcher's path: it revalidates even a fresh entry and
+        does not count as a client request toward the gridpoint's popularity.
+        """
+        if not refresh:
+            self.popularity.add(forecast_url)
+        now = time.time()
+        with self.lock:
+            entry = self.forecasts.get(forecast_url)
+        if not refresh and entry is not None and entry["expires_at"] > now:
+            return entry["data"]
+
+        conditional = {}
+        if entry is not None and entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+        response = self._get(forecast_url, conditional)
+        now = time.time()
+
+        if response.status_code == 304 and entry is not None:
+            entry = dict(entry, expires_at=now + cache_lifetime(response.headers, now))
+        else:
+            entry = {
+                "data": response.json(),
+                "expires_at": now + cache_lifetime(response.headers, now),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        with self.lock:
+            self.forecasts[forecast_url] = entry
+        return entry["data"]
+
+    def forecast(self, latitude: float, longitude: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(gridpoint, forecast document) for a coordinate; zero upstream calls when both tiers are warm."""
+        point = self.gridpoint(latitude, longitude)
+        return point, self.forecast_for_url(point["forecast_url"])
+
+    async def forecast_many(self, coordinates: List[Tuple[float, float]]
+                            ) -> Dict[Tuple[float, float], Union[Tuple[Dict[str, Any], Dict[str, Any]], Exception]]:
+        """
+        Concurrent forecast lookup for many coordinates, keyed by rounded coordinate.
+
+        Coordinates are deduplicated before the /points lookups and again by gridpoint
+        before the forecast fetches, so nearby inputs share one upstream request.
+        Concurrency is bounded by the client's thread pool and the rate limiter.
+        Per-location failures are returned as the exception instead of raising.
+        """
+        keys = list(dict.fromkeys(self.point_key(lat, lon) for lat, lon in coordinates))
+        points = await asyncio.gather(
+            *[deadlines.run_in_executor(self.executor, self.gridpoint, lat, lon) for lat, lon in keys],
+            return_exceptions=True,
+        )
+        urls = list(dict.fromkeys(p["forecast_url"] for p in points if not isinstance(p, Exception)))
+        forecasts = await asyncio.gather(
+            *[deadlines.run_in_executor(self.executor, self.forecast_for_url, url) for url in urls],
+            return_exceptions=True,
+        )
+        by_url = dict(zip(urls, forecasts))
+
+        results = {}
+        for key, point in zip(keys, points):
+            if isinstance(point, Exception):
+                results[key] = point
+            elif isinstance(by_url[point["forecast_url"]], Exception):
+                results[key] = by_url[point["forecast_url"]]
+            else:
+                results[key] = (point, by_url[point["forecast_url"]])
+        return results
+
+
+class PrefetchScheduler:
+    """
+    Keeps hot gridpoints warm.
+
+    Every interval the top-N gridpoints by decayed request count are checked, and
+    any whose cached forecast expires within lead_seconds is revalidated in the
+    background. Refreshes draw from a per-minute budget, so prefetching never adds
+    more than budget_per_minute requests toward NWS.
+    """
+
+    def __init__(self, client: NWSClient, top_n: int = PREFETCH_TOP_N, lead_seconds: float = PREFETCH_LEAD_SECONDS,
+                 budget_per_minute: float = PREFETCH_BUDGET_PER_MINUTE, interval: float = PREFETCH_INTERVAL_SECONDS):
+        self.client = client
+        self.top_n = top_n
+        self.lead_seconds = lead_seconds
+        self.budget = RateLimiter(budget_per_minute / 60.0, burst=budget_per_minute)
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+
+    def ensure_running(self) -> None:
+        """Start the background loop on the current event loop if it is not already running there."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+
+    def due(self) -> List[str]:
+        """Hot forecast URLs whose cache entry expires within the lead time, hottest first."""
+        deadline = time.time() + self.lead_seconds
+        with self.client.lock:
+            entries = dict(self.client.forecasts)
+        return [url for url, _ in self.client.popularity.top(self.top_n)
+                if url in entries and entries[url]["expires_at"] <= deadline]
+
+    async def refresh_due(self) -> int:
+        loop = asyncio.get_running_loop()
+        urls = [url for url in self.due() if self.budget.try_acquire()]
+        results = await asyncio.gather(
+            *[loop.run_in_executor(self.client.executor, self.client.forecast_for_url, url, True) for url in urls],
+            return_exceptions=True,
+        )
+        refreshed = sum(1 for result in results if not isinstance(result, Exception))
+        self.refreshed += refreshed
+        return refreshed
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                print(" Error in weather prefetch:", str(e), flush=True)
+
+
+# --- Structured forecast fields ---
+
+SNOW_TERMS = ("snow", "flurries", "blizzard", "sleet", "wintry mix")
+PRECIP_TERMS = SNOW_TERMS + ("rain", "showers", "drizzle", "thunderstorm", "t-storm", "hail")
+# A mention after one of these in the same clause ("little or no snow", "no rain expected") is negated
+NEGATION = re.compile(r"\b(?:no|not|without|none|little or no)\b")
+
+
+def _term_pattern(terms: Tuple[str, ...]) -> "re.Pattern":
+    return re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + ")")
+
+
+SNOW_PATTERN = _term_pattern(SNOW_TERMS)
+PRECIP_PATTERN = _term_pattern(PRECIP_TERMS)
+
+
+def mentions(text: str, pattern: "re.Pattern") -> bool:
+    """
+    True if some clause of the forecast text mentions a term without negating it;
+    False if there is no mention or every mention is negated (e.g. "Little or no
+    snow accumulation").
+    """
+    for clause in re.split(r"[.;,]", text):
+        match = pattern.search(clause)
+        if match is not None and not NEGATION.search(clause, 0, match.start()):
+            return True
+    return False
+
+
+def parse_wind_speed(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """'5 to 10 mph' -> (5, 10); '15 mph' -> (15, 15); (None, None) if no number."""
+    numbers = [int(n) for n in re.findall(r"\d+", text or "")]
+    if not numbers:
+        return None, None
+    return min(numbers), max(numbers)
+
+
+def summarize_period(point: Dict[str, Any], forecast_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Typed summary of the current forecast period, for clients that aggregate rather than read text."""
+    period = forecast_data['properties']['periods'][0]
+    conditions = period['shortForecast']
+    text = f"{conditions} {period.get('detailedForecast', '')}".lower()
+    wind_min, wind_max = parse_wind_speed(period.get('windSpeed'))
+    probability = (period.get('probabilityOfPrecipitation') or {}).get('value')
+    return {
+        "location": {"city": point['city'], "state": point['state']},
+        "gridpoint": {"id": point.get('grid_id'), "x": point.get('grid_x'), "y": point.get('grid_y')},
+        "period": {
+            "name": period['name'],
+            "start": period.get('startTime'),
+            "end": period.get('endTime'),
+            "is_daytime": period.get('isDaytime'),
+        },
+        "temperature": period['temperature'],
+        "unit": period['temperatureUnit'],
+        "short_forecast": conditions,
+        "wind": {
+            "speed": period.get('windSpeed'),
+            "speed_min": wind_min,
+            "speed_max": wind_max,
+            "direction": period.get('windDirection'),
+        },
+        "snow": mentions(text, SNOW_PATTERN),
+        "precipitation": (probability >= PRECIP_PROBABILITY_THRESHOLD if probability is not None
+                          else mentions(text, PRECIP_PATTERN)),
+        "precipitation_probability": probability,
+    }